@@ -1,14 +1,53 @@
+import os
 import streamlit as st
 import pandas as pd
-from extractor import extract_schedule
-from calendar_sync import get_calendar_service, get_or_create_calendar, insert_schedule_events
+from pending_store import get_pending_store
+from clash_index import find_clashes, describe_clash, load_clash_index
+from terms import get_catalog
+from perf import timed, count
 
 st.set_page_config(page_title="University Calendar Automator", layout="wide")
 
-@st.cache_data
-def load_data():
-    # Load the pre-parsed CSV database so we don't need raw PDFs on the server
-    return pd.read_csv("database.csv")
+@st.cache_resource
+def start_feed_server():
+    # Optionally serve the ICS feeds from this process too (one server per process, not per session)
+    port = os.environ.get("FEED_SERVER_PORT")
+    if not port:
+        return None
+    from feed_server import start_in_background
+    return start_in_background(port=int(port))
+
+@st.cache_resource
+def start_metrics_server():
+    # Prometheus scrape endpoint for this process's timings (METRICS_PORT); without it nothing is collected
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    from perf import start_metrics_server as serve_metrics
+    return serve_metrics(host=os.environ.get("METRICS_HOST", "127.0.0.1"), port=int(port))
+
+def load_data(term_id=None):
+    # Open the term's pre-built schedule store so we don't need raw PDFs on the server.
+    # Stores are opened on first use and kept in the catalog's small LRU, so a worker only holds the terms people ask for;
+    # only the group index is read, group rows are sliced from the memory-mapped file on demand.
+    return get_catalog().store(term_id)
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def load_group_view(term_id, data_mtime, program, group):
+    # Sorted by day of the week and time and split per day once per group, not on every rerun.
+    # Each day comes with a 'Take' column for the selection editor; data_mtime in the key picks up a rebuilt term.
+    with timed("app.group_view"):
+        return _group_view(term_id, program, group)
+
+def _group_view(term_id, program, group):
+    group_df = load_data(term_id).group_frame(program, group)
+    group_df['Day'] = pd.Categorical(group_df['Day'], categories=DAY_ORDER, ordered=True)
+    group_df = group_df.sort_values(by=['Day', 'Time'])
+    group_df['Day'] = group_df['Day'].astype(str)
+    group_df.insert(0, 'Take', False)
+    return [(day, df_day.reset_index(drop=True)) for day, df_day in group_df.groupby('Day', sort=False) if day in DAY_ORDER]
 
 def get_base64_of_bin_file(bin_file):
     import base64
@@ -19,10 +58,82 @@ def get_base64_of_bin_file(bin_file):
         return base64.b64encode(data).decode()
     return ""
 
-def main():
-    # Load and encode local logo
+@st.cache_resource
+def load_logo_tag():
+    # Encode the local logo once per process instead of on every rerun
     logo_base64 = get_base64_of_bin_file("static/AITUlogo.png")
-    img_tag = f'<img src="data:image/png;base64,{logo_base64}" width="80" style="margin-right: 15px;">' if logo_base64 else ""
+    return f'<img src="data:image/png;base64,{logo_base64}" width="80" style="margin-right: 15px;">' if logo_base64 else ""
+
+def format_program_name(name):
+    import re
+    clean = name.replace("Schedules_", "").replace("Schedule_", "")
+    clean = clean.replace("_", " ").title()
+    # Replace specific abbreviations securely based on word boundaries
+    clean = re.sub(r'\bM\b', 'Masters', clean)
+    clean = re.sub(r'\bB\b', 'Bachelors', clean)
+    clean = re.sub(r'\bTrim\b', 'Trimester', clean)
+    return clean.strip()
+
+@st.cache_resource
+def load_program_labels(programs):
+    return {p: format_program_name(p) for p in programs}
+
+@st.cache_resource(max_entries=8)
+def load_search(term_id, data_mtime):
+    # Group search over every program, written by build_db (built from the store once if it's missing);
+    # data_mtime in the key picks up a rebuilt term
+    from group_search import load_search_index
+    return load_search_index(get_catalog().get(term_id).search_index_path, load_data(term_id))
+
+def describe_match(match, program_labels):
+    label = f"{match['group']} · {program_labels[match['program']]}"
+    return label if match['kind'] == 'group' else f"{label} ({match['kind']}: {match['match']})"
+
+def show_sync_job(job_id):
+    from sync_jobs import get_job_queue
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.warning("This calendar sync is no longer available. Select your classes and sync again.")
+    elif job['status'] in ('queued', 'running'):
+        show_sync_progress(job_id)
+        return
+    elif job['status'] == 'failed':
+        st.error(f"Failed to complete Calendar Sync: {job['error']}")
+    else:
+        summary = job['result']
+        st.success(
+            f"Synced '{summary['calendar']}': {summary['inserted']} created, "
+            f"{summary['updated']} updated, {summary['deleted']} removed, {summary['unchanged']} unchanged."
+        )
+        if summary['clashes']:
+            st.info(f"{len(summary['clashes'])} pairs of the synced classes overlap in time.")
+        failed = summary['failed']
+        if failed:
+            st.warning(f"{len(failed)} changes could not be applied: {failed[0]['error']}")
+        elif st.session_state.get("celebrated_job") != job_id:
+            st.session_state["celebrated_job"] = job_id
+            st.balloons()
+    if st.button("Start a new sync"):
+        st.query_params.clear()
+        st.rerun()
+
+@st.fragment(run_every=1.0)
+def show_sync_progress(job_id):
+    # Only this fragment reruns while the job is going; the whole page reruns once to show the result
+    from sync_jobs import get_job_queue
+    job = get_job_queue().get(job_id)
+    if job is None or job['status'] not in ('queued', 'running'):
+        st.rerun()
+    if job['total']:
+        st.progress(job['done'] / job['total'], text=f"{job['done']}/{job['total']} events synced")
+    else:
+        st.progress(0.0, text=f"{job['stage']}...")
+
+def main():
+    start_feed_server()
+    start_metrics_server()
+    
+    img_tag = load_logo_tag()
 
     # Create a nice header with the logo horizontally aligned
     st.markdown(
@@ -34,43 +145,60 @@ def main():
         """,
         unsafe_allow_html=True
     )
-    st.markdown("Automate your Trimester 3 schedule sync to Google Calendar.")
+    catalog = get_catalog()
+    term_ids = catalog.ids()
+    if len(term_ids) > 1:
+        term_id = st.selectbox(
+            "Select your term",
+            options=term_ids,
+            index=term_ids.index(catalog.default),
+            format_func=lambda t: f"{catalog.get(t).institution} {catalog.get(t).name}".strip()
+        )
+    else:
+        term_id = catalog.default
+    term = catalog.get(term_id)
+    st.markdown(f"Automate your {term.name} schedule sync to Google Calendar.")
 
     with st.spinner("Loading schedule data..."):
         try:
-            df = load_data()
+            store = load_data(term.id)
         except Exception as e:
             st.error(f"Failed to load PDF schedule: {e}")
             return
 
-    programs = df['Program'].unique()
+    programs = store.programs()
     
-    def format_program_name(name):
-        clean = name.replace("Schedules_", "").replace("Schedule_", "")
-        clean = clean.replace("_", " ").title()
-        # Replace specific abbreviations securely based on word boundaries
-        import re
-        clean = re.sub(r'\bM\b', 'Masters', clean)
-        clean = re.sub(r'\bB\b', 'Bachelors', clean)
-        clean = re.sub(r'\bTrim\b', 'Trimester', clean)
-        return clean.strip()
-        
-    formatted_programs = {p: format_program_name(p) for p in programs}
+    formatted_programs = load_program_labels(tuple(programs))
     
-    selected_program = st.selectbox(
-        "Select your Program/Year", 
-        options=programs,
-        format_func=lambda x: formatted_programs[x]
-    )
+    selected_program = selected_group = None
+    query = st.text_input("Find your group", placeholder="Group code, discipline or lecturer, e.g. AAI-25")
+    if query.strip():
+        # Answered from the prebuilt index across all programs; no need to pick the program first
+        with timed("app.search"):
+            matches = load_search(term.id, catalog.data_mtime(term.id)).search(query)
+        if matches:
+            match = st.selectbox(
+                "Select your Group",
+                options=matches,
+                format_func=lambda m: describe_match(m, formatted_programs)
+            )
+            selected_program, selected_group = match['program'], match['group']
+        else:
+            st.info(f"No group matches '{query}'.")
+    else:
+        selected_program = st.selectbox(
+            "Select your Program/Year", 
+            options=programs,
+            format_func=lambda x: formatted_programs[x]
+        )
 
-    if selected_program:
-        # Filter dataframe by the selected program to only show relevant groups
-        program_df = df[df['Program'] == selected_program]
-        groups = program_df['Group'].unique()
-        selected_group = st.selectbox("Select your Group", options=groups)
+        if selected_program:
+            # Only show the groups of the selected program
+            groups = store.groups(selected_program)
+            selected_group = st.selectbox("Select your Group", options=groups)
 
     if selected_program and selected_group:
-        group_df = program_df[program_df['Group'] == selected_group].copy()
+        group_df = store.group_frame(selected_program, selected_group)
         
         st.subheader(f"Schedule for {selected_group}")
         st.dataframe(group_df)
@@ -80,23 +208,23 @@ def main():
         
         selected_events = []
         
-        # Sort dataframe by day of the week and time
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        group_df = group_df.copy()
-        group_df['Day'] = pd.Categorical(group_df['Day'], categories=day_order, ordered=True)
-        group_df = group_df.sort_values(by=['Day', 'Time'])
-        
-        for day, df_day in group_df.groupby('Day', observed=False):
-            if df_day.empty:
-                continue
-                
+        for day, df_day in load_group_view(term.id, catalog.data_mtime(term.id), selected_program, selected_group):
             st.markdown(f"#### {day}")
-            for index, row in df_day.iterrows():
-                if st.checkbox(f"**{row['Time']}**: {row['Discipline']} ({row['Type']})", key=f"sec_{index}"):
-                    selected_events.append(row.to_dict())
+            picked = st.data_editor(
+                df_day,
+                key=f"pick_{term.id}_{selected_program}_{selected_group}_{day}",
+                column_order=['Take', 'Time', 'Discipline', 'Type', 'Classroom', 'Lecturer'],
+                column_config={'Take': st.column_config.CheckboxColumn("Take", default=False)},
+                disabled=['Time', 'Discipline', 'Type', 'Classroom', 'Lecturer'],
+                hide_index=True,
+            )
+            selected_events.extend(picked[picked['Take']].drop(columns='Take').to_dict('records'))
         
-        from calendar_sync import get_auth_url, get_credentials_from_code, get_calendar_service, get_or_create_calendar, insert_schedule_events
-        import urllib.parse
+        clashes = find_clashes(selected_events, load_clash_index(term.clash_index_path) or {})
+        if clashes:
+            st.warning(
+                "Some of the selected classes overlap:\n" + "\n".join(f"- {describe_clash(a, b)}" for a, b in clashes)
+            )
         
         st.divider()
         st.markdown('#### Export Options')
@@ -107,7 +235,10 @@ def main():
             
             # Check if we are handling an OAuth Redirect (meaning Google sent us a code)
             query_params = st.query_params
-            if "code" in query_params:
+            if "job" in query_params:
+                # A sync running in the background; its id stays in the URL so a page reload finds it again
+                show_sync_job(query_params["job"])
+            elif "code" in query_params:
                 code = query_params["code"]
                 
                 # Prevent reusing the same code if Streamlit reruns
@@ -119,38 +250,21 @@ def main():
                 else:
                     try:
                         st.session_state["last_used_code"] = code
-                        # Exchange code for creds
-                        creds = get_credentials_from_code(code)
-                        service = get_calendar_service(creds)
-                        calendar_id = get_or_create_calendar(service)
-                        
-                        import json
-                        import os
                         
                         state_val = query_params.get("state", None)
-                        events_to_sync = []
-                        cache_file = "oauth_events_cache.json"
-                        
-                        # Load from disk cache using the state parameter as key
-                        if state_val and os.path.exists(cache_file):
-                            try:
-                                with open(cache_file, "r") as f:
-                                    cache_data = json.load(f)
-                                events_to_sync = cache_data.get(state_val, [])
-                                
-                                # Clean up cache
-                                if state_val in cache_data:
-                                    del cache_data[state_val]
-                                    with open(cache_file, "w") as fw:
-                                        json.dump(cache_data, fw)
-                            except Exception:
-                                pass
+                        # Atomically take the selection stashed before the redirect (None if missing or expired)
+                        pending = (get_pending_store().pop(state_val) or {}) if state_val else {}
+                        events_to_sync = pending.get('events', [])
                         
                         if events_to_sync:
-                            created_ids = insert_schedule_events(service, calendar_id, events_to_sync)
-                            st.success(f"Successfully created {len(created_ids)} events in 'AITU Schedule - Trimester 3'!")
-                            st.balloons()
+                            # The Google client libraries are only loaded once someone actually syncs
+                            from calendar_sync import get_redirect_uri
+                            from sync_jobs import get_job_queue, run_calendar_sync
+                            # Hand the token exchange and all calendar writes to a background worker and return at once
+                            job_id = get_job_queue().submit(run_calendar_sync, code, get_redirect_uri(), events_to_sync, pending.get('term'))
                             st.query_params.clear()
+                            st.query_params["job"] = job_id
+                            show_sync_job(job_id)
                         else:
                             st.warning("Authorized successfully, but no classes were selected to sync.")
                             st.query_params.clear()
@@ -163,25 +277,12 @@ def main():
                     if not selected_events:
                         st.error("Please select at least one class before syncing.")
                     else:
+                        from calendar_sync import get_auth_url
                         try:
                             auth_url, state = get_auth_url()
                             
-                            import json
-                            import os
-                            
-                            # Cache the selected events to disk, keyed by OAuth 'state'
-                            cache_file = "oauth_events_cache.json"
-                            cache_data = {}
-                            if os.path.exists(cache_file):
-                                try:
-                                    with open(cache_file, "r") as f:
-                                        cache_data = json.load(f)
-                                except Exception:
-                                    pass
-                                    
-                            cache_data[state] = selected_events
-                            with open(cache_file, "w") as f:
-                                json.dump(cache_data, f)
+                            # Stash the selected events (and their term) server-side, keyed by OAuth 'state'
+                            get_pending_store().put(state, {'term': term.id, 'events': selected_events})
                                 
                             # Instantly redirect the user's browser to the Google Auth URL
                             st.markdown(f'<meta http-equiv="refresh" content="0;url={auth_url}">', unsafe_allow_html=True)
@@ -189,18 +290,32 @@ def main():
                             st.error(f"Failed to generate Auth URL. Make sure credentials_web.json is correct: {e}")
             st.markdown("**Public ICS File generation** (Shareable)")
             if selected_events:
-                from ics_exporter import generate_ics_string
-                ics_data = generate_ics_string(selected_events)
+                from ics_exporter import generate_ics_string, read_group_ics
+                ics_data = None
+                if len(selected_events) == len(group_df):
+                    # Whole group selected: serve the calendar pre-rendered by build_db
+                    ics_data = read_group_ics(selected_program, selected_group, term.ics_dir)
+                    count("app.ics_prerendered" if ics_data is not None else "app.ics_prerender_missing")
+                if ics_data is None:
+                    ics_data = generate_ics_string(selected_events, term=term)
                 st.download_button(
                     label="Download .ics Calendar File",
                     data=ics_data,
-                    file_name=f"{selected_group}_Trimester_3.ics",
+                    file_name=f"{selected_group}_{term.name.replace(' ', '_')}.ics",
                     mime="text/calendar",
                     use_container_width=True,
                     type="secondary"
                 )
             else:
                 st.write("Select subjects to generate an ICS file.")
+            
+            feed_base_url = os.environ.get("FEED_BASE_URL")
+            if feed_base_url:
+                from feed_server import feed_path
+                # Live feed of the selected subjects; calendar apps keep it up to date on their own
+                disciplines = sorted({ev['Discipline'] for ev in selected_events}) if len(selected_events) < len(group_df) else []
+                st.markdown("**Subscribe by URL** (updates automatically)")
+                st.code(feed_base_url.rstrip('/') + feed_path(selected_program, selected_group, disciplines, term.id), language=None)
                 
         # Footer
         st.markdown("<br><br>", unsafe_allow_html=True)
@@ -212,4 +327,5 @@ def main():
         )
 
 if __name__ == "__main__":
-    main()
+    with timed("app.rerun"):
+        main()
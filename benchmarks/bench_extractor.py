@@ -0,0 +1,76 @@
+"""
+Extraction throughput and memory on the bundled schedule PDFs:
+pages/sec and peak RSS per PDF, each measured in a fresh process so peaks don't leak between runs.
+Peak RSS needs the Unix `resource` module; on Windows only pages/sec is reported.
+
+    python benchmarks/bench_extractor.py [--json results.json]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import subprocess
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_child(pdf_path):
+    import extractor
+    pages = extractor.count_pages(pdf_path)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    df = extractor.extract_schedule(pdf_path)
+    seconds = time.perf_counter() - started
+    print(json.dumps({
+        "pdf": os.path.basename(pdf_path),
+        "pages": pages,
+        "rows": len(df),
+        "seconds": seconds,
+        "pages_per_sec": pages / seconds if seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "import_rss_mb": baseline,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdfs", nargs="*", default=None, help="default: schedules/*.pdf")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--child", metavar="PDF", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join(ROOT, "schedules", "*.pdf")))
+    results = []
+    for pdf_path in pdfs:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", pdf_path],
+            check=True, capture_output=True, text=True, cwd=ROOT,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:7.1f} MB" if result['peak_rss_mb'] is not None else "    n/a"
+        print(f"{result['pdf'][:34]:<34} {result['pages']:>4} pages  "
+              f"{result['pages_per_sec']:6.2f} pages/s  peak RSS {rss}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Import-time profile of the web app (python -X importtime), to keep its cold start in check:
+total import time of a module, the slowest top-level imports, and whether the heavy libraries
+the app should only load on demand (PDF parsing, Google API clients) were pulled in; exits with 1 if any were.
+
+    python benchmarks/bench_import.py [--module app] [--repeat 5] [--top 15] [--json benchmarks/results/import_time.json]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only needed once the user syncs to Google Calendar or a PDF is parsed offline
+LAZY_MODULES = ["pdfplumber", "extractor", "calendar_sync", "googleapiclient", "google_auth_oauthlib", "google_auth_httplib2", "httplib2"]
+
+def import_profile(module):
+    """[(name, cumulative us, nesting level)] for one fresh `import module`, in -X importtime order (children first)."""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True, capture_output=True, text=True, cwd=ROOT,
+    ).stderr
+    profile = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        profile.append((name.strip(), int(cumulative_us), len(name) - len(name.lstrip())))
+    return profile
+
+def direct_imports(profile, module):
+    """Names of the modules imported directly by module (not the interpreter's own startup imports)."""
+    position = max(i for i, (name, _, _) in enumerate(profile) if name == module)
+    level = profile[position][2]
+    children = []
+    for name, _, child_level in reversed(profile[:position]):
+        if child_level <= level:
+            break
+        if child_level == level + 2:
+            children.append(name)
+    return children
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to run; the fastest time per module is kept")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    runs = [import_profile(args.module) for _ in range(args.repeat)]
+    best = {}
+    for run in runs:
+        for name, us, _ in run:
+            best[name] = min(best.get(name, us), us)
+    top_level = sorted(((name, best[name]) for name in direct_imports(runs[0], args.module)), key=lambda item: -item[1])[:args.top]
+    loaded = {name for name, _, _ in runs[0]}
+    result = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "total_ms": best[args.module] / 1000,
+        "modules_imported": len(loaded),
+        "top_imports_ms": {name: us / 1000 for name, us in top_level},
+        "lazy_modules_loaded": [name for name in LAZY_MODULES if name in loaded],
+    }
+
+    print(f"import {args.module}: {result['total_ms']:.0f} ms, {result['modules_imported']} modules (best of {args.repeat})")
+    for name, ms in result["top_imports_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+    heavy = result["lazy_modules_loaded"]
+    print("heavy modules loaded at import: " + (", ".join(heavy) if heavy else "none"))
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    return 1 if heavy else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
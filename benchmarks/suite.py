@@ -0,0 +1,332 @@
+"""
+End-to-end benchmark and regression suite: ingest, load and export.
+
+    python benchmarks/suite.py [--quick] [--suites extract build load ics calendar synthetic]
+                               [--json results.json] [--baseline benchmarks/results/baseline.json] [--tolerance 0.5]
+
+Every measurement is the best of --repeat runs, in seconds. With --baseline, timings are compared against a
+previous --json output and the run exits with status 1 if any got slower than baseline * (1 + tolerance).
+Baseline timings are first scaled by how fast a fixed pure-Python workload ran around each suite in either run, so
+a busier host doesn't read as a regression; slowdowns within --min-delta or the run's own best-to-median spread are noise.
+A baseline recorded on another machine (a different fingerprint) is shown for reference but never fails the run.
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import random
+import hashlib
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SUITES = ["extract", "build", "load", "ics", "calendar", "synthetic"]
+ICS_SIZES = [10, 100, 1000]
+
+def machine_fingerprint():
+    """A short hash of the CPU model, core count, OS and Python version; timings only compare within one fingerprint."""
+    cpu = platform.processor() or platform.machine()
+    with contextlib.suppress(OSError):
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    parts = [cpu, str(os.cpu_count()), platform.system(), platform.machine(), platform.python_version()]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12], cpu
+
+def calibrate(repeat):
+    """Best seconds of a fixed CPU-bound workload, the yardstick baseline timings are scaled by."""
+    values = random.Random(0).sample(range(10 ** 6), 200_000)
+    return best_of(lambda: sorted(values), max(repeat, 5))[0]
+
+def best_of(fn, repeat, setup=None):
+    """(best, median) seconds of fn() over repeat runs; setup() runs untimed before each."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times)
+
+class Results:
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, name, seconds, median=None, **extra):
+        self.entries[name] = dict(seconds=seconds, **({'median': median} if median is not None else {}), **extra)
+        details = "  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in extra.items())
+        print(f"  {name:<44} {seconds * 1000:10.2f} ms  {details}")
+
+def pdf_paths():
+    return sorted(glob.glob(os.path.join(ROOT, "schedules", "*.pdf")))
+
+def store_events(limit):
+    from schedule_store import open_store
+    with contextlib.chdir(ROOT):
+        rows = open_store().to_frame().to_dict('records')
+    return rows[:limit]
+
+def run_extract(results, args):
+    import extractor
+    for pdf_path in pdf_paths():
+        pages = extractor.count_pages(pdf_path)
+        if args.pages:
+            pages = min(pages, args.pages)
+        name = os.path.splitext(os.path.basename(pdf_path))[0].replace(' ', '_')
+        rows = []
+        best, median = best_of(lambda: rows.append(extractor.extract_pages(pdf_path, range(pages))[0]), args.extract_repeat)
+        results.add(f"extract.{name}", best, median, pages=pages, rows=len(rows[-1]), pages_per_sec=pages / best)
+
+def run_build(results, args):
+    from build_db import build_database, MANIFEST_FILE
+    workdir = tempfile.mkdtemp(prefix="bench_build_")
+    try:
+        output_csv = os.path.join(workdir, "database.csv")
+        run = lambda force: build_database(os.path.join(ROOT, "schedules"), output_csv, workers=args.workers, force=force,
+                                           ics_dir=os.path.join(workdir, "ics"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            run(True)
+            full = time.perf_counter() - started
+            incremental, _ = best_of(lambda: run(False), 3)
+            # Without the manifest every PDF counts as re-issued, but its pages are all in the page cache
+            manifest = os.path.join(workdir, MANIFEST_FILE)
+            reissued, _ = best_of(lambda: run(False), 3, setup=lambda: os.remove(manifest))
+        results.add("build.full", full, workers=args.workers or os.cpu_count())
+        results.add("build.incremental_unchanged", incremental)
+        results.add("build.reissued_cached_pages", reissued)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+COLD_LOAD = """
+import time
+started = time.perf_counter()
+from schedule_store import open_store
+store = open_store()
+program = store.programs()[0]
+store.group_frame(program, store.groups(program)[0])
+print(time.perf_counter() - started)
+"""
+
+def run_load(results, args):
+    from schedule_store import open_store
+    cold = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, "-c", COLD_LOAD], check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        cold.append(float(out.strip().splitlines()[-1]))
+    results.add("load.cold_first_group", min(cold), statistics.median(cold))
+
+    with contextlib.chdir(ROOT):
+        best, median = best_of(lambda: open_store(), args.repeat)
+        results.add("load.open_store", best, median)
+        store = open_store()
+        groups = [(p, g) for p in store.programs() for g in store.groups(p)]
+        store.group_frame(*groups[0])
+        best, median = best_of(lambda: [store.group_frame(p, g) for p, g in groups], args.repeat)
+        results.add("load.warm_group_frame", best / len(groups), median / len(groups), groups=len(groups))
+
+def run_ics(results, args):
+    import ics_exporter
+    # Large slices of the timetable contain elective slots; the clash warning would repeat on every run
+    logging.getLogger(ics_exporter.__name__).setLevel(logging.ERROR)
+    events = store_events(max(ICS_SIZES))
+    for size in ICS_SIZES:
+        selection = events[:size]
+        best, median = best_of(lambda: ics_exporter.render_ics_string(selection), args.repeat)
+        results.add(f"ics.render_{size}", best, median, events=len(selection))
+        ics_exporter.generate_ics_string(selection)
+        best, median = best_of(lambda: ics_exporter.generate_ics_string(selection), args.repeat)
+        results.add(f"ics.cached_{size}", best, median)
+
+    from bulk_export import export_all
+    workdir = tempfile.mkdtemp(prefix="bench_export_")
+    try:
+        with contextlib.chdir(ROOT), contextlib.redirect_stdout(io.StringIO()):
+            summary = export_all(os.path.join(workdir, "all.zip"), workers=args.workers)
+        results.add("ics.bulk_export_zip", summary["seconds"], groups=summary["groups"], groups_per_sec=summary["groups"] / summary["seconds"])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_calendar(results, args):
+    # The in-memory Calendar service the sync tests use
+    sys.path.insert(0, os.path.join(ROOT, "tests"))
+    from fake_calendar import FakeCalendarService
+    from calendar_sync import get_or_create_calendar, insert_schedule_events, insert_schedule_events_batched, sync_schedule_events
+    events = store_events(args.calendar_events)
+
+    def fresh():
+        service = FakeCalendarService(latency=args.latency)
+        return service, get_or_create_calendar(service)
+
+    for name, insert in (("insert_sequential", insert_schedule_events), ("insert_batched", insert_schedule_events_batched)):
+        calls = []
+        def run():
+            service, calendar_id = fresh()
+            insert(service, calendar_id, events)
+            calls.append(service.http_calls)
+        best, median = best_of(run, args.repeat)
+        results.add(f"calendar.{name}", best, median, events=len(events), http_calls=calls[-1])
+
+    service, calendar_id = fresh()
+    sync_schedule_events(service, calendar_id, events)
+    before = service.http_calls
+    best, median = best_of(lambda: sync_schedule_events(service, calendar_id, events), args.repeat)
+    results.add("calendar.resync_unchanged", best, median, http_calls=(service.http_calls - before) // args.repeat)
+
+def run_synthetic(results, args):
+    import pandas as pd
+    from synthetic import generate_rows
+    from schedule_store import COLUMNS, write_store, ScheduleStore
+    from clash_index import build_clash_index, find_clashes
+    from occupancy import OccupancyIndex
+    from group_search import GroupSearchIndex
+
+    rows = generate_rows(groups=args.groups)
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    workdir = tempfile.mkdtemp(prefix="bench_synthetic_")
+    try:
+        store_path, index_path = os.path.join(workdir, "database.arrow"), os.path.join(workdir, "database_index.json")
+        best, median = best_of(lambda: write_store(frame, store_path, index_path), min(args.repeat, 3))
+        results.add("synthetic.write_store", best, median, groups=args.groups, rows=len(rows))
+
+        store = ScheduleStore.open(store_path, index_path)
+        groups = [(p, g) for p in store.programs() for g in store.groups(p)]
+        sample = groups[::max(1, len(groups) // 200)]
+        best, median = best_of(lambda: [store.group_frame(p, g) for p, g in sample], args.repeat)
+        results.add("synthetic.group_frame", best / len(sample), median / len(sample), groups_sampled=len(sample))
+
+        clashes = {}
+        best, median = best_of(lambda: clashes.update(build_clash_index(store)), min(args.repeat, 3))
+        results.add("synthetic.build_clash_index", best, median)
+        selection = store.group_frame(*groups[0]).to_dict('records')
+        best, median = best_of(lambda: find_clashes(selection, clashes), args.repeat)
+        results.add("synthetic.find_clashes", best, median, selected=len(selection))
+
+        occupancy = []
+        best, median = best_of(lambda: occupancy.append(OccupancyIndex.from_store(store)), min(args.repeat, 3))
+        results.add("synthetic.build_occupancy", best, median)
+        best, median = best_of(lambda: occupancy[-1].free_rooms('Tuesday', 14 * 60), args.repeat)
+        results.add("synthetic.free_rooms", best, median, rooms=len(occupancy[-1].rooms()))
+
+        search = []
+        best, median = best_of(lambda: search.append(GroupSearchIndex.from_store(store)), min(args.repeat, 3))
+        results.add("synthetic.build_search_index", best, median, terms=len(search[-1]))
+        for name, query in (("group", "SYN-012"), ("discipline", "discipline 1"), ("fuzzy", "lectuer")):
+            best, median = best_of(lambda: search[-1].search(query), args.repeat)
+            results.add(f"synthetic.search_{name}", best, median, results=len(search[-1].search(query)))
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+RUNNERS = {"extract": run_extract, "build": run_build, "load": run_load, "ics": run_ics, "calendar": run_calendar, "synthetic": run_synthetic}
+
+def compare(results, baseline, tolerance, min_delta, scales):
+    """
+    Returns the names of benchmarks that got slower than the baseline allows, printing a comparison table.
+    Baseline timings are multiplied by their suite's scale (this run's calibration over the baseline's) first.
+    """
+    regressions = []
+    print(f"\nCompared with baseline (tolerance {tolerance:.0%}, baseline scaled by "
+          + ", ".join(f"{suite} x{scale:.2f}" for suite, scale in scales.items()) + "):")
+    for name, entry in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name:<44} new")
+            continue
+        scale = scales.get(name.split('.')[0], 1.0)
+        expected = base['seconds'] * scale
+        ratio = entry['seconds'] / expected if expected else float('inf')
+        # Either run's own best-to-median spread is noise too
+        noise = max(min_delta, entry.get('median', entry['seconds']) - entry['seconds'],
+                    (base.get('median', base['seconds']) - base['seconds']) * scale)
+        slower = entry['seconds'] > expected * (1 + tolerance) and entry['seconds'] - expected > noise
+        if slower:
+            regressions.append(name)
+        print(f"  {name:<44} {expected * 1000:10.2f} -> {entry['seconds'] * 1000:10.2f} ms  x{ratio:5.2f}{'  REGRESSION' if slower else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=None, help="default: all (all but build with --quick)")
+    parser.add_argument("--quick", action="store_true", help="first 8 pages per PDF, 500 synthetic groups, no full build")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=None, help="only extract the first N pages of each PDF")
+    parser.add_argument("--workers", type=int, default=None, help="build_database worker processes")
+    parser.add_argument("--groups", type=int, default=5000, help="synthetic groups to generate")
+    parser.add_argument("--calendar-events", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated seconds per fake Calendar HTTP round trip")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--baseline", default=None, help="a previous --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown before failing (0.5 = 50%%)")
+    parser.add_argument("--min-delta", type=float, default=0.002, help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.pages = args.pages or 8
+        args.groups = min(args.groups, 500)
+    args.extract_repeat = 1 if not args.pages else min(args.repeat, 3)
+    suites = args.suites or [s for s in SUITES if not (args.quick and s == "build")]
+
+    fingerprint, cpu = machine_fingerprint()
+    # Calibrated around every suite, so each is compared under the load the host had while it ran
+    calibration = {}
+    before = calibrate(args.repeat)
+    results = Results()
+    for suite in suites:
+        print(f"{suite}:")
+        RUNNERS[suite](results, args)
+        after = calibrate(args.repeat)
+        calibration[suite] = min(before, after)
+        before = after
+
+    report = {
+        "meta": {
+            "fingerprint": fingerprint,
+            "cpu": cpu,
+            "calibration": calibration,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "suites": suites,
+            "quick": args.quick,
+            "pages": args.pages,
+            "groups": args.groups,
+            "latency": args.latency,
+        },
+        "results": results.entries,
+    }
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        meta = baseline.get("meta", {})
+        scales = {suite: seconds / meta["calibration"][suite]
+                  for suite, seconds in calibration.items() if suite in meta.get("calibration", {})}
+        regressions = compare(results.entries, baseline["results"], args.tolerance, args.min_delta, scales)
+        if meta.get("fingerprint") != fingerprint:
+            print(f"\nBaseline was recorded on another machine ({meta.get('cpu', 'unknown CPU')}, {meta.get('cpus')} cpus); "
+                  f"record one here with --json to gate on it.")
+            return 0
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
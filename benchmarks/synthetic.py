@@ -0,0 +1,69 @@
+"""
+Synthetic timetables shaped like the bundled ones (weekly slots per group, shared lectures,
+elective slots with several disciplines, online classes), for scaling tests beyond the three real PDFs.
+
+    python benchmarks/synthetic.py --groups 5000 --output /tmp/synthetic.csv
+"""
+import os
+import sys
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+SLOTS = ['08:00-08:50', '09:00-09:50', '10:00-10:50', '11:00-11:50', '12:00-12:50', '13:05-13:55',
+         '14:00-14:50', '15:00-15:50', '16:00-16:50', '17:00-17:50', '18:00-18:50', '19:00-19:50']
+TYPES = ['lecture', 'practice', 'lab']
+ONLINE_LECTURER = "https://learn.astanait.edu.kz/"
+
+def generate_rows(groups=1000, programs=10, seed=0, slots_per_group=24, elective_share=0.1):
+    """
+    Returns a list of row dicts with the schedule store's columns (Group, Day, Time, Discipline, Classroom, Type, Lecturer, Program),
+    in store order: programs one after another, each group's rows together. Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    disciplines = [f"Discipline {i}" for i in range(max(50, groups // 5))]
+    rooms = [f"C1.{rng.randint(1, 3)}.{200 + i}" for i in range(max(40, groups // 10))]
+    lecturers = [f"Lecturer {i}" for i in range(max(60, groups // 4))]
+
+    rows = []
+    for group_number in range(groups):
+        program = f"Schedules_{group_number % programs + 1} course_synthetic"
+        group = f"SYN-{group_number:05d}"
+        taken = rng.sample([(day, time) for day in DAYS for time in SLOTS], slots_per_group)
+        taken.sort(key=lambda slot: (DAYS.index(slot[0]), slot[1]))
+        for day, time in taken:
+            count = rng.randint(2, 3) if rng.random() < elective_share else 1
+            for discipline in rng.sample(disciplines, count):
+                online = rng.random() < 0.2
+                rows.append({
+                    'Group': group,
+                    'Day': day,
+                    'Time': time,
+                    'Discipline': discipline,
+                    'Classroom': 'online' if online else rng.choice(rooms),
+                    'Type': rng.choice(TYPES),
+                    'Lecturer': ONLINE_LECTURER if online else rng.choice(lecturers),
+                    'Program': program,
+                })
+    rows.sort(key=lambda row: int(row['Program'].split('_')[1].split()[0]))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--programs", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True, help="CSV file to write (same columns as database.csv)")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from schedule_store import COLUMNS
+    rows = generate_rows(args.groups, args.programs, args.seed)
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(args.output, index=False)
+    print(f"Wrote {len(rows)} rows for {args.groups} groups to {args.output}")
+
+if __name__ == "__main__":
+    main()
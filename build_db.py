@@ -1,34 +1,315 @@
 import os
-import pandas as pd
-from extractor import extract_schedule
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from extractor import extract_pages, count_pages, prune_page_cache
+from schedule_store import (STORE_FILE, INDEX_FILE, CLASH_INDEX_FILE, OCCUPANCY_INDEX_FILE, SEARCH_INDEX_FILE, StoreWriter,
+                            ScheduleStore, open_store)
+from ics_exporter import DEFAULT_ICS_DIR, write_group_calendars
+from clash_index import write_clash_index
+from occupancy import write_occupancy_index
+from group_search import write_search_index
+from terms import get_term
 
-def build_database(schedules_dir="schedules", output_csv="database.csv"):
-    if not os.path.exists(schedules_dir):
-        print(f"Directory '{schedules_dir}' does not exist.")
+MANIFEST_FILE = "database_manifest.json"
+MANIFEST_VERSION = 1
+# Where each freshly parsed PDF is written before being copied into the new store
+SPOOL_FILE = "database_spool.arrow"
+SPOOL_INDEX_FILE = "database_spool_index.json"
+# Per-page extraction results keyed by page content hash, next to the output
+PAGE_CACHE_DIR = "page_cache"
+# Pages handed to a worker in one task; small enough to balance a 150-page PDF across cores
+PAGES_PER_TASK = 8
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(manifest_path, files):
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f, indent=2, sort_keys=True)
+
+def open_previous_store(output_dir, output_csv):
+    """Opens the previous build so rows of unchanged PDFs can be copied over, or returns None."""
+    try:
+        return open_store(os.path.join(output_dir, STORE_FILE), os.path.join(output_dir, INDEX_FILE), output_csv)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Could not read the previous build, rebuilding everything: {e}")
+        return None
+
+def _iter_task_results(tasks, workers, cache_dir=None):
+    """Runs (filename, pdf_path, pages) tasks and yields (filename, extract_pages result or exception) in task order."""
+    if workers <= 1 or len(tasks) <= 1:
+        for filename, pdf_path, pages in tasks:
+            try:
+                yield filename, extract_pages(pdf_path, pages, cache_dir)
+            except Exception as e:
+                yield filename, e
         return
 
-    all_dfs = []
-    
-    for filename in os.listdir(schedules_dir):
-        if filename.lower().endswith(".pdf"):
-            pdf_path = os.path.join(schedules_dir, filename)
-            program_name = os.path.splitext(filename)[0] # e.g. "Schedule_1 course M_3 trim" -> "Schedule_1 course M_3 trim"
-            
-            print(f"Parsing: {filename}...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a couple of tasks per worker in flight: enough to stay busy, few enough that
+        # finished results never pile up in memory ahead of the writer
+        pending = iter(tasks)
+        in_flight = deque()
+
+        def submit_next():
+            task = next(pending, None)
+            if task is not None:
+                filename, pdf_path, pages = task
+                in_flight.append((filename, pool.submit(extract_pages, pdf_path, pages, cache_dir)))
+
+        for _ in range(workers * 2):
+            submit_next()
+        while in_flight:
+            filename, future = in_flight.popleft()
+            submit_next()
             try:
-                df = extract_schedule(pdf_path)
-                if not df.empty:
-                    df['Program'] = program_name
-                    all_dfs.append(df)
+                yield filename, future.result()
             except Exception as e:
-                print(f"Failed to parse {filename}: {e}")
-                
-    if all_dfs:
-        final_df = pd.concat(all_dfs, ignore_index=True)
-        final_df.to_csv(output_csv, index=False)
-        print(f"\nSuccess! Built {output_csv} with {len(final_df)} extracted classes across {len(all_dfs)} programs.")
+                yield filename, e
+
+def task_count(page_count):
+    return -(-page_count // PAGES_PER_TASK)
+
+def iter_parsed_tasks(jobs, workers, cache_dir=None):
+    """
+    Parses the pages of every (filename, pdf_path, page_count) job and yields (filename, extract_pages result or
+    exception) per task of PAGES_PER_TASK pages, in job and page order: task_count(page_count) results per file.
+    Pages are split into tasks so one large PDF is spread across all workers.
+    """
+    tasks = []
+    for filename, pdf_path, page_count in jobs:
+        for first in range(0, page_count, PAGES_PER_TASK):
+            pages = list(range(first, min(first + PAGES_PER_TASK, page_count)))
+            tasks.append((filename, pdf_path, pages))
+    return _iter_task_results(tasks, workers, cache_dir)
+
+def spool_parsed_file(results, tasks, program_name, spool):
+    """
+    Writes the next `tasks` results of iter_parsed_tasks (one file's pages) into the spool StoreWriter as they come back.
+    Returns (rows, page_timings, page_notes, error); on error the spool is aborted, otherwise closed.
+    """
+    rows, timings, notes, error = 0, [], [], None
+    for _ in range(tasks):
+        _, outcome = next(results)
+        if isinstance(outcome, Exception):
+            error = error or outcome
+            continue
+        chunk, chunk_timings, chunk_notes = outcome
+        timings.extend(chunk_timings)
+        notes.extend(chunk_notes)
+        if error is None:
+            for row in chunk:
+                row['Program'] = program_name
+            spool.write_rows(chunk)
+            rows += len(chunk)
+    if error is None:
+        spool.close()
     else:
+        spool.abort()
+    return rows, timings, notes, error
+
+def print_report(report):
+    print("\nIngestion report:")
+    for entry in report:
+        status = entry["status"]
+        if status == "reused":
+            print(f"  {entry['file']}: reused {entry['rows']} rows (unchanged)")
+            continue
+        if status == "failed":
+            print(f"  {entry['file']}: FAILED after {entry['seconds']:.2f}s: {entry['error']}")
+            continue
+        pages = entry["pages"]
+        print(f"  {entry['file']}: {entry['rows']} rows from {len(pages)} pages in {entry['seconds']:.2f}s")
+        if pages:
+            slowest = max(pages, key=lambda p: p["seconds"])
+            mean = sum(p["seconds"] for p in pages) / len(pages)
+            print(f"    per page: mean {mean * 1000:.0f} ms, slowest page {slowest['page'] + 1} at {slowest['seconds'] * 1000:.0f} ms")
+            cached = sum(1 for p in pages if p.get("cached"))
+            if cached:
+                print(f"    {cached} unchanged pages taken from the page cache")
+            for p in pages:
+                if p.get("engine") == "words":
+                    print(f"    page {p['page'] + 1} read from word positions: {'; '.join(p['problems'])}")
+
+def build_database(schedules_dir="schedules", output_csv="database.csv", workers=None, force=False, report_path=None,
+                   ics_dir=DEFAULT_ICS_DIR, term=None, page_cache_dir=None):
+    """
+    Parses schedules_dir into output_csv and the store and indexes next to it. term dates the pre-rendered calendars.
+    Page results are cached in page_cache_dir (default: page_cache/ next to output_csv, '' disables it), so a
+    re-issued PDF only pays for the pages that changed.
+    """
+    if not os.path.exists(schedules_dir):
+        print(f"Directory '{schedules_dir}' does not exist.")
+        return
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    output_dir = os.path.dirname(output_csv)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    old_manifest = {} if force else load_manifest(manifest_path)
+    if page_cache_dir is None:
+        page_cache_dir = os.path.join(output_dir, PAGE_CACHE_DIR)
+    if force and page_cache_dir:
+        prune_page_cache(page_cache_dir, set())
+    previous_store = open_previous_store(output_dir, output_csv) if old_manifest else None
+    previous_programs = set(previous_store.programs()) if previous_store is not None else set()
+
+    # Uppercase sort matches the order Windows lists these files in, which the committed database.csv uses
+    filenames = sorted((f for f in os.listdir(schedules_dir) if f.lower().endswith(".pdf")), key=str.upper)
+
+    new_manifest = {}
+    report = {}
+    to_parse = []
+    for filename in filenames:
+        pdf_path = os.path.join(schedules_dir, filename)
+        program_name = os.path.splitext(filename)[0] # e.g. "Schedule_1 course M_3 trim" -> "Schedule_1 course M_3 trim"
+        sha = file_sha256(pdf_path)
+        entry = old_manifest.get(filename)
+
+        if entry and entry.get("sha256") == sha and program_name in previous_programs:
+            new_manifest[filename] = entry
+            report[filename] = {"file": filename, "status": "reused", "rows": entry.get("rows", 0)}
+            continue
+
+        try:
+            page_count = count_pages(pdf_path)
+        except Exception as e:
+            print(f"Failed to parse {filename}: {e}")
+            report[filename] = {"file": filename, "status": "failed", "seconds": 0.0, "error": str(e)}
+            continue
+        print(f"Parsing: {filename} ({page_count} pages)...")
+        to_parse.append((filename, pdf_path, page_count))
+        new_manifest[filename] = {"sha256": sha, "pages": page_count}
+
+    # Rows go from the parser (or the previous store) into the new store a task's worth of pages at a time, so memory
+    # doesn't grow with the size or number of PDFs. Each PDF is spooled to disk first and copied over once all of its
+    # pages parsed, so a file that fails halfway is still dropped whole.
+    started = time.perf_counter()
+    parsed = iter_parsed_tasks(to_parse, workers, page_cache_dir)
+    spool_paths = (os.path.join(output_dir, SPOOL_FILE), os.path.join(output_dir, SPOOL_INDEX_FILE))
+    writer = StoreWriter(os.path.join(output_dir, STORE_FILE), os.path.join(output_dir, INDEX_FILE), output_csv)
+    programs_written = 0
+    try:
+        for filename in filenames:
+            program_name = os.path.splitext(filename)[0]
+            if filename not in new_manifest:
+                continue
+            if report.get(filename, {}).get("status") == "reused":
+                for chunk in previous_store.iter_program_rows(program_name):
+                    writer.write_rows(chunk)
+                programs_written += 1
+                continue
+
+            rows, timings, notes, error = spool_parsed_file(parsed, task_count(new_manifest[filename]["pages"]), program_name,
+                                                            StoreWriter(*spool_paths))
+            seconds = sum(t for _, t in timings)
+            if error is not None:
+                print(f"Failed to parse {filename}: {error}")
+                report[filename] = {"file": filename, "status": "failed", "seconds": seconds, "error": str(error)}
+                del new_manifest[filename]
+                continue
+            new_manifest[filename]["rows"] = rows
+            notes = sorted(notes, key=lambda note: note["page"])
+            if page_cache_dir:
+                new_manifest[filename]["page_keys"] = [note["key"] for note in notes]
+            report[filename] = {
+                "file": filename,
+                "status": "parsed",
+                "rows": rows,
+                "seconds": seconds,
+                "pages": [dict(note, seconds=t) for (p, t), note in zip(sorted(timings), notes)],
+            }
+            if rows:
+                spooled = ScheduleStore.open(*spool_paths)
+                for chunk in spooled.iter_program_rows(program_name):
+                    writer.write_rows(chunk)
+                spooled.close()
+                programs_written += 1
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        for path in spool_paths:
+            if os.path.exists(path):
+                os.remove(path)
+    elapsed = time.perf_counter() - started
+
+    report = [report[f] for f in filenames if f in report]
+    print_report(report)
+    if to_parse:
+        print(f"  wall time for {sum(p for _, _, p in to_parse)} pages on {workers} worker(s): {elapsed:.2f}s")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({"workers": workers, "wall_seconds": elapsed, "files": report}, f, indent=2)
+
+    if previous_store is not None:
+        previous_store.close()
+    if writer.rows:
+        writer.close()
+        save_manifest(manifest_path, new_manifest)
+        if page_cache_dir:
+            # Keep only the pages of the PDFs in this build, so the cache doesn't grow with every re-issue
+            prune_page_cache(page_cache_dir, {key for entry in new_manifest.values() for key in entry.get("page_keys", [])})
+        print(f"\nSuccess! Built {output_csv} with {writer.rows} extracted classes across {programs_written} programs.")
+        store = open_store(os.path.join(output_dir, STORE_FILE), os.path.join(output_dir, INDEX_FILE))
+        clashing = write_clash_index(store, os.path.join(output_dir, CLASH_INDEX_FILE))
+        print(f"Indexed overlapping slots: {clashing} groups have classes that can clash.")
+        occupancy = write_occupancy_index(store, os.path.join(output_dir, OCCUPANCY_INDEX_FILE))
+        print(f"Indexed occupancy of {len(occupancy.rooms())} rooms and {len(occupancy.lecturers())} lecturers "
+              f"({len(occupancy.double_bookings('rooms'))} room and {len(occupancy.double_bookings('lecturers'))} lecturer double bookings).")
+        search = write_search_index(store, os.path.join(output_dir, SEARCH_INDEX_FILE))
+        print(f"Indexed {len(search)} group codes, disciplines and lecturers for search.")
+        if ics_dir:
+            started = time.perf_counter()
+            # Stamped with the time of the store just written, as generate_ics_string does for the term's own store
+            built_at = int(os.path.getmtime(os.path.join(output_dir, STORE_FILE)))
+            written = write_group_calendars(store, ics_dir, term, built_at)
+            print(f"Pre-rendered {written} group calendars into {ics_dir}/ in {time.perf_counter() - started:.2f}s.")
+        store.close()
+    else:
+        writer.abort()
         print("\nNo valid schedule data found.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse the schedule PDFs into database.csv")
+    parser.add_argument("--term", default=None, help="term of terms.json to build (default: the catalog's default term)")
+    parser.add_argument("--schedules-dir", default=None, help="default: the term's schedules_dir")
+    parser.add_argument("--output", default=None, help="default: database.csv in the term's data_dir")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count, 1 disables the pool)")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and re-parse every PDF")
+    parser.add_argument("--report", default=None, help="write the per-file/per-page timing report as JSON")
+    parser.add_argument("--ics-dir", default=None, help="where to pre-render per-group .ics files (default: ics/ in the term's data_dir, '' to skip)")
+    parser.add_argument("--page-cache", default=None, help="per-page result cache (default: page_cache/ next to the output, '' to disable)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    build_database()
+    args = parse_args()
+    term = get_term(args.term)
+    build_database(args.schedules_dir or term.schedules_dir, args.output or term.csv_path, workers=args.workers, force=args.force,
+                   report_path=args.report, ics_dir=term.ics_dir if args.ics_dir is None else args.ics_dir, term=term,
+                   page_cache_dir=args.page_cache)
@@ -0,0 +1,220 @@
+"""
+Exports the full-schedule calendar of every (program, group) of a term in one go, for publishing them all at once.
+
+    python bulk_export.py --output exports/            # one .ics per group, in a folder per program
+    python bulk_export.py --output calendars.zip       # the same layout inside a zip archive
+    python bulk_export.py --term 2026-27-t1 --program "Schedules_1 course_3 trim" --sync-plans --workers 4
+
+Groups are rendered with generate_ics_string in worker processes, a batch of groups per task, and written out
+as the batches come back, so memory holds a few batches rather than the whole export. Into a directory, files
+whose content didn't change are left untouched, so a re-export after a schedule update only rewrites what moved,
+and calendars of groups that no longer exist are removed.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ics_exporter import generate_ics_string, group_ics_path
+from terms import get_catalog
+
+# Groups rendered per worker task: big enough to amortise the round trip, small enough to balance across cores
+GROUPS_PER_TASK = 16
+
+def render_groups(term_id, groups, sync_plans=False):
+    """
+    Renders [(program, group), ...] of a term; returns [(program, group, events, ics bytes, sync plan JSON bytes or None)].
+    Runs in a worker process: the term's store is opened once per process by the catalog.
+    """
+    catalog = get_catalog()
+    term = catalog.get(term_id)
+    store = catalog.store(term_id)
+    rendered = []
+    for program, group in groups:
+        events = store.group_frame(program, group).to_dict('records')
+        ics = generate_ics_string(events, term=term).encode('utf-8')
+        plan = None
+        if sync_plans:
+            # The Google client libraries are only loaded when sync plans are asked for
+            from calendar_sync import sync_plan
+            plan = json.dumps(sync_plan(events, term=term), ensure_ascii=False, indent=1).encode('utf-8')
+        rendered.append((program, group, len(events), ics, plan))
+    return rendered
+
+def _quiet_worker():
+    # Groups with elective slots always contain overlapping classes; one warning per group would drown the report
+    logging.getLogger("ics_exporter").setLevel(logging.ERROR)
+
+def iter_rendered(term_id, groups, workers, sync_plans=False):
+    """Yields render_groups results batch by batch, in the order of groups."""
+    batches = [groups[i:i + GROUPS_PER_TASK] for i in range(0, len(groups), GROUPS_PER_TASK)]
+    if workers <= 1 or len(batches) <= 1:
+        _quiet_worker()
+        for batch in batches:
+            yield render_groups(term_id, batch, sync_plans)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        # A couple of batches per worker in flight, like build_db: finished batches never pile up ahead of the writer
+        pending = iter(batches)
+        in_flight = deque()
+
+        def submit_next():
+            batch = next(pending, None)
+            if batch is not None:
+                in_flight.append(pool.submit(render_groups, term_id, batch, sync_plans))
+
+        for _ in range(workers * 2):
+            submit_next()
+        while in_flight:
+            future = in_flight.popleft()
+            submit_next()
+            yield future.result()
+
+# Files an export writes; anything else in the output directory is never removed
+EXPORT_SUFFIXES = (".ics", ".sync.json")
+
+class DirectoryWriter:
+    """
+    Writes each file under a directory (same layout as build_db's ics/), skipping files that are already identical.
+    close() removes the calendars and sync plans of an earlier export that this one didn't write, in the folders
+    of programs (all program folders if not given).
+    """
+
+    def __init__(self, output_dir, programs=None):
+        self.output_dir = output_dir
+        self.programs = programs
+        self.unchanged = 0
+        self.removed = 0
+        self._written = set()
+
+    def write(self, name, data):
+        self._written.add(os.path.normpath(name))
+        path = os.path.join(self.output_dir, name)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    self.unchanged += 1
+                    return
+        except OSError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        if self.programs is not None:
+            folders = [os.path.dirname(group_ics_path(program, "", "")) for program in self.programs]
+        elif os.path.isdir(self.output_dir):
+            folders = [name for name in os.listdir(self.output_dir) if os.path.isdir(os.path.join(self.output_dir, name))]
+        else:
+            folders = []
+        for folder in folders:
+            folder_path = os.path.join(self.output_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in os.listdir(folder_path):
+                if name.endswith(EXPORT_SUFFIXES) and os.path.join(folder, name) not in self._written:
+                    os.remove(os.path.join(folder_path, name))
+                    self.removed += 1
+            if not os.listdir(folder_path):
+                os.rmdir(folder_path)
+
+    def abort(self):
+        pass
+
+class ZipWriter:
+    """Streams each file into a zip archive, swapped in by close() so a half-written archive is never published."""
+
+    def __init__(self, path):
+        self.path = path
+        self.unchanged = 0
+        self.removed = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._zip = zipfile.ZipFile(path + ".tmp", 'w', zipfile.ZIP_DEFLATED)
+
+    def write(self, name, data):
+        self._zip.writestr(name.replace(os.sep, '/'), data)
+
+    def close(self):
+        self._zip.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self._zip.close()
+        os.remove(self.path + ".tmp")
+
+def export_all(output, term_id=None, programs=None, workers=None, sync_plans=False):
+    """
+    Exports every group of a term (only those of programs, if given) to output: a directory, or a zip archive
+    if output ends in .zip. Returns the throughput summary that is also printed.
+    """
+    catalog = get_catalog()
+    term = catalog.get(term_id)
+    store = catalog.store(term.id)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    missing = set(programs or ()) - set(store.programs())
+    if missing:
+        raise ValueError(f"Unknown programs: {', '.join(sorted(missing))}")
+    groups = [(program, group) for program in store.programs() if not programs or program in programs for group in store.groups(program)]
+
+    writer = ZipWriter(output) if output.lower().endswith(".zip") else DirectoryWriter(output, programs)
+    started = time.perf_counter()
+    files = events = size = 0
+    try:
+        for batch in iter_rendered(term.id, groups, workers, sync_plans):
+            for program, group, event_count, ics, plan in batch:
+                # "<program>/<group>.ics", as in build_db's pre-rendered ics/ directory
+                name = group_ics_path(program, group, "")
+                writer.write(name, ics)
+                files += 1
+                size += len(ics)
+                if plan is not None:
+                    writer.write(os.path.splitext(name)[0] + ".sync.json", plan)
+                    files += 1
+                    size += len(plan)
+                events += event_count
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    elapsed = time.perf_counter() - started
+
+    summary = {"term": term.id, "groups": len(groups), "events": events, "files": files, "unchanged": writer.unchanged,
+               "removed": writer.removed, "bytes": size, "seconds": elapsed, "workers": workers}
+    rate = len(groups) / elapsed if elapsed else float('inf')
+    print(f"Exported {len(groups)} groups ({events} classes) of {term.name} into {output} in {elapsed:.2f}s on {workers} worker(s)")
+    print(f"  {rate:.0f} groups/s, {size / 1e6 / elapsed if elapsed else 0:.1f} MB/s; {files} files, {size / 1e6:.1f} MB"
+          + (f", {writer.unchanged} unchanged" if writer.unchanged else "")
+          + (f", {writer.removed} stale removed" if writer.removed else ""))
+    return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the calendars of every group of a term to a directory or zip archive")
+    parser.add_argument("--output", required=True, help="directory to write into, or a .zip archive to create")
+    parser.add_argument("--term", default=None, help="term of terms.json to export (default: the catalog's default term)")
+    parser.add_argument("--program", action="append", default=None, help="only export this program (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count, 1 disables the pool)")
+    parser.add_argument("--sync-plans", action="store_true",
+                        help="also write each group's Google Calendar event resources as <group>.sync.json")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        export_all(args.output, args.term, args.program, args.workers, args.sync_plans)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    except ValueError as e:
+        print(e)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,40 @@
 import os
+import copy
+import contextlib
 import json
+import time
+import random
 import datetime
+import functools
+import threading
+import httplib2
+import google_auth_httplib2
 import streamlit as st
+from collections import OrderedDict
+from google.auth import jwt
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.errors import HttpError
+from schedule_events import merge_consecutive_slots, keyed_events, content_hash
+from clash_index import find_clashes, load_clash_index
+from terms import get_term
+from perf import timed, count
 
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-CALENDAR_NAME = "AITU Schedule - Trimester 3"
+# 'openid' adds an ID token to the credentials, whose subject identifies the account (see account_subject)
+SCOPES = ['openid', 'https://www.googleapis.com/auth/calendar']
+HTTP_TIMEOUT_SECONDS = 30
+CALENDAR_ID_CACHE_SIZE = 10000
 
 def get_client_config():
+    """Returns the Google Cloud Client config, parsed once per process (see _load_client_config)."""
+    with timed("calendar.client_config"):
+        # Hand out a copy so callers can't mutate the cached config
+        return copy.deepcopy(_load_client_config())
+
+@functools.lru_cache(maxsize=1)
+def _load_client_config():
     """Returns the Google Cloud Client config from Streamlit Secrets, environment vars, or local file."""
     # 1. Try Streamlit Cloud Secrets
     try:
@@ -71,18 +96,128 @@ def get_credentials_from_code(code, redirect_uri=None):
         scopes=SCOPES,
         redirect_uri=redirect_uri
     )
-    flow.fetch_token(code=code)
+    with timed("calendar.token_exchange"), _relaxed_token_scope():
+        flow.fetch_token(code=code)
     return flow.credentials
 
+_relaxed_scope_lock = threading.Lock()
+_relaxed_scope_users = 0
+_relaxed_scope_previous = None
+
+@contextlib.contextmanager
+def _relaxed_token_scope():
+    """
+    Sets OAUTHLIB_RELAX_TOKEN_SCOPE only while token exchanges are in flight: with 'openid' and include_granted_scopes
+    Google returns more scopes than requested, which oauthlib otherwise rejects. oauthlib only reads the setting from
+    the environment, so it is restored after the last exchange rather than relaxing every oauthlib user in the process.
+    """
+    global _relaxed_scope_users, _relaxed_scope_previous
+    with _relaxed_scope_lock:
+        if _relaxed_scope_users == 0:
+            _relaxed_scope_previous = os.environ.get("OAUTHLIB_RELAX_TOKEN_SCOPE")
+            os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = "1"
+        _relaxed_scope_users += 1
+    try:
+        yield
+    finally:
+        with _relaxed_scope_lock:
+            _relaxed_scope_users -= 1
+            if _relaxed_scope_users == 0:
+                if _relaxed_scope_previous is None:
+                    del os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"]
+                else:
+                    os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = _relaxed_scope_previous
+
+@functools.lru_cache(maxsize=1)
+def get_discovery_document():
+    """
+    Parsed Calendar v3 discovery document, from the static copy bundled with google-api-python-client.
+    Loaded once per process, so building a service never hits the network or re-parses 130 KB of JSON.
+    """
+    doc = discovery_cache.get_static_doc('calendar', 'v3')
+    if doc is None:
+        return None
+    return json.loads(doc)
+
+_transports = threading.local()
+
+def _get_base_http():
+    """One keep-alive httplib2 transport per thread (httplib2.Http is not thread-safe), reused across syncs."""
+    http = getattr(_transports, 'http', None)
+    if http is None:
+        http = _transports.http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+    return http
+
 def get_calendar_service(creds):
     """Builds the service directly from provided credentials."""
-    service = build('calendar', 'v3', credentials=creds)
-    return service
+    with timed("calendar.build_service"):
+        document = get_discovery_document()
+        if document is None:
+            # Older client without bundled documents: let it fetch discovery itself
+            return build('calendar', 'v3', credentials=creds)
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=_get_base_http())
+        return build_from_document(document, http=http)
+
+def account_subject(creds):
+    """The Google account's stable 'sub' from the credentials' ID token, or None without one."""
+    id_token = getattr(creds, 'id_token', None)
+    if not id_token:
+        return None
+    try:
+        # Received straight from Google's token endpoint, so the signature needn't be re-checked here
+        return jwt.decode(id_token, verify=False).get('sub')
+    except ValueError:
+        return None
+
+_calendar_ids = OrderedDict()
+_calendar_ids_lock = threading.Lock()
+
+def get_or_create_calendar(service, name=None, account=None, term=None):
+    """
+    Returns the id of the calendar called name (default: the term's calendar name), creating it in the term's timezone if needed.
+    With an account (see account_subject) the id is remembered per (account, name): later syncs check it
+    with a single calendars().get instead of paging through the whole calendar list.
+    """
+    term = term or get_term()
+    name = name or term.calendar_name
+    with timed("calendar.lookup"):
+        if account is None:
+            return _find_or_create_calendar(service, name, term.timezone)
+        
+        key = (account, name)
+        with _calendar_ids_lock:
+            calendar_id = _calendar_ids.get(key)
+        if calendar_id is not None and _calendar_matches(service, calendar_id, name):
+            with _calendar_ids_lock:
+                _calendar_ids.move_to_end(key)
+            return calendar_id
+        
+        calendar_id = _find_or_create_calendar(service, name, term.timezone)
+        with _calendar_ids_lock:
+            _calendar_ids[key] = calendar_id
+            while len(_calendar_ids) > CALENDAR_ID_CACHE_SIZE:
+                _calendar_ids.popitem(last=False)
+        return calendar_id
+
+def _execute(request, method):
+    # Every Calendar API round trip is timed per method, e.g. calendar.api.events_list
+    with timed("calendar.api." + method):
+        return request.execute()
+
+def _calendar_matches(service, calendar_id, name):
+    # The user may have deleted or renamed the calendar since it was cached
+    try:
+        calendar = _execute(service.calendars().get(calendarId=calendar_id), "calendars_get")
+    except HttpError as e:
+        if e.status_code in (403, 404, 410):
+            return False
+        raise
+    return calendar.get('summary') == name
 
-def get_or_create_calendar(service, name=CALENDAR_NAME):
+def _find_or_create_calendar(service, name, timezone):
     page_token = None
     while True:
-        calendar_list = service.calendarList().list(pageToken=page_token).execute()
+        calendar_list = _execute(service.calendarList().list(pageToken=page_token), "calendar_list")
         for calendar_list_entry in calendar_list['items']:
             if calendar_list_entry['summary'] == name:
                 return calendar_list_entry['id']
@@ -92,78 +227,285 @@ def get_or_create_calendar(service, name=CALENDAR_NAME):
 
     calendar = {
         'summary': name,
-        'timeZone': 'Asia/Almaty'
+        'timeZone': timezone
     }
-    created_calendar = service.calendars().insert(body=calendar).execute()
+    created_calendar = _execute(service.calendars().insert(body=calendar), "calendars_insert")
     return created_calendar['id']
 
-def insert_schedule_events(service, calendar_id, selected_events):
-    # selected_events is a list of dicts: {'Group': '...', 'Day': 'Monday', 'Time': '18:00-18:50', 'Discipline': '...', 'Classroom': '...', 'Type': '...', 'Lecturer': '...'}
-    day_mapping = {
-        'Monday': '2026-03-09',
-        'Tuesday': '2026-03-10',
-        'Wednesday': '2026-03-11',
-        'Thursday': '2026-03-12',
-        'Friday': '2026-03-13',
-        'Saturday': '2026-03-14',
-        'Sunday': '2026-03-15',
-    }
+# Google Calendar supports 11 predefined event colors (colorId '1' through '11')
+AVAILABLE_COLOR_IDS = [str(i) for i in range(1, 12)]
+
+# Calendar API recommends at most 50 requests per batch
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_RETRIES = 5
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded'}
+
+# Private extended properties that let a later sync recognise the events it created
+SCHEDULE_KEY_PROPERTY = 'aituScheduleKey'
+SCHEDULE_HASH_PROPERTY = 'aituScheduleHash'
+
+def build_event_body(ev, color_id, term=None):
+    """
+    Builds the Calendar API event resource for one schedule row, or None if its day/time can't be parsed.
+    The event repeats weekly from the term's first week to its last day, skipping the term's holidays.
+    """
+    term = term or get_term()
+    day_mapping = term.first_dates
     
-    # Google Calendar supports 11 predefined event colors (colorId '1' through '11')
-    available_color_ids = [str(i) for i in range(1, 12)]
-    discipline_colors = {}
+    day_str = ev.get('Day', '').strip()
+    time_str = ev.get('Time', '').strip()
+    discipline = ev.get('Discipline', '')
     
-    events_created = []
+    if day_str not in day_mapping or not time_str:
+        return None
+        
+    base_date = day_mapping[day_str]
+    offset = term.utc_offset(base_date)
     
-    for ev in selected_events:
-        day_str = ev.get('Day', '').strip()
-        time_str = ev.get('Time', '').strip()
-        discipline = ev.get('Discipline', '')
+    # Parse time (e.g., '18:00-18:50')
+    parts = time_str.split('-')
+    if len(parts) != 2:
+        return None
         
-        if day_str not in day_mapping or not time_str:
+    start_time, end_time = parts[0].strip(), parts[1].strip()
+    # Formulate RFC3339 datetime
+    start_datetime = f"{base_date.isoformat()}T{start_time}:00{offset}"
+    end_datetime = f"{base_date.isoformat()}T{end_time}:00{offset}"
+    recurrence = [term.rrule()]
+    exdate = term.exdate(day_str, start_time)
+    if exdate:
+        recurrence.append(exdate)
+    
+    return {
+        'summary': discipline,
+        'location': ev.get('Classroom', ''),
+        'description': f"Group: {ev.get('Group', 'Unknown')}\nType: {ev.get('Type', '')}\nLecturer: {ev.get('Lecturer', '')}",
+        'colorId': color_id,
+        'start': {
+            'dateTime': start_datetime,
+            'timeZone': term.timezone,
+        },
+        'end': {
+            'dateTime': end_datetime,
+            'timeZone': term.timezone,
+        },
+        'recurrence': recurrence,
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'popup', 'minutes': 10},
+            ],
+        },
+    }
+
+def discipline_color(discipline):
+    """Event color of a discipline, from its name alone: adding or dropping other disciplines never repaints it."""
+    return AVAILABLE_COLOR_IDS[int(content_hash(discipline), 16) % len(AVAILABLE_COLOR_IDS)]
+
+def _event_bodies(selected_events, term=None):
+    """
+    Yields (index, key, body) for every parseable event, colored per discipline (see discipline_color).
+    The body carries its key and content hash as private extended properties for diff-based re-syncs.
+    """
+    term = term or get_term()
+    for i, (key, ev) in enumerate(keyed_events(selected_events)):
+        body = build_event_body(ev, discipline_color(ev.get('Discipline', '')), term)
+        if body is None:
             continue
+        body['extendedProperties'] = {'private': {
+            SCHEDULE_KEY_PROPERTY: key,
+            SCHEDULE_HASH_PROPERTY: content_hash(body),
+        }}
+        yield i, key, body
+
+def sync_plan(selected_events, merge=True, term=None):
+    """The Calendar API event resources a sync of selected_events creates, without calling the API (for review or bulk export)."""
+    if merge:
+        selected_events = merge_consecutive_slots(selected_events)
+    return [body for _, _, body in _event_bodies(selected_events, term)]
+
+def insert_schedule_events(service, calendar_id, selected_events, merge=True, term=None):
+    # selected_events is a list of dicts: {'Group': '...', 'Day': 'Monday', 'Time': '18:00-18:50', 'Discipline': '...', 'Classroom': '...', 'Type': '...', 'Lecturer': '...'}
+    if merge:
+        # One recurring event per block of back-to-back slots instead of one per 50-minute slot
+        selected_events = merge_consecutive_slots(selected_events)
+    events_created = []
+    
+    for _, _, event in _event_bodies(selected_events, term):
+        created_event = _execute(service.events().insert(calendarId=calendar_id, body=event), "events_insert")
+        events_created.append(created_event['id'])
             
-        base_date = day_mapping[day_str]
+    return events_created
+
+def is_rate_limited(error):
+    """True for the 429 and 403 rate-limit/quota errors Google asks clients to retry with backoff."""
+    if not isinstance(error, HttpError):
+        return False
+    if error.status_code == 429:
+        return True
+    if error.status_code == 403:
+        details = error.error_details if isinstance(error.error_details, list) else []
+        return any(isinstance(d, dict) and d.get('reason') in RATE_LIMIT_REASONS for d in details)
+    return False
+
+def execute_batched(service, requests, chunk_size=DEFAULT_BATCH_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                    base_delay=1.0, sleep=time.sleep, progress=None):
+    """
+    Executes (key, HttpRequest) pairs through the client's batch endpoint, chunk_size at a time.
+    Requests that fail with a rate-limit error are retried in a later batch with exponential backoff and jitter.
+    progress, if given, is called as progress(finished, total) after every batch call.
+    Returns {key: (response, error)} with exactly one of response/error set.
+    """
+    results = {}
+    pending = list(requests)
+    
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        attempt = 0
         
-        # Parse time (e.g., '18:00-18:50')
-        parts = time_str.split('-')
-        if len(parts) != 2:
-            continue
+        while chunk:
+            retry = []
+            by_id = {str(i): (key, request) for i, (key, request) in enumerate(chunk)}
             
-        start_time, end_time = parts[0].strip(), parts[1].strip()
-        # Formulate RFC3339 datetime
-        start_datetime = f"{base_date}T{start_time}:00+05:00"
-        end_datetime = f"{base_date}T{end_time}:00+05:00"
-        
-        # Assign a consistent colorId per discipline
-        if discipline not in discipline_colors:
-            discipline_colors[discipline] = available_color_ids[len(discipline_colors) % 11]
+            def callback(request_id, response, exception):
+                key, request = by_id[request_id]
+                if exception is not None and is_rate_limited(exception) and attempt < max_retries:
+                    retry.append((key, request))
+                else:
+                    results[key] = (response, exception)
             
-        event = {
-            'summary': discipline,
-            'location': ev.get('Classroom', ''),
-            'description': f"Group: {ev.get('Group', 'Unknown')}\nType: {ev.get('Type', '')}\nLecturer: {ev.get('Lecturer', '')}",
-            'colorId': discipline_colors[discipline],
-            'start': {
-                'dateTime': start_datetime,
-                'timeZone': 'Asia/Almaty',
-            },
-            'end': {
-                'dateTime': end_datetime,
-                'timeZone': 'Asia/Almaty',
-            },
-            'recurrence': [
-                'RRULE:FREQ=WEEKLY;UNTIL=20260517T000000Z'
-            ],
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'popup', 'minutes': 10},
-                ],
-            },
-        }
-        
-        created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
-        events_created.append(created_event['id'])
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id, (_, request) in by_id.items():
+                batch.add(request, request_id=request_id)
+            count("calendar.api.batched_requests", len(chunk))
+            try:
+                _execute(batch, "batch")
+            except HttpError as e:
+                # The whole batch call was rejected; retry all of it if it was throttled
+                if not (is_rate_limited(e) and attempt < max_retries):
+                    raise
+                count("calendar.rate_limited_batches")
+                retry = chunk
             
-    return events_created
+            if progress is not None:
+                progress(len(results), len(pending))
+            chunk = retry
+            if chunk:
+                count("calendar.rate_limit_retries", len(chunk))
+                sleep(base_delay * (2 ** attempt) + random.uniform(0, base_delay))
+                attempt += 1
+                
+    return results
+
+def insert_schedule_events_batched(service, calendar_id, selected_events, chunk_size=DEFAULT_BATCH_SIZE,
+                                   max_retries=DEFAULT_MAX_RETRIES, merge=True, term=None):
+    """
+    Batched variant of insert_schedule_events.
+    Returns one result per event (per merged block when merge=True), in order:
+    {'event': event dict, 'status': 'created' | 'failed' | 'skipped', 'id': event id or None, 'error': message or None}
+    """
+    if merge:
+        selected_events = merge_consecutive_slots(selected_events)
+    results = [{'event': ev, 'status': 'skipped', 'id': None, 'error': None} for ev in selected_events]
+    events = service.events()
+    requests = [(i, events.insert(calendarId=calendar_id, body=body)) for i, _, body in _event_bodies(selected_events, term)]
+    
+    for i, (response, error) in execute_batched(service, requests, chunk_size, max_retries).items():
+        if error is not None:
+            results[i].update(status='failed', error=str(error))
+        else:
+            results[i].update(status='created', id=response['id'])
+            
+    return results
+
+def list_schedule_events(service, calendar_id):
+    """
+    Lists the calendar once and returns {key: [(event_id, content_hash), ...]} for events created by this app.
+    Events without our key (e.g. added by the user) are ignored, and so are instances of a weekly event the user
+    edited in their calendar: they come back as separate items with the series' private properties, but the series
+    master is the event this app owns (deleting or patching it covers its instances).
+    """
+    existing = {}
+    page_token = None
+    while True:
+        page = _execute(service.events().list(
+            calendarId=calendar_id,
+            pageToken=page_token,
+            maxResults=2500,
+            showDeleted=False,
+            fields='items(id,recurringEventId,extendedProperties),nextPageToken',
+        ), "events_list")
+        for item in page.get('items', []):
+            if item.get('recurringEventId'):
+                continue
+            private = item.get('extendedProperties', {}).get('private', {})
+            key = private.get(SCHEDULE_KEY_PROPERTY)
+            if key:
+                existing.setdefault(key, []).append((item['id'], private.get(SCHEDULE_HASH_PROPERTY)))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            break
+    return existing
+
+def sync_schedule_events(service, calendar_id, selected_events, chunk_size=DEFAULT_BATCH_SIZE,
+                         max_retries=DEFAULT_MAX_RETRIES, merge=True, progress=None, term=None):
+    """
+    Makes the calendar match selected_events with the fewest writes:
+    inserts new events, patches changed ones and deletes ones no longer selected (or duplicated).
+    Re-syncing an unchanged selection costs one list call and zero writes.
+    Returns {'inserted': n, 'updated': n, 'deleted': n, 'unchanged': n, 'failed': [{'action', 'key', 'error'}],
+    'clashes': [(event_a, event_b)]} where clashes are pairs of selected classes whose times overlap (see clash_index).
+    progress, if given, is called as progress(done, total) as events are checked and written.
+    Dates, holidays and timezone come from term (default: the catalog's default term).
+    """
+    with timed("calendar.sync"):
+        return _sync_schedule_events(service, calendar_id, selected_events, chunk_size, max_retries, merge, progress,
+                                     term or get_term())
+
+def _sync_schedule_events(service, calendar_id, selected_events, chunk_size, max_retries, merge, progress, term):
+    clashes = find_clashes(selected_events, load_clash_index(term.clash_index_path) or {})
+    if merge:
+        selected_events = merge_consecutive_slots(selected_events)
+    with timed("calendar.list_events"):
+        existing = list_schedule_events(service, calendar_id)
+    events = service.events()
+    
+    requests = []
+    unchanged = 0
+    for _, key, body in _event_bodies(selected_events, term):
+        matches = existing.pop(key, [])
+        if not matches:
+            requests.append((('insert', key), events.insert(calendarId=calendar_id, body=body)))
+            continue
+        event_id, current_hash = matches[0]
+        if current_hash == body['extendedProperties']['private'][SCHEDULE_HASH_PROPERTY]:
+            unchanged += 1
+        else:
+            requests.append((('update', key), events.patch(calendarId=calendar_id, eventId=event_id, body=body)))
+        for duplicate_id, _ in matches[1:]:
+            requests.append((('delete', duplicate_id), events.delete(calendarId=calendar_id, eventId=duplicate_id)))
+    
+    for matches in existing.values():
+        for event_id, _ in matches:
+            requests.append((('delete', event_id), events.delete(calendarId=calendar_id, eventId=event_id)))
+    
+    summary = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': unchanged, 'failed': [], 'clashes': clashes}
+    counters = {'insert': 'inserted', 'update': 'updated', 'delete': 'deleted'}
+    batch_progress = None
+    if progress is not None:
+        # Unchanged events are done as soon as the calendar has been listed
+        progress(unchanged, unchanged + len(requests))
+        batch_progress = lambda finished, total: progress(unchanged + finished, unchanged + total)
+    results = execute_batched(service, requests, chunk_size, max_retries, progress=batch_progress)
+    for (action, key), (response, error) in results.items():
+        # An event deleted in the meantime is already in the state we want
+        if error is not None and not (action == 'delete' and isinstance(error, HttpError) and error.status_code in (404, 410)):
+            summary['failed'].append({'action': action, 'key': key, 'error': str(error)})
+        else:
+            summary[counters[action]] += 1
+    
+    for action, field in counters.items():
+        count(f"calendar.events_{field}", summary[field])
+    count("calendar.events_unchanged", unchanged)
+    count("calendar.events_failed", len(summary['failed']))
+    return summary
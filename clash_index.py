@@ -0,0 +1,115 @@
+"""
+Per-group index of overlapping class slots, so a selection can be checked for clashes without comparing every pair.
+A slot is one (Day, Time) of a group, e.g. "Monday|18:00-18:50"; the index maps each slot to the other slots
+of the same group whose times overlap it. Built by build_db next to the schedule store.
+"""
+from schedule_events import parse_time_range
+from schedule_store import CLASH_INDEX_FILE, write_index_file, read_index_file, load_index_file
+
+CLASH_INDEX_VERSION = 1
+
+def slot_key(ev):
+    return f"{ev.get('Day', '')}|{ev.get('Time', '')}"
+
+def build_group_overlaps(events):
+    """
+    {slot: [overlapping slots]} for the events of one group, found with a per-day sweep over start times.
+    A slot lists itself when it holds several disciplines (the usual case: alternative electives in one slot).
+    Slots that clash with nothing are left out; slots whose time can't be parsed only clash with themselves.
+    """
+    by_day = {}
+    disciplines = {}
+    for ev in events:
+        slot = slot_key(ev)
+        disciplines.setdefault(slot, set()).add(ev.get('Discipline'))
+        bounds = parse_time_range(ev.get('Time', ''))
+        if bounds is not None:
+            by_day.setdefault(ev.get('Day', ''), {})[slot] = bounds
+
+    overlaps = {slot: [slot] for slot, names in disciplines.items() if len(names) > 1}
+    for slots in by_day.values():
+        active = []
+        for slot, (start, end) in sorted(slots.items(), key=lambda item: item[1]):
+            active = [(other, other_end) for other, other_end in active if other_end > start]
+            for other, _ in active:
+                overlaps.setdefault(slot, []).append(other)
+                overlaps.setdefault(other, []).append(slot)
+            active.append((slot, end))
+    return {slot: sorted(others) for slot, others in sorted(overlaps.items())}
+
+def build_clash_index(store):
+    """{program: {group: {slot: [overlapping slots]}}} for every group in a ScheduleStore."""
+    return {
+        program: {group: build_group_overlaps(store.group_frame(program, group).to_dict('records')) for group in store.groups(program)}
+        for program in store.programs()
+    }
+
+def write_clash_index(store, path=CLASH_INDEX_FILE):
+    index = build_clash_index(store)
+    write_index_file(path, CLASH_INDEX_VERSION, {"groups": index}, sort_keys=True)
+    return sum(1 for groups in index.values() for overlaps in groups.values() if overlaps)
+
+def _open_clash_index(path):
+    return read_index_file(path, CLASH_INDEX_VERSION)["groups"]
+
+def load_clash_index(path=CLASH_INDEX_FILE):
+    """The prebuilt index (re-read when build_db rewrites it), or None if it hasn't been built."""
+    return load_index_file(path, _open_clash_index)
+
+def find_clashes(selected_events, index=None):
+    """
+    Returns [(event_a, event_b), ...]: pairs of selected classes whose times overlap.
+    Only the slots of the selection are looked up, so this is O(selected) with the prebuilt index.
+    Without an index entry for a group, its overlaps are computed from the selected events themselves;
+    classes of different groups in one selection are compared from their times directly.
+    The same discipline in two rooms or in overlapping slots is not a clash.
+    """
+    if index is None:
+        index = load_clash_index() or {}
+
+    by_group = {}
+    for ev in selected_events:
+        slots = by_group.setdefault((ev.get('Program'), ev.get('Group')), {})
+        slots.setdefault(slot_key(ev), []).append(ev)
+
+    clashes = []
+    for (program, group), slots in by_group.items():
+        overlaps = index.get(program, {}).get(group)
+        if overlaps is None:
+            overlaps = build_group_overlaps(ev for events in slots.values() for ev in events)
+        for slot, events in slots.items():
+            # Each pair of slots is visited once, from the lexically smaller key
+            for other_slot in overlaps.get(slot, []):
+                if other_slot == slot:
+                    pairs = ((a, b) for i, a in enumerate(events) for b in events[i + 1:])
+                elif other_slot > slot and other_slot in slots:
+                    pairs = ((a, b) for a in events for b in slots[other_slot])
+                else:
+                    continue
+                clashes.extend((a, b) for a, b in pairs if a.get('Discipline') != b.get('Discipline'))
+    if len(by_group) > 1:
+        clashes.extend(_cross_group_clashes(by_group))
+    return clashes
+
+def _cross_group_clashes(by_group):
+    """Overlapping pairs of selected classes from different groups, by a per-day sweep over start times."""
+    by_day = {}
+    for group_key, slots in by_group.items():
+        for events in slots.values():
+            for ev in events:
+                bounds = parse_time_range(ev.get('Time', ''))
+                if bounds is not None:
+                    by_day.setdefault(ev.get('Day', ''), []).append((bounds, group_key, ev))
+    clashes = []
+    for entries in by_day.values():
+        active = []
+        for (start, end), group_key, ev in sorted(entries, key=lambda entry: entry[0]):
+            active = [entry for entry in active if entry[0] > start]
+            clashes.extend((other, ev) for _, other_group, other in active
+                           if other_group != group_key and other.get('Discipline') != ev.get('Discipline'))
+            active.append((end, group_key, ev))
+    return clashes
+
+def describe_clash(a, b):
+    """One line for a clash, for warnings."""
+    return f"{a.get('Day')} {a.get('Time')} {a.get('Discipline')} / {b.get('Day')} {b.get('Time')} {b.get('Discipline')}"
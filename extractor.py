@@ -1,5 +1,11 @@
 import pdfplumber
 import re
+import os
+import json
+import time
+import bisect
+import hashlib
+from collections import namedtuple
 import pandas as pd
 
 def clean_time(t_str):
@@ -23,63 +29,317 @@ def clean_time(t_str):
     t_str = re.sub(r'[^\d:\-]', '', t_str)
     return t_str
 
-def extract_schedule(pdf_path):
-    data = []
+# One class slot as parsed from a schedule table; Day is None only if a table doesn't start with a day
+ScheduleRecord = namedtuple('ScheduleRecord', ["Group", "Day", "Time", "Discipline", "Classroom", "Type", "Lecturer"])
+
+GROUP_PATTERN = re.compile(r'Group\s+([\w\-]+)', re.IGNORECASE)
+
+# Part of every page cache key: bump it when parsing changes so cached pages are parsed again
+EXTRACTOR_VERSION = 2
+
+TIME_CELL_PATTERN = re.compile(r'\d{1,2}:?\d{2}\s*-\s*\d{1,2}:?\d{2}')
+HEADER_TITLES = ("Time", "Discipline", "Classroom", "Type", "Lecturer")
+# Points a word may start left of its column title and still belong to that column
+COLUMN_SLACK = 3
+# Words whose tops are this close (in points) are on the same text line
+LINE_TOLERANCE = 2
+
+def parse_page(page):
+    """Parses a single pdfplumber page into a list of class dicts."""
+    raw = read_page_checked(page)[0]
+    if raw is None:
+        return []
+    return rows_from_table(*raw)
+
+def read_page_table(page):
+    """Returns (group_name, raw table cells) for a page, or None if it has no schedule table."""
+    text = page.extract_text()
+    if not text:
+        return None
+        
+    match = GROUP_PATTERN.search(text)
+    group_name = match.group(1) if match else "Unknown"
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-                
-            match = re.search(r'Group\s+([\w\-]+)', text, re.IGNORECASE)
-            group_name = match.group(1) if match else "Unknown"
-            
-            tables = page.extract_tables()
-            if not tables:
+    tables = page.extract_tables()
+    if not tables:
+        return None
+        
+    return group_name, tables[0]
+
+def table_problems(page, raw):
+    """
+    Sanity check of a page's table as read by read_page_table: reasons to distrust it, or [] if it looks whole.
+    The page's own characters are the reference, so a table the detector split, merged or cut short shows up
+    as missing time slots.
+    """
+    page_times = len(TIME_CELL_PATTERN.findall(''.join(char['text'] for char in page.chars)))
+    if raw is None:
+        return [f"no table found but the page has {page_times} time slots"] if page_times else []
+    table = raw[1]
+    problems = []
+    if not table or len(table[0]) != 6:
+        problems.append(f"header has {len(table[0]) if table else 0} columns instead of 6")
+    widths = sorted({len(row) for row in table[1:] if len(row) != 6})
+    if widths:
+        problems.append(f"rows with {', '.join(map(str, widths))} cells")
+    table_times = sum(1 for row in table[1:] if len(row) > 1 and TIME_CELL_PATTERN.search(str(row[1] or '')))
+    if table_times != page_times:
+        problems.append(f"table has {table_times} time slots, the page has {page_times}")
+    return problems
+
+def _text_lines(words):
+    """Groups words into text lines: [(top, bottom, words left to right)], top to bottom."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w['top'], w['x0'])):
+        if lines and word['top'] - lines[-1][0] <= LINE_TOLERANCE:
+            lines[-1][2].append(word)
+            lines[-1][1] = max(lines[-1][1], word['bottom'])
+        else:
+            lines.append([word['top'], word['bottom'], [word]])
+    return [(top, bottom, sorted(line, key=lambda w: w['x0'])) for top, bottom, line in lines]
+
+def read_page_table_words(page):
+    """
+    Fallback for pages whose ruled table can't be trusted: rebuilds the grid from word positions.
+    Columns start at the header titles; a row starts at each time slot (cells are top-aligned) and runs to the next;
+    day names are centred on their block of rows. Returns (group_name, raw table cells) like read_page_table, or None.
+    """
+    words = page.extract_words()
+    lines = _text_lines(words)
+    header = next((line for line in lines if set(HEADER_TITLES) <= {w['text'] for w in line[2]}), None)
+    if header is None:
+        return None
+    header_top, header_bottom, header_words = header
+    titles = {w['text']: w['x0'] for w in header_words if w['text'] in HEADER_TITLES}
+    starts = [header_words[0]['x0']] + [titles[title] for title in HEADER_TITLES]
+    bounds = [start - COLUMN_SLACK for start in starts]
+
+    def column_of(word):
+        return max(bisect.bisect_right(bounds, word['x0']) - 1, 0)
+
+    header_row = [[] for _ in starts]
+    for word in header_words:
+        header_row[column_of(word)].append(word['text'])
+    header_row = [' '.join(texts) for texts in header_row]
+    above = ' '.join(w['text'] for _, _, line in lines if line[0]['bottom'] <= header_top for w in line)
+    match = GROUP_PATTERN.search(above)
+    group_name = match.group(1) if match else "Unknown"
+
+    # Text lines of every column below the header
+    columns = [[] for _ in starts]
+    for top, bottom, line in lines:
+        if top <= header_bottom:
+            continue
+        by_column = {}
+        for word in line:
+            by_column.setdefault(column_of(word), []).append(word['text'])
+        for column, texts in by_column.items():
+            columns[column].append((top, bottom, ' '.join(texts)))
+
+    anchors = [top for top, _, text in columns[1] if TIME_CELL_PATTERN.fullmatch(text)]
+    if not anchors:
+        return None
+    pitch = sorted(b - a for a, b in zip(anchors, anchors[1:]))[(len(anchors) - 1) // 2] if len(anchors) > 1 else header_bottom - header_top
+
+    # The last row runs on while its lines follow each other closely; a signature block further down doesn't belong to it
+    cells = [[None] + [[] for _ in starts[1:]] for _ in anchors]
+    row_bottoms = list(anchors)
+    for column in range(1, len(starts)):
+        previous_top = anchors[-1]
+        for top, bottom, text in columns[column]:
+            row = bisect.bisect_right(anchors, top + LINE_TOLERANCE) - 1
+            if row < 0:
                 continue
-                
-            table = tables[0]
-            current_day = None
-            
-            for row in table[1:]:
-                # If row is shorter than 6, pad it
-                row += [None] * (6 - len(row))
-                
-                day_cell = row[0] if row[0] is not None else ""
-                day_cell = str(day_cell).strip()
-                if day_cell:
-                    current_day = day_cell
-                
-                day = current_day
-                time_str = str(row[1] if row[1] is not None else "").strip()
-                time_str = clean_time(time_str)
-                if not time_str:
+            if row == len(anchors) - 1:
+                if top - previous_top > pitch + LINE_TOLERANCE:
                     continue
-                
-                discipline = str(row[2] if row[2] is not None else "").strip()
-                classroom = str(row[3] if row[3] is not None else "").strip()
-                type_ = str(row[4] if row[4] is not None else "").strip()
-                lecturer = str(row[5] if row[5] is not None else "").strip()
-                
-                # Split disciplines
-                disciplines = [d.strip() for d in re.split(r'\n', discipline) if d.strip()]
-                classrooms = [c.strip() for c in classroom.split('\n')]
-                types = [t.strip() for t in type_.split('\n')]
-                lecturers = [l.strip() for l in lecturer.split('\n')]
-                
-                for i, disc in enumerate(disciplines):
-                    data.append({
-                        "Group": group_name,
-                        "Day": day,
-                        "Time": time_str,
-                        "Discipline": disc,
-                        "Classroom": classrooms[i] if i < len(classrooms) else (classrooms[-1] if classrooms else ""),
-                        "Type": types[i] if i < len(types) else (types[-1] if types else ""),
-                        "Lecturer": lecturers[i] if i < len(lecturers) else (lecturers[-1] if lecturers else "")
-                    })
-                    
-    return pd.DataFrame(data)
+                previous_top = max(previous_top, top)
+            cells[row][column].append(text)
+            row_bottoms[row] = max(row_bottoms[row], bottom)
+
+    # Each day name sits in the middle of its rows: give every label the run of rows that centres on it best
+    labels = []
+    for top, bottom, text in columns[0]:
+        if labels and top - labels[-1][1] <= LINE_TOLERANCE:
+            labels[-1] = (labels[-1][0], bottom, labels[-1][2] + ' ' + text)
+        else:
+            labels.append((top, bottom, text))
+    first = 0
+    for k, (top, bottom, text) in enumerate(labels):
+        if first >= len(anchors):
+            break
+        centre = (top + bottom) / 2
+        if k == len(labels) - 1:
+            last = len(anchors) - 1
+        else:
+            last = min(range(first, len(anchors)), key=lambda end: abs((anchors[first] + row_bottoms[end]) / 2 - centre))
+        cells[first][0] = text
+        first = last + 1
+
+    rows = [[row[0]] + ['\n'.join(texts) for texts in row[1:]] for row in cells]
+    return group_name, [header_row] + rows
+
+def read_page_checked(page):
+    """
+    read_page_table plus the table_problems sanity check; a page that fails it is read again with read_page_table_words.
+    Returns (raw or None, engine that produced it, problems found).
+    """
+    raw = read_page_table(page)
+    problems = table_problems(page, raw)
+    if problems:
+        fallback = read_page_table_words(page)
+        if fallback is not None:
+            return fallback, "words", problems
+    return raw, "table", problems
+
+def page_cache_key(page):
+    """Hash of a page's content streams and size: equal keys mean the page draws exactly the same thing."""
+    digest = hashlib.sha256(f"{EXTRACTOR_VERSION}|{list(page.mediabox)}|".encode())
+    contents = page.page_obj.contents
+    for stream in contents if isinstance(contents, list) else [contents]:
+        stream = pdfplumber.pdfminer.pdftypes.resolve1(stream) if stream is not None else None
+        if stream is not None:
+            digest.update(stream.get_rawdata() or stream.get_data())
+    return digest.hexdigest()
+
+def _page_cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + ".json")
+
+def load_cached_page(cache_dir, key):
+    """The cached {'engine', 'problems', 'group', 'table'} of a page, or None."""
+    try:
+        with open(_page_cache_path(cache_dir, key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def store_cached_page(cache_dir, key, entry):
+    path = _page_cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temporary name: worker processes may store the same page (a PDF included twice) at once
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def prune_page_cache(cache_dir, keep):
+    """Deletes cached pages whose keys aren't in keep (e.g. pages of PDF versions no longer in the build). Returns how many."""
+    removed = 0
+    if not os.path.isdir(cache_dir):
+        return removed
+    for bucket in os.listdir(cache_dir):
+        bucket_dir = os.path.join(cache_dir, bucket)
+        if not os.path.isdir(bucket_dir):
+            continue
+        for name in os.listdir(bucket_dir):
+            if name.endswith(".json") and name[:-len(".json")] not in keep:
+                os.remove(os.path.join(bucket_dir, name))
+                removed += 1
+    return removed
+
+def rows_from_table(group_name, table):
+    """Turns the raw cells of a schedule table (header row first) into class dicts."""
+    rows = []
+    current_day = None
+    
+    for row in table[1:]:
+        # If row is shorter than 6, pad it
+        row += [None] * (6 - len(row))
+        
+        day_cell = row[0] if row[0] is not None else ""
+        day_cell = str(day_cell).strip()
+        if day_cell:
+            current_day = day_cell
+        
+        day = current_day
+        time_str = str(row[1] if row[1] is not None else "").strip()
+        time_str = clean_time(time_str)
+        if not time_str:
+            continue
+        
+        discipline = str(row[2] if row[2] is not None else "").strip()
+        classroom = str(row[3] if row[3] is not None else "").strip()
+        type_ = str(row[4] if row[4] is not None else "").strip()
+        lecturer = str(row[5] if row[5] is not None else "").strip()
+        
+        # Split disciplines
+        disciplines = [d.strip() for d in re.split(r'\n', discipline) if d.strip()]
+        classrooms = [c.strip() for c in classroom.split('\n')]
+        types = [t.strip() for t in type_.split('\n')]
+        lecturers = [l.strip() for l in lecturer.split('\n')]
+        
+        for i, disc in enumerate(disciplines):
+            rows.append({
+                "Group": group_name,
+                "Day": day,
+                "Time": time_str,
+                "Discipline": disc,
+                "Classroom": classrooms[i] if i < len(classrooms) else (classrooms[-1] if classrooms else ""),
+                "Type": types[i] if i < len(types) else (types[-1] if types else ""),
+                "Lecturer": lecturers[i] if i < len(lecturers) else (lecturers[-1] if lecturers else "")
+            })
+            
+    return rows
+
+def count_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def iter_page_tables(pdf_path, page_numbers=None, cache_dir=None):
+    """
+    Reads the given (0-based, default all) pages of a PDF with read_page_checked, one page at a time.
+    With a cache_dir, each page's reading is cached under its content hash, so unchanged pages of a re-issued PDF
+    are not parsed again.
+    Yields ((group_name, raw table cells) or None, note) per page, note being
+    {'page', 'key', 'engine', 'cached', 'problems', 'seconds'}.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        if page_numbers is None:
+            page_numbers = range(len(pdf.pages))
+        for page_number in page_numbers:
+            started = time.perf_counter()
+            page = pdf.pages[page_number]
+            key = page_cache_key(page) if cache_dir else None
+            entry = load_cached_page(cache_dir, key) if cache_dir else None
+            cached = entry is not None
+            if entry is None:
+                raw, engine, problems = read_page_checked(page)
+                entry = {"engine": engine, "problems": problems, "group": raw[0] if raw else None, "table": raw[1] if raw else None}
+                if cache_dir:
+                    store_cached_page(cache_dir, key, entry)
+            # Drop the page's parsed layout right away so memory stays flat on large files
+            page.close()
+            raw = (entry["group"], entry["table"]) if entry["table"] is not None else None
+            yield raw, {"page": page_number, "key": key, "engine": entry["engine"], "cached": cached,
+                        "problems": entry["problems"], "seconds": time.perf_counter() - started}
+
+def iter_schedule_records(pdf_path, page_numbers=None, cache_dir=None, notes=None):
+    """
+    Yields a ScheduleRecord per class slot, in page order.
+    Pages are read by iter_page_tables and turned into rows one at a time, so memory holds one page rather than
+    the whole PDF. If notes is a list, each page's note is appended to it.
+    """
+    for raw, note in iter_page_tables(pdf_path, page_numbers, cache_dir):
+        started = time.perf_counter()
+        records = [ScheduleRecord(**row) for row in rows_from_table(*raw)] if raw is not None else []
+        if notes is not None:
+            notes.append(dict(note, seconds=note["seconds"] + time.perf_counter() - started))
+        yield from records
+
+def extract_pages(pdf_path, page_numbers, cache_dir=None):
+    """
+    Parses only the given (0-based) pages of a PDF through iter_schedule_records.
+    Returns (rows, page_timings, page_notes): rows are class dicts, page_timings a list of (page_number, seconds),
+    page_notes one {'page', 'key', 'engine', 'cached', 'problems', 'seconds'} per page.
+    Used by build_db to spread the pages of large PDFs across worker processes.
+    """
+    page_numbers = list(page_numbers)
+    notes = []
+    rows = [record._asdict() for record in iter_schedule_records(pdf_path, page_numbers, cache_dir, notes)]
+    return rows, [(note["page"], note["seconds"]) for note in notes], notes
+
+def extract_schedule(pdf_path):
+    return pd.DataFrame.from_records(iter_schedule_records(pdf_path), columns=ScheduleRecord._fields)
 
 if __name__ == "__main__":
     df = extract_schedule(r"d:\Projects\Schedule Creator\Schedule_1 course M_3 trim.pdf")
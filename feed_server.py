@@ -0,0 +1,209 @@
+"""
+Subscribable ICS feeds: GET /feeds/<program>/<group>.ics[?discipline=...&discipline=...][&term=<term id>]
+
+Calendar clients (Google Calendar "From URL", Apple Calendar, Outlook) poll this URL, so every response
+carries an ETag and Last-Modified and is gzip-compressed when the client accepts it; an unchanged feed
+costs a 304 with no body. Runs as its own small process next to the Streamlit app:
+
+    python feed_server.py --port 8502
+
+or inside the app process by setting FEED_SERVER_PORT (see app.py). Set FEED_BASE_URL to the public
+address of the server so the app can show students their subscription link.
+With --metrics (or FEED_SERVER_METRICS=1), GET /metrics also returns the perf timings and counters in Prometheus
+text format (collected with METRICS_ENABLED=1). It is off by default: this server is public, while app.py's own
+metrics endpoint listens on METRICS_HOST (loopback by default).
+"""
+import os
+import gzip
+import hashlib
+import functools
+import argparse
+import threading
+import urllib.parse
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ics_exporter import generate_ics_string, read_group_ics
+from terms import get_catalog
+from perf import timed, count, render_prometheus, PROMETHEUS_CONTENT_TYPE
+
+DEFAULT_PORT = 8502
+RESPONSE_CACHE_SIZE = 512
+CACHE_MAX_AGE_SECONDS = 3600
+SERVE_METRICS = os.environ.get("FEED_SERVER_METRICS", "").lower() in ("1", "true", "yes")
+
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+def render_feed(program, group, disciplines=(), term_id=None):
+    """
+    Returns (body bytes, etag, last_modified) for a group's feed in a term (default: the default term), optionally
+    limited to some disciplines, or None if the group doesn't exist. Results are cached per (term, program, group, filters).
+    """
+    catalog = get_catalog()
+    term = catalog.get(term_id)
+    key = (term.id, program, group, tuple(sorted(set(disciplines))))
+    mtime = catalog.data_mtime(term.id)
+    with _responses_lock:
+        cached = _responses.get(key)
+        if cached is not None and cached[2] == mtime:
+            _responses.move_to_end(key)
+            count("feeds.cache_hits")
+            return cached
+
+    with timed("feeds.render"):
+        return _render_feed(catalog, term, program, group, disciplines, key, mtime)
+
+def _render_feed(catalog, term, program, group, disciplines, key, mtime):
+    # The catalog reopens the store whenever build_db has rewritten it
+    store = catalog.store(term.id)
+    if group not in store.groups(program):
+        return None
+
+    ics = None
+    if not disciplines:
+        ics = read_group_ics(program, group, term.ics_dir)
+    if ics is None:
+        events = store.group_frame(program, group).to_dict('records')
+        if disciplines:
+            wanted = set(disciplines)
+            events = [ev for ev in events if ev['Discipline'] in wanted]
+        ics = generate_ics_string(events, term=term)
+
+    body = ics.encode('utf-8')
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    response = (body, etag, mtime)
+    with _responses_lock:
+        _responses[key] = response
+        while len(_responses) > RESPONSE_CACHE_SIZE:
+            _responses.popitem(last=False)
+    return response
+
+@functools.lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def _gzipped(body):
+    # mtime=0 keeps the compressed bytes deterministic
+    return gzip.compress(body, mtime=0)
+
+def _not_modified(headers, etag, mtime):
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            return int(parsedate_to_datetime(if_modified_since).timestamp()) >= mtime
+        except (TypeError, ValueError):
+            return False
+    return False
+
+class FeedHandler(BaseHTTPRequestHandler):
+    server_version = "AITUScheduleFeeds/1.0"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/metrics' and self.server.serve_metrics:
+            self._send(200, render_prometheus().encode('utf-8'), PROMETHEUS_CONTENT_TYPE, send_body)
+            return
+        parts = [urllib.parse.unquote(p) for p in url.path.split('/') if p]
+        if len(parts) != 3 or parts[0] != 'feeds' or not parts[2].endswith('.ics'):
+            self._error(404, "Expected /feeds/<program>/<group>.ics", send_body)
+            return
+        program, group = parts[1], parts[2][:-len('.ics')]
+        query = urllib.parse.parse_qs(url.query)
+        disciplines = query.get('discipline', [])
+        term_id = query.get('term', [None])[0]
+        if term_id is not None and term_id not in get_catalog().terms:
+            self._error(404, f"Unknown term {term_id!r}", send_body)
+            return
+
+        try:
+            response = render_feed(program, group, disciplines, term_id)
+        except Exception as e:
+            self._error(500, f"Failed to render feed: {e}", send_body)
+            return
+        if response is None:
+            self._error(404, f"Unknown group {group!r} in program {program!r}", send_body)
+            return
+        body, etag, mtime = response
+
+        if _not_modified(self.headers, etag, mtime):
+            self.send_response(304)
+            self._cache_headers(etag, mtime)
+            self.end_headers()
+            return
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = _gzipped(body)
+            encoding = 'gzip'
+        else:
+            encoding = None
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/calendar; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self._cache_headers(etag, mtime)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _cache_headers(self, etag, mtime):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+        self.send_header('Cache-Control', f'public, max-age={CACHE_MAX_AGE_SECONDS}')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def _error(self, status, message, send_body=True):
+        # HEAD gets the same status and headers, without the body
+        self._send(status, message.encode('utf-8'), 'text/plain; charset=utf-8', send_body)
+
+    def _send(self, status, body, content_type, send_body=True):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Calendar clients poll constantly; keep the default per-request log off stderr
+        pass
+
+def feed_path(program, group, disciplines=(), term_id=None):
+    """Relative URL of a group's feed, for building subscription links. The default term needs no term parameter."""
+    path = f"/feeds/{urllib.parse.quote(program)}/{urllib.parse.quote(group)}.ics"
+    params = [('discipline', d) for d in disciplines]
+    if term_id and term_id != get_catalog().default:
+        params.append(('term', term_id))
+    if params:
+        path += '?' + urllib.parse.urlencode(params)
+    return path
+
+def make_server(host="0.0.0.0", port=DEFAULT_PORT, serve_metrics=SERVE_METRICS):
+    """The feed server; /metrics is only answered with serve_metrics (the timings are internal)."""
+    server = ThreadingHTTPServer((host, port), FeedHandler)
+    server.serve_metrics = serve_metrics
+    return server
+
+def start_in_background(host="0.0.0.0", port=DEFAULT_PORT, serve_metrics=SERVE_METRICS):
+    """Starts the feed server on a daemon thread (used when the app and feeds share one process)."""
+    server = make_server(host, port, serve_metrics)
+    threading.Thread(target=server.serve_forever, name="feed-server", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve subscribable ICS feeds for every group")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FEED_PORT", DEFAULT_PORT)))
+    parser.add_argument("--metrics", action="store_true", default=SERVE_METRICS,
+                        help="also answer GET /metrics (exposes internal timings to everyone who can reach the server)")
+    args = parser.parse_args()
+    print(f"Serving feeds on http://{args.host}:{args.port}/feeds/<program>/<group>.ics")
+    make_server(args.host, args.port, args.metrics).serve_forever()
@@ -0,0 +1,200 @@
+"""
+One search box over every program: group codes, disciplines and lecturers -> the groups they belong to.
+build_db writes the index next to the schedule store. A query is answered from a sorted token list (prefix ranges
+found by bisect, a flattened trie) with a trigram fallback for misspelt words, without touching the timetable.
+
+    python group_search.py "AAI-25"
+    python group_search.py "akhmetova" --term 2026-27-t1
+"""
+import re
+import sys
+import heapq
+import bisect
+import argparse
+from collections import Counter
+from occupancy import is_lecturer
+from schedule_store import SEARCH_INDEX_FILE, open_store, write_index_file, read_index_file, load_index_file
+from terms import get_catalog
+
+SEARCH_INDEX_VERSION = 1
+# Order of the result kinds: a group code match beats a discipline, which beats a lecturer
+KINDS = ("group", "discipline", "lecturer")
+# Share of trigrams a misspelt word must have in common with an indexed one (Dice coefficient)
+FUZZY_THRESHOLD = 0.4
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text):
+    """Lowercase words of text, plus all of them run together ('AAI-2501M' -> aai, 2501m, aai2501m)."""
+    tokens = TOKEN_PATTERN.findall(text.casefold())
+    if len(tokens) > 1:
+        tokens.append(''.join(tokens))
+    return tokens
+
+def trigrams(token):
+    # Padded like pg_trgm, so the first and last letters weigh as much as the middle ones
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_search_index(store):
+    """
+    {"targets": [[program, group], ...], "terms": [[kind, text, [target ids]], ...], "tokens": [[token, [term ids]], ...]}
+    for a ScheduleStore. Tokens are sorted, so all tokens starting with a prefix are one contiguous range.
+    """
+    targets = []
+    target_ids = {}
+    # term -> target ids in insertion order (a dict as an ordered set)
+    terms = {}
+    for program in store.programs():
+        for group in store.groups(program):
+            target_ids[(program, group)] = len(targets)
+            terms.setdefault(("group", group), {})[len(targets)] = None
+            targets.append([program, group])
+    frame = store.to_frame()
+    for program, group, discipline, lecturer in zip(frame['Program'], frame['Group'], frame['Discipline'], frame['Lecturer']):
+        target = target_ids[(program, group)]
+        if discipline.strip():
+            terms.setdefault(("discipline", discipline), {})[target] = None
+        if is_lecturer(lecturer):
+            terms.setdefault(("lecturer", lecturer), {})[target] = None
+
+    ordered = sorted(terms.items(), key=lambda item: (KINDS.index(item[0][0]), item[0][1]))
+    postings = {}
+    for term_id, ((kind, text), _) in enumerate(ordered):
+        for token in tokenize(text):
+            ids = postings.setdefault(token, [])
+            if not ids or ids[-1] != term_id:
+                ids.append(term_id)
+    return {
+        "targets": targets,
+        "terms": [[kind, text, list(ids)] for (kind, text), ids in ordered],
+        "tokens": sorted([token, ids] for token, ids in postings.items()),
+    }
+
+def write_search_index(store, path=SEARCH_INDEX_FILE):
+    """Builds the index from a ScheduleStore and writes it; returns the GroupSearchIndex."""
+    index = build_search_index(store)
+    write_index_file(path, SEARCH_INDEX_VERSION, index)
+    return GroupSearchIndex(index)
+
+class GroupSearchIndex:
+    """Read side of the search index. The trigram table for misspellings is built once, when the index is loaded."""
+
+    def __init__(self, index):
+        self._targets = index["targets"]
+        self._terms = index["terms"]
+        self._tokens = [token for token, _ in index["tokens"]]
+        self._postings = [ids for _, ids in index["tokens"]]
+        # Only real words go in the trigram table, not the run-together tokens of multi-word names
+        words = {word for _, text, _ in self._terms for word in TOKEN_PATTERN.findall(text.casefold())}
+        self._trigrams = {}
+        self._gram_counts = {}
+        for position, token in enumerate(self._tokens):
+            if token in words:
+                grams = trigrams(token)
+                self._gram_counts[position] = len(grams)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, []).append(position)
+
+    @classmethod
+    def open(cls, path=SEARCH_INDEX_FILE):
+        return cls(read_index_file(path, SEARCH_INDEX_VERSION))
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(build_search_index(store))
+
+    def __len__(self):
+        return len(self._terms)
+
+    def _prefix_postings(self, prefix):
+        """Term id lists of every token starting with prefix (each list sorted)."""
+        first = bisect.bisect_left(self._tokens, prefix)
+        return self._postings[first:bisect.bisect_left(self._tokens, prefix + '\U0010ffff', first)]
+
+    def _fuzzy_postings(self, word):
+        """Term id lists of the words spelt like word, most similar first."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+        scored = [(2 * common / (len(grams) + self._gram_counts[position]), position) for position, common in shared.items()]
+        return [self._postings[position] for score, position in sorted(scored, reverse=True) if score >= FUZZY_THRESHOLD]
+
+    def search(self, query, limit=20):
+        """
+        Groups matching query, best first: [{'program', 'group', 'kind', 'match'}] where match is the group code,
+        discipline or lecturer that matched. The query's words run together must start a word of the match, or all
+        words of the match run together ('AAI 25', 'aai25' and 'AAI-25' are the same query); failing that, every word
+        of the query must start a word of the match, and a word that starts none is matched by spelling similarity.
+        """
+        words = TOKEN_PATTERN.findall(query.casefold())
+        if not words:
+            return []
+        postings = self._prefix_postings(''.join(words))
+        if not postings and len(words) > 1:
+            matched = None
+            for word in words:
+                found = set().union(*(self._prefix_postings(word) or self._fuzzy_postings(word)))
+                matched = found if matched is None else matched & found
+                if not matched:
+                    return []
+            postings = [sorted(matched)]
+        elif not postings:
+            # Best spelling match first rather than in term order
+            postings = [[term_id for ids in self._fuzzy_postings(words[0]) for term_id in ids]]
+
+        results = []
+        seen = set()
+        previous = None
+        # Term ids are in KINDS order, then alphabetical, so merging the sorted lists yields them best first;
+        # a short prefix can match thousands of terms but only the first few are ever looked at
+        for term_id in heapq.merge(*postings):
+            if term_id == previous:
+                continue
+            previous = term_id
+            kind, text, target_ids = self._terms[term_id]
+            for target in target_ids:
+                if target not in seen:
+                    seen.add(target)
+                    program, group = self._targets[target]
+                    results.append({'program': program, 'group': group, 'kind': kind, 'match': text})
+                    if len(results) >= limit:
+                        return results
+        return results
+
+def load_search_index(path=SEARCH_INDEX_FILE, store=None):
+    """
+    The prebuilt index (re-read when build_db rewrites it), or one built from store (the default schedule store
+    if not given) when build_db hasn't written it.
+    """
+    index = load_index_file(path, GroupSearchIndex.open)
+    if index is not None:
+        return index
+    if store is None:
+        store = open_store()
+    return GroupSearchIndex.from_store(store)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find groups by group code, discipline or lecturer across all programs")
+    parser.add_argument("query")
+    parser.add_argument("--term", default=None, help="term of terms.json to search (default: the catalog's default term)")
+    parser.add_argument("--index", default=None, help="default: the term's search index")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    catalog = get_catalog()
+    try:
+        term = catalog.get(args.term)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    results = load_search_index(args.index or term.search_index_path, catalog.store(term.id)).search(args.query, args.limit)
+    if not results:
+        print(f"No group matching {args.query!r}.")
+        return 1
+    for result in results:
+        print(f"{result['group']:<14} {result['program']:<34} {result['kind']}: {result['match']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,77 @@
-import uuid
+import os
+import hashlib
+import logging
 import datetime
+import threading
+from collections import OrderedDict
+from schedule_events import merge_consecutive_slots, keyed_events
+from clash_index import find_clashes, describe_clash, load_clash_index
+from terms import get_term
+from perf import timed, count
 
-def generate_ics_string(selected_events):
-    day_mapping = {
-        'Monday': '20260309',
-        'Tuesday': '20260310',
-        'Wednesday': '20260311',
-        'Thursday': '20260312',
-        'Friday': '20260313',
-        'Saturday': '20260314',
-        'Sunday': '20260315',
-    }
+UID_DOMAIN = "aitu-schedule-creator"
+# DTSTAMP of calendars rendered before the term has been built
+DTSTAMP_EPOCH = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+ICS_CACHE_SIZE = 256
+DEFAULT_ICS_DIR = "ics"
+# The event fields an ICS calendar is rendered from; other fields don't change its bytes
+ICS_FIELDS = ('Group', 'Day', 'Time', 'Discipline', 'Type', 'Lecturer', 'Classroom')
+
+logger = logging.getLogger(__name__)
+
+_ics_cache = OrderedDict()
+_ics_cache_lock = threading.Lock()
+
+def format_dtstamp(built_at):
+    """
+    DTSTAMP for the events of a schedule built at built_at (Unix time, 0 if not built yet).
+    Every render of one build gets the same bytes, and a rebuild only ever moves the stamp forward,
+    so clients never see an update stamped older than the copy they have.
+    """
+    if not built_at:
+        return DTSTAMP_EPOCH.strftime('%Y%m%dT%H%M%SZ')
+    return datetime.datetime.fromtimestamp(built_at, datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def ics_etag(selected_events, merge=True, term=None):
+    """Hash of a selection; equal hashes mean byte-identical ICS output. Used as the cache key and HTTP ETag."""
+    term = term or get_term()
+    # repr of the rendered fields only, rather than a sorted JSON dump of every event, which cost as much as the
+    # cache hit it keys
+    fields = repr([merge, term.id, term.data_mtime(), [tuple(ev.get(field) for field in ICS_FIELDS) for ev in selected_events]])
+    return hashlib.sha1(fields.encode('utf-8')).hexdigest()[:20]
+
+def generate_ics_string(selected_events, merge=True, term=None):
+    """
+    Renders selected_events as an ICS calendar for a term of the catalog (default: the default term),
+    served from an LRU cache keyed by the selection's hash.
+    """
+    term = term or get_term()
+    key = ics_etag(selected_events, merge, term)
+    with _ics_cache_lock:
+        if key in _ics_cache:
+            _ics_cache.move_to_end(key)
+            count("ics.cache_hits")
+            return _ics_cache[key]
+    
+    count("ics.cache_misses")
+    clashes = find_clashes(selected_events, load_clash_index(term.clash_index_path) or {})
+    if clashes:
+        logger.warning("Exporting %d overlapping class pairs, e.g. %s", len(clashes), describe_clash(*clashes[0]))
+    with timed("ics.render"):
+        ics = render_ics_string(selected_events, merge, term)
+    
+    with _ics_cache_lock:
+        _ics_cache[key] = ics
+        while len(_ics_cache) > ICS_CACHE_SIZE:
+            _ics_cache.popitem(last=False)
+    return ics
+
+def render_ics_string(selected_events, merge=True, term=None, built_at=None):
+    """Renders an ICS calendar; DTSTAMPs are the build time built_at (default: when the term's store was written)."""
+    term = term or get_term()
+    dtstamp = format_dtstamp(term.data_mtime() if built_at is None else built_at)
+    day_mapping = {day: date.strftime('%Y%m%d') for day, date in term.first_dates.items()}
+    rrule = term.rrule()
     
     lines = [
         "BEGIN:VCALENDAR",
@@ -18,11 +79,15 @@ def generate_ics_string(selected_events):
         "PRODID:-//AITU Schedule Creator//EN",
         "CALSCALE:GREGORIAN",
         "METHOD:PUBLISH",
-        "X-WR-CALNAME:AITU Schedule - Trimester 3",
-        "X-WR-TIMEZONE:Asia/Almaty",
+        f"X-WR-CALNAME:{term.calendar_name}",
+        f"X-WR-TIMEZONE:{term.timezone}",
     ]
     
-    for ev in selected_events:
+    if merge:
+        # One VEVENT per block of back-to-back slots instead of one per 50-minute slot
+        selected_events = merge_consecutive_slots(selected_events)
+    
+    for key, ev in keyed_events(selected_events):
         day_str = ev.get('Day', '').strip()
         time_str = ev.get('Time', '').strip()
         discipline = ev.get('Discipline', '')
@@ -47,8 +112,8 @@ def generate_ics_string(selected_events):
         start_str = start_time[0] + start_time[1] + '00'
         end_str = end_time[0] + end_time[1] + '00'
         
-        uid = str(uuid.uuid4())
-        dtstamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        # Stable UID per class occurrence, so re-imports update events instead of duplicating them
+        uid = f"{key}@{UID_DOMAIN}"
         
         description = f"Group: {group}\\nType: {type_}\\nLecturer: {lecturer}"
         
@@ -56,9 +121,15 @@ def generate_ics_string(selected_events):
             "BEGIN:VEVENT",
             f"UID:{uid}",
             f"DTSTAMP:{dtstamp}",
-            f"DTSTART;TZID=Asia/Almaty:{base_date}T{start_str}",
-            f"DTEND;TZID=Asia/Almaty:{base_date}T{end_str}",
-            "RRULE:FREQ=WEEKLY;UNTIL=20260517T180000Z",
+            f"DTSTART;TZID={term.timezone}:{base_date}T{start_str}",
+            f"DTEND;TZID={term.timezone}:{base_date}T{end_str}",
+            rrule,
+        ])
+        # Classes don't happen on public holidays
+        exdate = term.exdate(day_str, parts[0].strip())
+        if exdate:
+            lines.append(exdate)
+        lines.extend([
             f"SUMMARY:{discipline}",
             f"LOCATION:{location}",
             f"DESCRIPTION:{description}",
@@ -72,3 +143,32 @@ def generate_ics_string(selected_events):
         
     lines.append("END:VCALENDAR")
     return "\r\n".join(lines)
+
+def group_ics_path(program, group, ics_dir=DEFAULT_ICS_DIR):
+    safe = lambda name: str(name).replace(os.sep, '_').replace('/', '_')
+    return os.path.join(ics_dir, safe(program), f"{safe(group)}.ics")
+
+def write_group_calendars(store, ics_dir=DEFAULT_ICS_DIR, term=None, built_at=None):
+    """
+    Pre-renders the full-schedule ICS file of every (Program, Group) in a term's ScheduleStore, stamped with
+    built_at (see render_ics_string). Returns the number of files written.
+    """
+    written = 0
+    for program in store.programs():
+        for group in store.groups(program):
+            path = group_ics_path(program, group, ics_dir)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                f.write(render_ics_string(store.group_frame(program, group).to_dict('records'), term=term, built_at=built_at))
+            os.replace(tmp_path, path)
+            written += 1
+    return written
+
+def read_group_ics(program, group, ics_dir=DEFAULT_ICS_DIR):
+    """Returns the pre-rendered full-schedule ICS of a group, or None if build_db hasn't rendered it."""
+    try:
+        with open(group_ics_path(program, group, ics_dir), 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+    except OSError:
+        return None
@@ -0,0 +1,233 @@
+"""
+Who is where, across every program: classroom -> booked intervals and lecturer -> teaching intervals.
+build_db writes the inverted index next to the schedule store; queries bisect per-day sorted intervals instead of
+filtering the whole timetable.
+
+    python occupancy.py free-rooms "Tue 14:00"
+    python occupancy.py where "Akhmetova" [--at "Mon 18:10"]
+    python occupancy.py --term 2026-27-t1 double-bookings [--kind rooms|lecturers]
+"""
+import sys
+import bisect
+import argparse
+import datetime
+from zoneinfo import ZoneInfo
+from schedule_events import DAYS, parse_time_range, format_time_range
+from schedule_store import OCCUPANCY_INDEX_FILE, open_store, write_index_file, read_index_file, load_index_file
+from terms import get_catalog
+
+OCCUPANCY_INDEX_VERSION = 1
+# Not physical rooms / not people: distance-learning slots list these instead
+NOT_A_ROOM = {'', 'online'}
+
+def is_room(name):
+    return name.strip().lower() not in NOT_A_ROOM
+
+def is_lecturer(name):
+    return bool(name.strip()) and not name.startswith('http')
+
+def build_occupancy(rows):
+    """
+    Inverts timetable rows into {"rooms": {room: {day: [booking, ...]}}, "lecturers": {...}}.
+    A booking is [start, end, discipline, type, lecturer or room, [groups]] with times in minutes since midnight;
+    the rows of a class shared by several groups (a streamed lecture) become one booking. Bookings are sorted by start.
+    """
+    bookings = {'rooms': {}, 'lecturers': {}}
+    for row in rows:
+        bounds = parse_time_range(row['Time'])
+        if bounds is None or row['Day'] not in DAYS:
+            continue
+        room, lecturer = row['Classroom'].strip(), row['Lecturer'].strip()
+        for kind, name, other in (('rooms', room, lecturer), ('lecturers', lecturer, room)):
+            if not (is_room(name) if kind == 'rooms' else is_lecturer(name)):
+                continue
+            key = (bounds[0], bounds[1], row['Discipline'], row['Type'], other)
+            bookings[kind].setdefault(name, {}).setdefault(row['Day'], {}).setdefault(key, set()).add(row['Group'])
+
+    return {
+        kind: {
+            name: {day: [list(key) + [sorted(groups)] for key, groups in sorted(slots.items())] for day, slots in sorted(days.items())}
+            for name, days in sorted(names.items())
+        }
+        for kind, names in bookings.items()
+    }
+
+def find_double_bookings(bookings):
+    """[(name, day, booking_a, booking_b)] for overlapping bookings of one room or lecturer that aren't the same class."""
+    found = []
+    for name, days in bookings.items():
+        for day, entries in days.items():
+            active = []
+            for entry in entries:
+                active = [other for other in active if other[1] > entry[0]]
+                found.extend((name, day, other, entry) for other in active)
+                active.append(entry)
+    return found
+
+def write_occupancy_index(store, path=OCCUPANCY_INDEX_FILE):
+    """Builds the index from a ScheduleStore and writes it; returns the OccupancyIndex."""
+    index = build_occupancy(store.to_frame().to_dict('records'))
+    write_index_file(path, OCCUPANCY_INDEX_VERSION, index)
+    return OccupancyIndex(index)
+
+def _booking_dict(day, entry, other_field):
+    start, end, discipline, type_, other, groups = entry
+    return {'day': day, 'time': format_time_range(start, end), 'discipline': discipline, 'type': type_,
+            other_field: other, 'groups': groups}
+
+class OccupancyIndex:
+    """Read side of the occupancy index. Double bookings are found once, when the index is loaded."""
+
+    def __init__(self, index):
+        self._index = index
+        # Per (kind, name, day): booking starts for bisect
+        self._starts = {
+            kind: {name: {day: [entry[0] for entry in entries] for day, entries in days.items()} for name, days in index[kind].items()}
+            for kind in ('rooms', 'lecturers')
+        }
+        self._max_length = max(
+            (entry[1] - entry[0] for kind in ('rooms', 'lecturers') for days in index[kind].values()
+             for entries in days.values() for entry in entries),
+            default=0,
+        )
+        self._double_bookings = {kind: find_double_bookings(index[kind]) for kind in ('rooms', 'lecturers')}
+
+    @classmethod
+    def open(cls, path=OCCUPANCY_INDEX_FILE):
+        return cls(read_index_file(path, OCCUPANCY_INDEX_VERSION))
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(build_occupancy(store.to_frame().to_dict('records')))
+
+    def rooms(self):
+        return list(self._index['rooms'])
+
+    def lecturers(self):
+        return list(self._index['lecturers'])
+
+    def _bookings_between(self, kind, name, day, start, end):
+        entries = self._index[kind].get(name, {}).get(day)
+        if not entries:
+            return []
+        starts = self._starts[kind][name][day]
+        # Bookings starting before `end`, of which only the last few (within the longest booking) can still be running
+        stop = bisect.bisect_left(starts, end)
+        first = bisect.bisect_left(starts, start - self._max_length, 0, stop)
+        return [entry for entry in entries[first:stop] if entry[1] > start]
+
+    def free_rooms(self, day, start, end=None):
+        """Rooms with no booking overlapping [start, end) on day (minutes since midnight; end defaults to start + 1)."""
+        end = start + 1 if end is None else end
+        return [room for room in self._index['rooms'] if not self._bookings_between('rooms', room, day, start, end)]
+
+    def room_bookings(self, room, day, start, end=None):
+        end = start + 1 if end is None else end
+        return [_booking_dict(day, entry, 'lecturer') for entry in self._bookings_between('rooms', room, day, start, end)]
+
+    def find_lecturers(self, query):
+        """Lecturer names containing query, case-insensitively; an exact name matches only itself."""
+        if query in self._index['lecturers']:
+            return [query]
+        query = query.lower()
+        return [name for name in self._index['lecturers'] if query in name.lower()]
+
+    def where_is(self, lecturer, day, minute):
+        """The bookings of a lecturer (exact name) running at minute on day, each with its 'room'."""
+        return [_booking_dict(day, entry, 'room') for entry in self._bookings_between('lecturers', lecturer, day, minute, minute + 1)]
+
+    def next_booking(self, lecturer, day, minute):
+        """The lecturer's next booking starting after minute on the same day, or None."""
+        entries = self._index['lecturers'].get(lecturer, {}).get(day, [])
+        position = bisect.bisect_right(self._starts['lecturers'].get(lecturer, {}).get(day, []), minute)
+        return _booking_dict(day, entries[position], 'room') if position < len(entries) else None
+
+    def double_bookings(self, kind='rooms'):
+        """[(name, booking_a, booking_b)]: a room hosting two different classes at once, or a lecturer in two places at once."""
+        other_field = 'lecturer' if kind == 'rooms' else 'room'
+        return [(name, _booking_dict(day, a, other_field), _booking_dict(day, b, other_field))
+                for name, day, a, b in self._double_bookings[kind]]
+
+def load_occupancy_index(path=OCCUPANCY_INDEX_FILE, store=None):
+    """
+    The prebuilt index (re-read when build_db rewrites it), or one built from store (the default schedule store
+    if not given) when build_db hasn't written it.
+    """
+    index = load_index_file(path, OccupancyIndex.open)
+    if index is not None:
+        return index
+    if store is None:
+        store = open_store()
+    return OccupancyIndex.from_store(store)
+
+def parse_when(text, timezone, now=None):
+    """'Tue 14:00' / 'tuesday 9:30' -> ('Tuesday', 840); 'now' (or None) -> the current weekday and time in timezone."""
+    if not text or text.strip().lower() == 'now':
+        now = now or datetime.datetime.now(ZoneInfo(timezone))
+        return DAYS[now.weekday()], now.hour * 60 + now.minute
+    parts = text.split()
+    days = [day for day in DAYS if parts and day.lower().startswith(parts[0].lower())]
+    hm = parts[1].split(':') if len(parts) == 2 else []
+    if len(parts[0]) < 2 or len(days) != 1 or len(hm) != 2 or not hm[0].isdigit() or not hm[1].isdigit():
+        raise ValueError(f"Expected a day and time like 'Tue 14:00', got {text!r}")
+    return days[0], int(hm[0]) * 60 + int(hm[1])
+
+def _describe(booking, other_field):
+    return f"{booking['day']} {booking['time']} {booking['discipline']} ({booking['type']}) {booking[other_field]} [{', '.join(booking['groups'])}]"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Room and lecturer occupancy queries over the whole timetable")
+    parser.add_argument("--term", default=None, help="term of terms.json to query (default: the catalog's default term)")
+    parser.add_argument("--index", default=None, help="default: the term's occupancy index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    free = commands.add_parser("free-rooms", help="rooms with no class at a given time")
+    free.add_argument("when", help="e.g. 'Tue 14:00'")
+    free.add_argument("--minutes", type=int, default=1, help="how long the room must stay free (default: 1)")
+    where = commands.add_parser("where", help="where a lecturer is teaching at a given time")
+    where.add_argument("lecturer", help="full name or part of it")
+    where.add_argument("--at", default="now", help="e.g. 'Mon 18:10' (default: now, in the term's timezone)")
+    double = commands.add_parser("double-bookings", help="rooms or lecturers booked twice at once")
+    double.add_argument("--kind", choices=("rooms", "lecturers"), default="rooms")
+    args = parser.parse_args(argv)
+
+    catalog = get_catalog()
+    try:
+        term = catalog.get(args.term)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    index = load_occupancy_index(args.index or term.occupancy_index_path, catalog.store(term.id))
+    try:
+        if args.command == "free-rooms":
+            day, minute = parse_when(args.when, term.timezone)
+            rooms = index.free_rooms(day, minute, minute + args.minutes)
+            print(f"{len(rooms)} free rooms on {day} at {minute // 60:02d}:{minute % 60:02d}:")
+            for room in rooms:
+                print(f"  {room}")
+        elif args.command == "where":
+            day, minute = parse_when(args.at, term.timezone)
+            names = index.find_lecturers(args.lecturer)
+            if not names:
+                print(f"No lecturer matching {args.lecturer!r}.")
+                return 1
+            for name in names:
+                bookings = index.where_is(name, day, minute)
+                if bookings:
+                    for booking in bookings:
+                        print(f"{name}: {_describe(booking, 'room')}")
+                    continue
+                upcoming = index.next_booking(name, day, minute)
+                print(f"{name}: not teaching" + (f"; next {_describe(upcoming, 'room')}" if upcoming else f" for the rest of {day}"))
+        else:
+            other_field = 'lecturer' if args.kind == 'rooms' else 'room'
+            found = index.double_bookings(args.kind)
+            print(f"{len(found)} double bookings of {args.kind}:")
+            for name, a, b in found:
+                print(f"  {name}: {_describe(a, other_field)}\n  {' ' * len(name)}  {_describe(b, other_field)}")
+    except ValueError as e:
+        print(e)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
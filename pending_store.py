@@ -0,0 +1,154 @@
+"""
+Holds each user's selected classes while they are away on the Google OAuth consent screen.
+Entries are keyed by the OAuth 'state' parameter, popped atomically by the callback, expire after a TTL
+and are capped in number so abandoned sign-ins can't grow the store forever.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+DEFAULT_DB_PATH = "pending_selections.db"
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+
+class PendingSelectionStore(ABC):
+    """Interface for pending-selection backends."""
+
+    @abstractmethod
+    def put(self, state, selection):
+        """Stores selection (any JSON value) under state, replacing what was there."""
+
+    @abstractmethod
+    def pop(self, state):
+        """Removes and returns the selection stored under state, or None if missing or expired."""
+
+class MemoryPendingStore(PendingSelectionStore):
+    """Process-local backend, for tests and single-process development."""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, state, selection):
+        now = self._clock()
+        with self._lock:
+            self._entries.pop(state, None)
+            self._entries[state] = (now, json.loads(json.dumps(selection, default=str)))
+            # Entries are in insertion order, so expired and excess ones are at the front
+            while self._entries:
+                created, _ = next(iter(self._entries.values()))
+                if now - created <= self.ttl and len(self._entries) <= self.max_entries:
+                    break
+                self._entries.popitem(last=False)
+
+    def pop(self, state):
+        with self._lock:
+            entry = self._entries.pop(state, None)
+        if entry is None or self._clock() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLitePendingStore(PendingSelectionStore):
+    """
+    Default backend: one SQLite file in WAL mode, shared by every worker process on the host.
+    Each put/pop is a single short transaction, so concurrent users never rewrite each other's entries.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending ("
+                " state TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pending_created ON pending (created)")
+
+    def _connect(self):
+        # A connection per call keeps the store safe to use from Streamlit's script threads
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _Closing(conn)
+
+    def put(self, state, selection):
+        now = self._clock()
+        payload = json.dumps(selection, default=str)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO pending (state, payload, created) VALUES (?, ?, ?)", (state, payload, now))
+            conn.execute("DELETE FROM pending WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM pending WHERE state IN ("
+                " SELECT state FROM pending ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+
+    def pop(self, state):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT payload, created FROM pending WHERE state = ?", (state,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM pending WHERE state = ?", (state,))
+            conn.execute("COMMIT")
+        if row is None or self._clock() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+class _Closing:
+    """Context manager that rolls back an unfinished transaction and closes the connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_pending_store():
+    """
+    Returns the process-wide store, configured by PENDING_STORE:
+    'memory' for the in-memory backend, otherwise a SQLite file path (default pending_selections.db).
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            target = os.environ.get("PENDING_STORE", DEFAULT_DB_PATH)
+            ttl = float(os.environ.get("PENDING_STORE_TTL", DEFAULT_TTL_SECONDS))
+            if target == "memory":
+                _default_store = MemoryPendingStore(ttl=ttl)
+            else:
+                _default_store = SQLitePendingStore(target, ttl=ttl)
+        return _default_store
+
+def set_pending_store(store):
+    """Swaps the process-wide store."""
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
@@ -0,0 +1,154 @@
+"""
+Minimal in-process timing instrumentation.
+Wrap a code path in `timed("name")`, bump counters with `count("name")`, and read the aggregates back with
+`snapshot()` or, in Prometheus text format, with `render_prometheus()` (served on /metrics by `start_metrics_server`
+and, when started with --metrics, by feed_server).
+
+Collection is off unless METRICS_ENABLED=1 (or `enable()` / `start_metrics_server` is called); while it is off,
+`timed` hands out one shared no-op context manager and `count` returns at once.
+"""
+import os
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "schedule"
+# Upper bounds in seconds; covers cached lookups (sub-millisecond) up to slow OAuth/API round trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_enabled = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+_stats = {}
+_counters = {}
+_lock = threading.Lock()
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def is_enabled():
+    return _enabled
+
+def record(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0, 'buckets': [0] * len(DEFAULT_BUCKETS)}
+        stat['count'] += 1
+        stat['total'] += seconds
+        stat['last'] = seconds
+        if seconds > stat['max']:
+            stat['max'] = seconds
+        position = bisect.bisect_left(DEFAULT_BUCKETS, seconds)
+        if position < len(DEFAULT_BUCKETS):
+            stat['buckets'][position] += 1
+    logger.debug("%s took %.2f ms", name, seconds * 1000)
+
+def count(name, amount=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def timed(name):
+    """Context manager recording how long its block took under name (also when the block raises)."""
+    return _Span(name) if _enabled else _NO_SPAN
+
+def snapshot():
+    """{name: {'count', 'total', 'mean', 'max', 'last'}} with times in seconds."""
+    with _lock:
+        return {
+            name: dict({k: v for k, v in stat.items() if k != 'buckets'}, mean=stat['total'] / stat['count'])
+            for name, stat in _stats.items()
+        }
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+
+def _metric_name(name):
+    return METRICS_PREFIX + "_" + "".join(c if c.isalnum() else "_" for c in name)
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus():
+    """All spans as one histogram family (labelled by span) and every counter as its own counter, in Prometheus text format."""
+    with _lock:
+        stats = {name: dict(stat, buckets=list(stat['buckets'])) for name, stat in _stats.items()}
+        totals = dict(_counters)
+
+    family = f"{METRICS_PREFIX}_span_duration_seconds"
+    lines = [f"# HELP {family} Time spent in instrumented code paths.", f"# TYPE {family} histogram"]
+    for name, stat in sorted(stats.items()):
+        span = _label(name)
+        cumulative = 0
+        for bound, hits in zip(DEFAULT_BUCKETS, stat['buckets']):
+            cumulative += hits
+            lines.append(f'{family}_bucket{{span="{span}",le="{bound:g}"}} {cumulative}')
+        lines.append(f'{family}_bucket{{span="{span}",le="+Inf"}} {stat["count"]}')
+        lines.append(f'{family}_sum{{span="{span}"}} {stat["total"]!r}')
+        lines.append(f'{family}_count{{span="{span}"}} {stat["count"]}')
+    for name, value in sorted(totals.items()):
+        metric = _metric_name(name) + "_total"
+        lines.extend([f"# TYPE {metric} counter", f"{metric} {value}"])
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scraped every few seconds; keep it off stderr
+        pass
+
+def start_metrics_server(host="127.0.0.1", port=9464):
+    """Turns collection on and serves GET /metrics on a daemon thread. Returns the server."""
+    enable()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
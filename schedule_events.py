@@ -0,0 +1,88 @@
+"""Helpers shared by the ICS exporter and the Google Calendar sync."""
+import json
+import hashlib
+
+# Weekday names as the timetables spell them, in datetime.weekday() order
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Slots that only differ in time are merged when these all match
+MERGE_KEY_FIELDS = ('Group', 'Day', 'Discipline', 'Type', 'Classroom', 'Lecturer')
+# Identity of a class occurrence; a change in any other field is an update of the same event
+EVENT_KEY_FIELDS = ('Group', 'Day', 'Time', 'Discipline')
+# Slots are 50 minutes with a 10 minute break (15 around lunch), so a gap this small means "back to back"
+MAX_MERGE_GAP_MINUTES = 15
+
+def parse_time_range(time_str):
+    """'18:00-18:50' -> (1080, 1130) in minutes since midnight, or None if it can't be parsed."""
+    parts = str(time_str).strip().split('-')
+    if len(parts) != 2:
+        return None
+    bounds = []
+    for part in parts:
+        hm = part.strip().split(':')
+        if len(hm) != 2 or not hm[0].isdigit() or not hm[1].isdigit():
+            return None
+        bounds.append(int(hm[0]) * 60 + int(hm[1]))
+    return bounds[0], bounds[1]
+
+def format_time_range(start, end):
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+def merge_consecutive_slots(events, max_gap_minutes=MAX_MERGE_GAP_MINUTES):
+    """
+    Coalesces back-to-back slots of the same class into one block,
+    e.g. 18:00-18:50 and 19:00-19:50 -> 18:00-19:50.
+    Slots of the same class that overlap or repeat exactly (the same row listed twice) are absorbed into one block too.
+    Returns new dicts in the order of each block's first slot; events without a parseable time are kept as-is.
+    """
+    blocks = {}
+    # (position of first slot, event dict, merged bounds or None)
+    output = []
+
+    for position, ev in enumerate(events):
+        bounds = parse_time_range(ev.get('Time', ''))
+        if bounds is None:
+            output.append((position, ev, None))
+            continue
+        key = tuple(str(ev.get(field, '')).strip() for field in MERGE_KEY_FIELDS)
+        blocks.setdefault(key, []).append((bounds, position, ev))
+
+    for slots in blocks.values():
+        slots.sort(key=lambda slot: slot[0])
+        current = None
+        for (start, end), position, ev in slots:
+            if current is not None and start - current[2][1] <= max_gap_minutes:
+                current[2][1] = max(current[2][1], end)
+                continue
+            current = (position, ev, [start, end])
+            output.append(current)
+
+    merged = []
+    for position, ev, bounds in sorted(output, key=lambda item: item[0]):
+        ev = dict(ev)
+        if bounds is not None:
+            ev['Time'] = format_time_range(*bounds)
+        merged.append(ev)
+    return merged
+
+def event_key(ev):
+    """Stable identifier for a class occurrence, built from its group, day, time and discipline."""
+    raw = '|'.join(str(ev.get(field, '')).strip() for field in EVENT_KEY_FIELDS)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+def keyed_events(events):
+    """
+    Yields (key, event) with keys unique within events.
+    Two rows can share group/day/time/discipline (e.g. the same elective in two rooms); later ones get a -2, -3... suffix.
+    """
+    seen_keys = {}
+    for ev in events:
+        key = event_key(ev)
+        seen_keys[key] = seen_keys.get(key, 0) + 1
+        if seen_keys[key] > 1:
+            key = f"{key}-{seen_keys[key]}"
+        yield key, ev
+
+def content_hash(obj):
+    """Hash of any JSON-serialisable value, independent of dict ordering."""
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
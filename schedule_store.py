@@ -0,0 +1,222 @@
+import os
+import json
+import functools
+import pandas as pd
+import pyarrow as pa
+
+STORE_FILE = "database.arrow"
+INDEX_FILE = "database_index.json"
+# Indexes build_db writes next to the store, one per query module
+CLASH_INDEX_FILE = "database_clashes.json"
+OCCUPANCY_INDEX_FILE = "database_occupancy.json"
+SEARCH_INDEX_FILE = "database_search.json"
+STORE_VERSION = 1
+COLUMNS = ["Group", "Day", "Time", "Discipline", "Classroom", "Type", "Lecturer", "Program"]
+
+def write_index_file(path, version, index, **dump_options):
+    """Writes {"version": version, **index} as JSON under a temporary name and swaps it in."""
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({"version": version, **index}, f, ensure_ascii=False, **dump_options)
+    os.replace(path + ".tmp", path)
+
+def read_index_file(path, version):
+    """The JSON index at path; ValueError if it was written with another version."""
+    with open(path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get("version") != version:
+        raise ValueError(f"{path} has unsupported version {index.get('version')}")
+    return index
+
+@functools.lru_cache(maxsize=16)
+def _load_index_file(path, mtime, open_index):
+    return open_index(path)
+
+def load_index_file(path, open_index):
+    """open_index(path), re-run only when build_db rewrites the file; None if it hasn't been built."""
+    try:
+        return _load_index_file(path, os.path.getmtime(path), open_index)
+    except OSError:
+        return None
+
+def build_group_index(programs, groups):
+    """
+    Builds {program: {group: [[start, stop], ...]}} from the Program/Group columns in row order.
+    Rows of one group are contiguous in practice (one table per page), so each group usually has one range.
+    """
+    index = {}
+    start = 0
+    for i in range(1, len(programs) + 1):
+        if i == len(programs) or programs[i] != programs[start] or groups[i] != groups[start]:
+            index.setdefault(programs[start], {}).setdefault(groups[start], []).append([start, i])
+            start = i
+    return index
+
+def _to_arrow(df):
+    # Dictionary-encode every column: ~8k rows share a few hundred distinct strings
+    return pa.table({col: pa.array(df[col].astype(str).tolist(), type=pa.string()).dictionary_encode() for col in COLUMNS})
+
+STORE_SCHEMA = pa.schema([(col, pa.dictionary(pa.int32(), pa.string())) for col in COLUMNS])
+
+class StoreWriter:
+    """
+    Streams rows into the store chunk by chunk: the Arrow file, its (Program, Group) index and optionally database.csv.
+    Dictionaries only grow, so each batch is written as a dictionary delta and memory stays bounded by one chunk.
+    Everything is written under temporary names and swapped in by close(), so readers never see a half-built store.
+    """
+
+    def __init__(self, store_path=STORE_FILE, index_path=INDEX_FILE, csv_path=None):
+        self.store_path = store_path
+        self.index_path = index_path
+        self.csv_path = csv_path
+        self.rows = 0
+        self._codes = {col: {} for col in COLUMNS}
+        self._index = {}
+        self._open_range = None
+        self._sink = pa.OSFile(store_path + ".tmp", 'wb')
+        self._writer = pa.ipc.new_file(self._sink, STORE_SCHEMA, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        self._csv = open(csv_path + ".tmp", 'w', encoding='utf-8', newline='') if csv_path else None
+
+    def write_rows(self, rows):
+        """Appends a chunk of row dicts (with all COLUMNS, including Program)."""
+        if not rows:
+            return
+        columns = {col: ["" if row[col] is None else str(row[col]) for row in rows] for col in COLUMNS}
+
+        arrays = []
+        for col in COLUMNS:
+            codes = self._codes[col]
+            indices = [codes.setdefault(value, len(codes)) for value in columns[col]]
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(list(codes), pa.string())))
+        self._writer.write_batch(pa.record_batch(arrays, schema=STORE_SCHEMA))
+
+        if self._csv is not None:
+            pd.DataFrame(columns, columns=COLUMNS).to_csv(self._csv, header=self.rows == 0, index=False)
+
+        for offset, (program, group) in enumerate(zip(columns['Program'], columns['Group'])):
+            if self._open_range is None or self._open_range[:2] != (program, group):
+                self._close_range(self.rows + offset)
+                self._open_range = (program, group, self.rows + offset)
+        self.rows += len(rows)
+
+    def _close_range(self, stop):
+        if self._open_range is not None:
+            program, group, start = self._open_range
+            self._index.setdefault(program, {}).setdefault(group, []).append([start, stop])
+            self._open_range = None
+
+    def close(self):
+        self._close_range(self.rows)
+        self._writer.close()
+        self._sink.close()
+        os.replace(self.store_path + ".tmp", self.store_path)
+
+        write_index_file(self.index_path, STORE_VERSION, {"rows": self.rows, "groups": self._index})
+
+        if self._csv is not None:
+            self._csv.close()
+            os.replace(self.csv_path + ".tmp", self.csv_path)
+
+    def abort(self):
+        """Discards everything written so far, leaving any previous store in place."""
+        self._sink.close()
+        os.remove(self.store_path + ".tmp")
+        if self._csv is not None:
+            self._csv.close()
+            os.remove(self.csv_path + ".tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_store(df, store_path=STORE_FILE, index_path=INDEX_FILE, csv_path=None, chunk_rows=4096):
+    """Writes a whole DataFrame to the store, chunk_rows at a time."""
+    records = df[COLUMNS].to_dict('records')
+    with StoreWriter(store_path, index_path, csv_path) as writer:
+        for start in range(0, len(records), chunk_rows):
+            writer.write_rows(records[start:start + chunk_rows])
+
+class ScheduleStore:
+    """
+    Read side of the schedule store.
+    Only the small JSON index is read on open; the Arrow file is memory-mapped on first access,
+    so slicing a group touches just that group's rows.
+    """
+
+    def __init__(self, index, store_path=None, table=None):
+        self._index = index
+        self._store_path = store_path
+        self._table = table
+        self._source = None
+
+    @classmethod
+    def open(cls, store_path=STORE_FILE, index_path=INDEX_FILE):
+        return cls(read_index_file(index_path, STORE_VERSION)["groups"], store_path=store_path)
+
+    @classmethod
+    def from_frame(cls, df):
+        """In-memory store for a DataFrame, e.g. when only database.csv is available."""
+        df = df.reset_index(drop=True)
+        index = build_group_index(df['Program'].astype(str).tolist(), df['Group'].astype(str).tolist())
+        return cls(index, table=_to_arrow(df))
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._source = pa.memory_map(self._store_path, 'r')
+            self._table = pa.ipc.open_file(self._source).read_all()
+        return self._table
+
+    def programs(self):
+        return list(self._index)
+
+    def groups(self, program):
+        return list(self._index.get(program, {}))
+
+    def _frame(self, table):
+        # Decode to plain strings so callers sort Time/Day lexically, not by dictionary order
+        return pa.table({col: table.column(col).cast(pa.string()) for col in COLUMNS}).to_pandas()
+
+    def group_frame(self, program, group):
+        ranges = self._index.get(program, {}).get(group, [])
+        if not ranges:
+            return pd.DataFrame(columns=COLUMNS)
+        parts = [self.table.slice(start, stop - start) for start, stop in ranges]
+        frame = self._frame(pa.concat_tables(parts) if len(parts) > 1 else parts[0])
+        # Keep the row numbers of the full table so widget keys stay stable across groups
+        frame.index = [i for start, stop in ranges for i in range(start, stop)]
+        return frame
+
+    def to_frame(self):
+        return self._frame(self.table)
+
+    def iter_program_rows(self, program, chunk_rows=4096):
+        """Yields the rows of one program as lists of dicts, at most chunk_rows at a time."""
+        # A program's groups are usually adjacent, so merge their ranges into as few slices as possible
+        merged = []
+        for start, stop in sorted(r for ranges in self._index.get(program, {}).values() for r in ranges):
+            if merged and merged[-1][1] == start:
+                merged[-1][1] = stop
+            else:
+                merged.append([start, stop])
+        for start, stop in merged:
+            for chunk_start in range(start, stop, chunk_rows):
+                chunk = self.table.slice(chunk_start, min(chunk_rows, stop - chunk_start))
+                yield pa.table({col: chunk.column(col).cast(pa.string()) for col in COLUMNS}).to_pylist()
+
+    def close(self):
+        """Releases the memory map (needed before the store file can be replaced on Windows)."""
+        self._table = None
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+def open_store(store_path=STORE_FILE, index_path=INDEX_FILE, csv_path="database.csv"):
+    """Opens the binary store, falling back to database.csv if it has not been built yet."""
+    if os.path.exists(store_path) and os.path.exists(index_path):
+        return ScheduleStore.open(store_path, index_path)
+    return ScheduleStore.from_frame(pd.read_csv(csv_path, dtype=str, keep_default_na=False))
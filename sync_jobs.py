@@ -0,0 +1,160 @@
+"""
+Background Google Calendar sync jobs.
+The OAuth callback submits a job and returns at once; the job runs on a small thread pool inside the app process
+and reports its progress, which any rerun can read back by job id. The app keeps the id in the page URL,
+so a reloaded page (a new Streamlit session) still finds its job.
+"""
+import os
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from perf import timed, count
+
+DEFAULT_WORKERS = 4
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_MAX_JOBS = 1000
+
+class QueueFullError(RuntimeError):
+    """Every job slot is taken by a job that hasn't finished yet."""
+
+class SyncJob:
+    """State of one job: 'queued' -> 'running' -> 'done' or 'failed', with a stage label and done/total counts."""
+
+    def __init__(self, job_id, clock=time.time):
+        self.id = job_id
+        self.status = 'queued'
+        self.stage = "Waiting for a free worker"
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self._clock = clock
+        self.created = clock()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage):
+        with self._lock:
+            self.stage = stage
+
+    def progress(self, done, total):
+        """Progress callback for sync_schedule_events."""
+        with self._lock:
+            self.done, self.total = done, total
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            self.status = 'failed' if error is not None else 'done'
+            self.result, self.error = result, error
+            self.finished = self._clock()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'id': self.id, 'status': self.status, 'stage': self.stage, 'done': self.done, 'total': self.total,
+                'result': self.result, 'error': self.error, 'created': self.created, 'finished': self.finished,
+            }
+
+class SyncJobQueue:
+    """
+    Runs jobs on a thread pool; finished jobs are kept for ttl seconds so the UI can collect them.
+    At most max_jobs jobs are tracked: the oldest finished ones make room for new ones, unfinished ones never do.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, ttl=DEFAULT_TTL_SECONDS, max_jobs=DEFAULT_MAX_JOBS, clock=time.time):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._clock = clock
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync-job")
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(job, *args, **kwargs) and returns the new job's id. fn's return value becomes the job result.
+        Raises QueueFullError if max_jobs jobs are all still queued or running.
+        """
+        job = SyncJob(secrets.token_urlsafe(16), self._clock)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        with job._lock:
+            job.status = 'running'
+        try:
+            with timed("sync_jobs.run"):
+                result = fn(job, *args, **kwargs)
+        except Exception as e:
+            count("sync_jobs.failed")
+            job._finish(error=str(e))
+        else:
+            count("sync_jobs.done")
+            job._finish(result=result)
+
+    def _prune(self):
+        """Forgets expired jobs, then the oldest finished ones until a slot is free; queued and running jobs are kept."""
+        now = self._clock()
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished:
+            if now - self._jobs[job_id].finished > self.ttl or len(self._jobs) >= self.max_jobs:
+                del self._jobs[job_id]
+        if len(self._jobs) >= self.max_jobs:
+            raise QueueFullError(f"{len(self._jobs)} calendar syncs are still in progress, please try again in a few minutes.")
+
+    def get(self, job_id):
+        """Snapshot dict of a job, or None if it is unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job is not None else None
+
+    def wait(self, job_id, timeout=None, interval=0.05):
+        """Blocks until the job has finished (or timeout seconds passed) and returns its snapshot."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.get(job_id)
+            if snapshot is None or snapshot['status'] in ('done', 'failed'):
+                return snapshot
+            if deadline is not None and time.monotonic() >= deadline:
+                return snapshot
+            time.sleep(interval)
+
+    def __len__(self):
+        return len(self._jobs)
+
+def run_calendar_sync(job, code, redirect_uri, events, term_id=None):
+    """Job body for the OAuth callback: exchanges the code, finds the term's calendar and syncs events into it."""
+    # Imported here so the app only loads the Google client libraries once a sync actually runs
+    from calendar_sync import (account_subject, get_credentials_from_code, get_calendar_service,
+                               get_or_create_calendar, sync_schedule_events)
+    from terms import get_term
+    term = get_term(term_id)
+    job.set_stage("Signing in to Google")
+    creds = get_credentials_from_code(code, redirect_uri=redirect_uri)
+    service = get_calendar_service(creds)
+    job.set_stage("Finding your calendar")
+    calendar_id = get_or_create_calendar(service, account=account_subject(creds), term=term)
+    job.set_stage("Syncing events")
+    summary = sync_schedule_events(service, calendar_id, events, progress=job.progress, term=term)
+    return dict(summary, calendar=term.calendar_name)
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Returns the process-wide queue; SYNC_WORKERS sets its number of threads."""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = SyncJobQueue(workers=int(os.environ.get("SYNC_WORKERS", DEFAULT_WORKERS)))
+        return _default_queue
+
+def set_job_queue(queue):
+    """Swaps the process-wide queue."""
+    global _default_queue
+    with _default_queue_lock:
+        _default_queue = queue
@@ -0,0 +1,222 @@
+"""
+Term catalog: which terms (and institutions) this deployment serves, with each term's dates, holidays, timezone,
+source PDFs and build output. Everything that used to be hard-coded for one trimester is read from here:
+the first week's dates, the RRULE end, holiday EXDATEs and the calendar name. A term's holidays are all its days
+off, including the weekdays a holiday falling on a weekend is moved to; holidays_source says where they come from.
+
+A term's schedule store is opened on first use and kept in a small LRU, so a worker only holds the terms
+its users actually ask for. The catalog is terms.json next to this module (TERM_CATALOG overrides the path).
+SCHEDULE_TERM picks the default term by id; a term name such as "Trimester 3" (what it used to hold, when it only
+named the calendar) is still accepted with a warning. CALENDAR_NAME overrides the default term's calendar name.
+"""
+import os
+import json
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+from schedule_store import STORE_FILE, INDEX_FILE, CLASH_INDEX_FILE, OCCUPANCY_INDEX_FILE, SEARCH_INDEX_FILE, open_store
+from schedule_events import DAYS
+from perf import timed
+
+CATALOG_FILE = os.environ.get("TERM_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "terms.json"))
+CATALOG_VERSION = 1
+TERM_STORE_CACHE_SIZE = int(os.environ.get("TERM_STORE_CACHE_SIZE", 4))
+
+logger = logging.getLogger(__name__)
+
+class Term:
+    """One term of the catalog. Relative paths in spec are resolved against base_dir (the catalog's directory)."""
+
+    def __init__(self, term_id, spec, base_dir=""):
+        self.id = term_id
+        self.name = spec['name']
+        self.institution = spec.get('institution', '')
+        self.timezone = spec.get('timezone', 'Asia/Almaty')
+        self.start = datetime.date.fromisoformat(spec['start'])
+        self.end = datetime.date.fromisoformat(spec['end'])
+        if self.end < self.start:
+            raise ValueError(f"Term {term_id} ends before it starts")
+        self.holidays = sorted(datetime.date.fromisoformat(day) for day in spec.get('holidays', []))
+        self.calendar_name = spec.get('calendar_name') or f"{self.institution} Schedule - {self.name}".strip()
+        self.data_dir = os.path.normpath(os.path.join(base_dir, spec.get('data_dir', os.path.join("terms", term_id))))
+        self.schedules_dir = os.path.normpath(os.path.join(base_dir, spec['schedules_dir'])) if 'schedules_dir' in spec \
+            else os.path.join(self.data_dir, "schedules")
+        self._tz = ZoneInfo(self.timezone)
+        # First date of every weekday on or after the start: each weekly event's first occurrence
+        self.first_dates = {DAYS[(self.start.weekday() + i) % 7]: self.start + datetime.timedelta(days=i) for i in range(7)}
+        # RRULE UNTIL must be in UTC; the last day of the term counts in full
+        last_moment = datetime.datetime.combine(self.end, datetime.time(23, 59, 59), self._tz)
+        self.until = last_moment.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        self._holidays_by_day = {}
+        for d in self.holidays:
+            if self.start <= d <= self.end:
+                self._holidays_by_day.setdefault(DAYS[d.weekday()], []).append(d.strftime('%Y%m%d'))
+        # (day, start time) -> EXDATE line; a timetable only has a few dozen distinct slots
+        self._exdates = {}
+
+    def path(self, filename):
+        return os.path.normpath(os.path.join(self.data_dir, filename))
+
+    @property
+    def csv_path(self):
+        return self.path("database.csv")
+
+    @property
+    def store_path(self):
+        return self.path(STORE_FILE)
+
+    @property
+    def index_path(self):
+        return self.path(INDEX_FILE)
+
+    @property
+    def clash_index_path(self):
+        return self.path(CLASH_INDEX_FILE)
+
+    @property
+    def occupancy_index_path(self):
+        return self.path(OCCUPANCY_INDEX_FILE)
+
+    @property
+    def search_index_path(self):
+        return self.path(SEARCH_INDEX_FILE)
+
+    @property
+    def ics_dir(self):
+        return self.path("ics")
+
+    def data_mtime(self):
+        """Modification time of the term's build output (0 if it hasn't been built)."""
+        for path in (self.store_path, self.csv_path):
+            if os.path.exists(path):
+                return int(os.path.getmtime(path))
+        return 0
+
+    def utc_offset(self, date):
+        """'+05:00' for a date in the term's timezone."""
+        offset = datetime.datetime.combine(date, datetime.time(12), self._tz).strftime('%z')
+        return f"{offset[:3]}:{offset[3:]}"
+
+    def rrule(self):
+        return f"RRULE:FREQ=WEEKLY;UNTIL={self.until}"
+
+    def exdate(self, day, start_time):
+        """
+        'EXDATE;TZID=...:20260323T090000,...' dropping the holidays from a weekly event on day starting at
+        start_time ('09:00'), or None if no holiday falls on that weekday. Same syntax for ICS and Calendar API.
+        """
+        key = (day, start_time)
+        if key not in self._exdates:
+            hm = start_time.strip().split(':')
+            dates = self._holidays_by_day.get(day)
+            if not dates or len(hm) != 2 or not hm[0].isdigit() or not hm[1].isdigit():
+                self._exdates[key] = None
+            else:
+                self._exdates[key] = f"EXDATE;TZID={self.timezone}:" + ",".join(f"{d}T{int(hm[0]):02d}{int(hm[1]):02d}00" for d in dates)
+        return self._exdates[key]
+
+    def __repr__(self):
+        return f"Term({self.id!r}, {self.name!r})"
+
+def resolve_term_id(terms, value):
+    """
+    The term id SCHEDULE_TERM names: a term id, or the name of exactly one term (its meaning before the catalog).
+    Raises ValueError for anything else, so a deployment never silently serves or syncs the wrong term.
+    """
+    if not value or value in terms:
+        return value
+    named = [term.id for term in terms.values() if term.name == value]
+    if len(named) == 1:
+        logger.warning("SCHEDULE_TERM=%r is a term name; set it to the term id %r instead", value, named[0])
+        return named[0]
+    if named:
+        raise ValueError(f"SCHEDULE_TERM={value!r} names several terms, set it to one of their ids: {', '.join(named)}")
+    raise ValueError(f"Unknown term SCHEDULE_TERM={value!r}, expected one of: {', '.join(terms)}")
+
+class TermCatalog:
+    """The terms of a deployment, and an LRU of their opened schedule stores (reopened when build_db rewrites one)."""
+
+    def __init__(self, terms, default=None, store_cache_size=TERM_STORE_CACHE_SIZE):
+        if not terms:
+            raise ValueError("The term catalog is empty")
+        if default is not None and default not in terms:
+            raise ValueError(f"Unknown default term {default!r}, expected one of: {', '.join(terms)}")
+        self.terms = terms
+        self.default = default if default is not None else next(iter(terms))
+        self.store_cache_size = store_cache_size
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path=CATALOG_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        if catalog.get("version") != CATALOG_VERSION:
+            raise ValueError(f"{path} has unsupported version {catalog.get('version')}")
+        base_dir = os.path.dirname(os.path.abspath(path))
+        terms = {term_id: Term(term_id, spec, base_dir) for term_id, spec in catalog["terms"].items()}
+        opened = cls(terms, resolve_term_id(terms, os.environ.get("SCHEDULE_TERM")) or catalog.get("default"))
+        if os.environ.get("CALENDAR_NAME"):
+            # Only the default term: two terms syncing into one calendar would delete each other's events
+            opened.get().calendar_name = os.environ["CALENDAR_NAME"]
+        return opened
+
+    def ids(self):
+        return list(self.terms)
+
+    def get(self, term_id=None):
+        term = self.terms.get(term_id or self.default)
+        if term is None:
+            raise KeyError(f"Unknown term {term_id!r}")
+        return term
+
+    def data_mtime(self, term_id=None):
+        """Modification time of a term's build output (0 if it hasn't been built), for cache invalidation."""
+        return self.get(term_id).data_mtime()
+
+    def store(self, term_id=None):
+        """The term's ScheduleStore, opened on first use; at most store_cache_size stay open."""
+        term = self.get(term_id)
+        mtime = self.data_mtime(term.id)
+        with self._lock:
+            cached = self._stores.get(term.id)
+            if cached is not None and cached[0] == mtime:
+                self._stores.move_to_end(term.id)
+                return cached[1]
+        # Evicted stores aren't closed: a rerun may still be slicing one; the memory map goes with the last reference
+        with timed("terms.open_store"):
+            store = open_store(term.store_path, term.index_path, term.csv_path)
+        with self._lock:
+            self._stores[term.id] = (mtime, store)
+            self._stores.move_to_end(term.id)
+            while len(self._stores) > self.store_cache_size:
+                self._stores.popitem(last=False)
+        return store
+
+    def loaded(self):
+        """Ids of the terms whose stores are open, least recently used first."""
+        with self._lock:
+            return list(self._stores)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """The process-wide catalog, read once."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = TermCatalog.open()
+        return _catalog
+
+def set_catalog(catalog):
+    """Swaps the process-wide catalog."""
+    global _catalog
+    with _catalog_lock:
+        _catalog = catalog
+
+def get_term(term_id=None):
+    """A term of the catalog; the default term when term_id is None."""
+    return get_catalog().get(term_id)
@@ -0,0 +1,184 @@
+"""
+In-memory stand-in for the Google Calendar v3 service returned by calendar_sync.get_calendar_service.
+Used by the sync tests and benchmarks/suite.py to exercise the sync code without network access or OAuth.
+Supports the subset of the API calendar_sync uses, batch requests, simulated latency and rate limiting.
+"""
+import json
+import time
+import itertools
+import httplib2
+from googleapiclient.errors import HttpError
+
+def make_http_error(status, reason=None, message="Simulated error"):
+    errors = [{'reason': reason, 'message': message}] if reason else []
+    content = json.dumps({'error': {'code': status, 'message': message, 'errors': errors}}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+class FakeRequest:
+    def __init__(self, service, handler):
+        self._service = service
+        self._handler = handler
+
+    def execute(self):
+        self._service._round_trip()
+        return self._service._run(self._handler)
+
+class FakeBatch:
+    def __init__(self, service, callback=None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self._requests))
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, http=None):
+        # A whole batch costs a single HTTP round trip
+        self._service._round_trip()
+        self._service.batch_calls += 1
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = self._service._run(request._handler), None
+            except HttpError as e:
+                response, exception = None, e
+            if callback is not None:
+                callback(request_id, response, exception)
+
+class _Resource:
+    def __init__(self, service):
+        self._service = service
+
+    def _request(self, handler):
+        return FakeRequest(self._service, handler)
+
+class _CalendarList(_Resource):
+    def list(self, pageToken=None, **kwargs):
+        def handler():
+            items = [{'id': cal_id, 'summary': cal['summary']} for cal_id, cal in self._service.calendars_data.items()]
+            return self._service._page(items, pageToken)
+        return self._request(handler)
+
+class _Calendars(_Resource):
+    def insert(self, body):
+        def handler():
+            cal_id = f"cal{next(self._service._ids)}@group.calendar.google.com"
+            self._service.calendars_data[cal_id] = {'summary': body['summary'], 'timeZone': body.get('timeZone'), 'events': {}}
+            self._service.writes += 1
+            return {'id': cal_id, 'summary': body['summary']}
+        return self._request(handler)
+
+    def get(self, calendarId):
+        def handler():
+            cal = self._service._calendar(calendarId)
+            return {'id': calendarId, 'summary': cal['summary'], 'timeZone': cal.get('timeZone')}
+        return self._request(handler)
+
+class _Events(_Resource):
+    def insert(self, calendarId, body):
+        def handler():
+            events = self._service._calendar(calendarId)['events']
+            event = dict(body, id=f"ev{next(self._service._ids)}")
+            events[event['id']] = event
+            self._service.writes += 1
+            return event
+        return self._request(handler)
+
+    def list(self, calendarId, pageToken=None, **kwargs):
+        def handler():
+            items = list(self._service._calendar(calendarId)['events'].values())
+            return self._service._page(items, pageToken)
+        return self._request(handler)
+
+    def patch(self, calendarId, eventId, body):
+        def handler():
+            events = self._service._calendar(calendarId)['events']
+            if eventId not in events:
+                raise make_http_error(404, 'notFound', "Not Found")
+            events[eventId] = dict(events[eventId], **body)
+            self._service.writes += 1
+            return events[eventId]
+        return self._request(handler)
+
+    def delete(self, calendarId, eventId):
+        def handler():
+            events = self._service._calendar(calendarId)['events']
+            if eventId not in events:
+                raise make_http_error(410, 'deleted', "Resource has been deleted")
+            del events[eventId]
+            # Deleting a recurring event deletes its modified instances too
+            for instance_id in [i for i, event in events.items() if event.get('recurringEventId') == eventId]:
+                del events[instance_id]
+            self._service.writes += 1
+            return ''
+        return self._request(handler)
+
+class FakeCalendarService:
+    """
+    latency: seconds slept per HTTP round trip (one per execute(), batches included).
+    page_size: items per list page (calendarList and events), to exercise pagination.
+    """
+
+    def __init__(self, latency=0.0, page_size=100):
+        self.latency = latency
+        self.page_size = page_size
+        self.calendars_data = {}
+        self.http_calls = 0
+        self.batch_calls = 0
+        self.writes = 0
+        self._throttle = []
+        self._ids = itertools.count(1)
+
+    def edit_instance(self, calendar_id, event_id, **changes):
+        """
+        Simulates the user editing one occurrence of a recurring event: like Google, events.list (without
+        singleEvents) then also returns that occurrence as its own item, with recurringEventId and the master's
+        extendedProperties. Returns the instance's id.
+        """
+        events = self._calendar(calendar_id)['events']
+        master = events[event_id]
+        instance = dict(master, id=f"{event_id}_{master['start']['dateTime'][:10].replace('-', '')}",
+                        recurringEventId=event_id, originalStartTime=master['start'], **changes)
+        instance.pop('recurrence', None)
+        events[instance['id']] = instance
+        return instance['id']
+
+    def throttle(self, count, status=429, reason='rateLimitExceeded'):
+        """Makes the next `count` individual requests fail with a rate-limit error."""
+        self._throttle.extend([(status, reason)] * count)
+
+    def _round_trip(self):
+        self.http_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _run(self, handler):
+        if self._throttle:
+            status, reason = self._throttle.pop(0)
+            raise make_http_error(status, reason, "Rate Limit Exceeded")
+        return handler()
+
+    def _calendar(self, calendar_id):
+        if calendar_id not in self.calendars_data:
+            raise make_http_error(404, 'notFound', "Not Found")
+        return self.calendars_data[calendar_id]
+
+    def _page(self, items, page_token):
+        start = int(page_token or 0)
+        page = {'items': items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            page['nextPageToken'] = str(start + self.page_size)
+        return page
+
+    def calendarList(self):
+        return _CalendarList(self)
+
+    def calendars(self):
+        return _Calendars(self)
+
+    def events(self):
+        return _Events(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
@@ -0,0 +1,13 @@
+"""The web app's cold start: heavy libraries stay unloaded until a sync or a PDF parse needs them."""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from bench_import import LAZY_MODULES
+
+def test_app_import_leaves_lazy_modules_unloaded():
+    script = f"import sys, app; print(' '.join(name for name in {LAZY_MODULES!r} if name in sys.modules))"
+    loaded = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    assert loaded.split() == []
@@ -0,0 +1,50 @@
+"""Ingestion: one record path for every caller, streamed into the store with failed PDFs dropped whole."""
+import os
+import shutil
+import pdfplumber
+import pandas as pd
+import pytest
+import build_db
+import extractor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "schedules", "Schedule_1 course M_3 trim.pdf")
+PAGES = range(10)
+
+def test_records_match_the_row_by_row_parser():
+    expected = []
+    with pdfplumber.open(PDF) as pdf:
+        for page_number in PAGES:
+            raw = extractor.read_page_checked(pdf.pages[page_number])[0]
+            if raw is not None:
+                expected += extractor.rows_from_table(*raw)
+    records = list(extractor.iter_schedule_records(PDF, page_numbers=PAGES))
+    assert [record._asdict() for record in records] == expected
+    assert extractor.extract_pages(PDF, PAGES)[0] == expected
+
+@pytest.fixture
+def schedules(tmp_path):
+    schedules_dir = tmp_path / "schedules"
+    schedules_dir.mkdir()
+    for name in ("A.pdf", "B.pdf"):
+        shutil.copy(PDF, schedules_dir / name)
+    return schedules_dir
+
+def test_a_file_failing_halfway_is_dropped_whole(schedules, tmp_path, monkeypatch):
+    parse = build_db.extract_pages
+
+    def failing(pdf_path, pages, cache_dir=None):
+        if pdf_path.endswith("B.pdf") and build_db.PAGES_PER_TASK in pages:
+            raise RuntimeError("broken page")
+        return parse(pdf_path, pages, cache_dir)
+
+    monkeypatch.setattr(build_db, "extract_pages", failing)
+    output_csv = tmp_path / "out" / "database.csv"
+    build_db.build_database(str(schedules), str(output_csv), workers=1, ics_dir="")
+
+    database = pd.read_csv(output_csv, dtype=str, keep_default_na=False)
+    assert set(database['Program']) == {"A"}
+    assert len(database) == len(extractor.extract_schedule(PDF))
+    assert sorted(os.listdir(output_csv.parent)) == sorted(
+        ["database.csv", "database.arrow", "database_index.json", "database_manifest.json", "database_clashes.json",
+         "database_occupancy.json", "database_search.json", "page_cache"])
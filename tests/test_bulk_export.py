@@ -0,0 +1,87 @@
+"""Bulk export into a directory or a zip archive, including re-exports over an older export."""
+import os
+import zipfile
+import pandas as pd
+import pytest
+import terms
+from bulk_export import export_all
+from schedule_store import COLUMNS, write_store
+from terms import Term, TermCatalog
+
+def row(program, group, day="Monday", time="09:00-09:50", discipline="Calculus"):
+    return {'Group': group, 'Day': day, 'Time': time, 'Discipline': discipline, 'Classroom': "C1.1.101",
+            'Type': "lecture", 'Lecturer': "Lecturer A", 'Program': program}
+
+ROWS = [row("P1", "G-1"), row("P1", "G-2", discipline="Physics"), row("P2", "H-1", day="Friday")]
+
+@pytest.fixture
+def term(tmp_path):
+    data_dir = tmp_path / "term"
+    data_dir.mkdir()
+    term = Term("test", {'name': "Test term", 'start': "2026-03-09", 'end': "2026-05-17", 'data_dir': str(data_dir)})
+    previous = terms._catalog
+    terms.set_catalog(TermCatalog({"test": term}))
+    yield term
+    terms.set_catalog(previous)
+
+def build(term, rows, mtime):
+    write_store(pd.DataFrame(rows, columns=COLUMNS), term.store_path, term.index_path)
+    # The catalog reopens a store when its mtime changes, which is only kept to the second
+    os.utime(term.store_path, (mtime, mtime))
+
+def listing(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory) for root, _, names in os.walk(directory) for name in names)
+
+def test_export_into_a_missing_directory(term, tmp_path):
+    build(term, ROWS, 1767225600)
+    output = tmp_path / "exports" / "nested"
+    summary = export_all(str(output), workers=1)
+    assert listing(output) == [os.path.join("P1", "G-1.ics"), os.path.join("P1", "G-2.ics"), os.path.join("P2", "H-1.ics")]
+    assert (summary["groups"], summary["events"], summary["removed"]) == (3, 3, 0)
+    assert (output / "P1" / "G-2.ics").read_text(encoding="utf-8").count("SUMMARY:Physics") == 1
+
+def test_re_export_leaves_unchanged_files_and_removes_stale_ones(term, tmp_path):
+    build(term, ROWS, 1767225600)
+    output = tmp_path / "exports"
+    export_all(str(output), workers=1)
+    (output / "notes.txt").write_text("not an export")
+    assert export_all(str(output), workers=1)["unchanged"] == 3
+
+    # G-2 and the whole of P2 are gone from the new build
+    build(term, ROWS[:1], 1767229200)
+    summary = export_all(str(output), workers=1)
+    assert listing(output) == [os.path.join("P1", "G-1.ics"), "notes.txt"]
+    assert summary["removed"] == 2
+
+def test_re_export_of_one_program_keeps_the_others(term, tmp_path):
+    build(term, ROWS, 1767225600)
+    output = tmp_path / "exports"
+    export_all(str(output), workers=1)
+    build(term, ROWS[1:], 1767229200)
+    summary = export_all(str(output), programs=["P1"], workers=1)
+    assert listing(output) == [os.path.join("P1", "G-2.ics"), os.path.join("P2", "H-1.ics")]
+    assert summary["removed"] == 1
+
+def test_export_into_a_zip_in_a_missing_directory(term, tmp_path):
+    build(term, ROWS, 1767225600)
+    archive = tmp_path / "exports" / "all.zip"
+    export_all(str(archive), workers=1)
+    with zipfile.ZipFile(archive) as zf:
+        assert sorted(zf.namelist()) == ["P1/G-1.ics", "P1/G-2.ics", "P2/H-1.ics"]
+        assert zf.read("P2/H-1.ics").startswith(b"BEGIN:VCALENDAR")
+    assert listing(archive.parent) == ["all.zip"]
+
+def test_zip_re_export_replaces_the_archive(term, tmp_path):
+    build(term, ROWS, 1767225600)
+    archive = tmp_path / "all.zip"
+    export_all(str(archive), workers=1)
+    build(term, ROWS[:1], 1767229200)
+    export_all(str(archive), workers=1)
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.namelist() == ["P1/G-1.ics"]
+
+def test_unknown_program_writes_nothing(term, tmp_path):
+    build(term, ROWS, 1767225600)
+    with pytest.raises(ValueError, match="P3"):
+        export_all(str(tmp_path / "exports"), programs=["P3"], workers=1)
+    assert not (tmp_path / "exports").exists()
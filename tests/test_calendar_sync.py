@@ -0,0 +1,189 @@
+"""Calendar writes against the in-memory fake_calendar service: batching, rate-limit retries, diff-based re-syncs
+and the per-account calendar id cache."""
+import os
+import pytest
+import calendar_sync
+from fake_calendar import FakeCalendarService, make_http_error
+from calendar_sync import (discipline_color, execute_batched, get_or_create_calendar, insert_schedule_events_batched,
+                           is_rate_limited, sync_plan, sync_schedule_events)
+
+def make_events(count, group="TST-2501"):
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    # Two hours apart, so merge_consecutive_slots keeps every event separate
+    return [{'Group': group, 'Day': days[i % 5], 'Time': f"{8 + 2 * (i // 5):02d}:00-{8 + 2 * (i // 5):02d}:50",
+             'Discipline': f"Discipline {i}", 'Classroom': f"C1.{i}", 'Type': 'lecture', 'Lecturer': f"Lecturer {i}"}
+            for i in range(count)]
+
+@pytest.fixture
+def service():
+    return FakeCalendarService(page_size=20)
+
+@pytest.fixture
+def calendar_id(service):
+    return get_or_create_calendar(service, name="Test Schedule")
+
+def insert_requests(service, calendar_id, count):
+    events = service.events()
+    return [(i, events.insert(calendarId=calendar_id, body={'summary': f"Event {i}"})) for i in range(count)]
+
+def test_batched_insert_creates_every_event(service, calendar_id):
+    calls = service.http_calls
+    results = insert_schedule_events_batched(service, calendar_id, make_events(60), chunk_size=25)
+
+    assert [r['status'] for r in results] == ['created'] * 60
+    assert len({r['id'] for r in results}) == 60
+    assert len(service.calendars_data[calendar_id]['events']) == 60
+    # 60 events in chunks of 25: three batch round trips instead of 60 single requests
+    assert service.http_calls - calls == 3
+    assert service.batch_calls == 3
+
+def test_rate_limited_requests_are_retried_with_backoff(service, calendar_id):
+    delays = []
+    service.throttle(4)
+    service.throttle(2, status=403, reason='userRateLimitExceeded')
+    results = execute_batched(service, insert_requests(service, calendar_id, 10), chunk_size=10, base_delay=0.5,
+                              sleep=delays.append)
+
+    assert all(error is None for _, error in results.values())
+    assert len(service.calendars_data[calendar_id]['events']) == 10
+    # The six throttled requests go again in one later batch, after one backoff of base_delay plus jitter
+    assert service.batch_calls == 2
+    assert len(delays) == 1 and 0.5 <= delays[0] <= 1.0
+
+def test_requests_fail_once_retries_run_out(service, calendar_id):
+    delays = []
+    service.throttle(100)
+    results = execute_batched(service, insert_requests(service, calendar_id, 3), max_retries=2, base_delay=1.0,
+                              sleep=delays.append)
+
+    assert sorted(results) == [0, 1, 2]
+    assert all(response is None and is_rate_limited(error) for response, error in results.values())
+    assert service.calendars_data[calendar_id]['events'] == {}
+    # One try plus two retries, the backoff doubling between them
+    assert service.batch_calls == 3
+    assert len(delays) == 2 and 1.0 <= delays[0] <= 2.0 and 2.0 <= delays[1] <= 3.0
+
+def test_other_errors_are_not_retried(service, calendar_id):
+    delays = []
+    service.throttle(1, status=403, reason='forbidden')
+    results = execute_batched(service, insert_requests(service, calendar_id, 2), sleep=delays.append)
+
+    assert results[0][1].status_code == 403 and results[1][1] is None
+    assert delays == []
+
+def test_failed_inserts_are_reported_per_event(service, calendar_id):
+    service.throttle(2)
+    results = insert_schedule_events_batched(service, calendar_id, make_events(5), max_retries=0)
+
+    assert [r['status'] for r in results] == ['failed', 'failed', 'created', 'created', 'created']
+    assert results[0]['id'] is None and "Rate Limit Exceeded" in results[0]['error']
+
+def test_is_rate_limited():
+    assert is_rate_limited(make_http_error(429))
+    assert is_rate_limited(make_http_error(403, 'quotaExceeded'))
+    assert not is_rate_limited(make_http_error(403, 'forbidden'))
+    assert not is_rate_limited(make_http_error(500, 'backendError'))
+    assert not is_rate_limited(ValueError("not an HTTP error"))
+
+def test_resync_only_writes_what_changed(service, calendar_id):
+    events = make_events(12)
+    first = sync_schedule_events(service, calendar_id, events)
+    assert (first['inserted'], first['updated'], first['deleted'], first['failed']) == (12, 0, 0, [])
+
+    writes = service.writes
+    again = sync_schedule_events(service, calendar_id, events)
+    assert (again['inserted'], again['updated'], again['deleted'], again['unchanged']) == (0, 0, 0, 12)
+    assert service.writes == writes
+
+    changed = [dict(ev, Classroom="C9.999") if i == 3 else ev for i, ev in enumerate(events)]
+    progress = []
+    third = sync_schedule_events(service, calendar_id, changed, progress=lambda done, total: progress.append((done, total)))
+    assert (third['inserted'], third['updated'], third['deleted'], third['unchanged']) == (0, 1, 0, 11)
+    assert progress[-1] == (12, 12)
+    assert len(service.calendars_data[calendar_id]['events']) == 12
+
+def test_dropping_a_discipline_does_not_repaint_the_others(service, calendar_id):
+    events = make_events(12)
+    sync_schedule_events(service, calendar_id, events)
+    summary = sync_schedule_events(service, calendar_id, events[1:])
+    assert (summary['inserted'], summary['updated'], summary['deleted'], summary['unchanged']) == (0, 0, 1, 11)
+
+def test_edited_instances_of_a_weekly_event_are_left_alone(service, calendar_id):
+    events = make_events(3)
+    sync_schedule_events(service, calendar_id, events)
+    stored = service.calendars_data[calendar_id]['events']
+    master_id = next(event_id for event_id, event in stored.items() if event['summary'] == "Discipline 1")
+    instance_id = service.edit_instance(calendar_id, master_id, location="Moved to C5.5")
+
+    again = sync_schedule_events(service, calendar_id, events)
+    assert (again['inserted'], again['updated'], again['deleted'], again['unchanged']) == (0, 0, 0, 3)
+    assert stored[instance_id]['location'] == "Moved to C5.5"
+
+    # A change to the class patches the series master, never the edited instance
+    changed = [dict(ev, Classroom="C9.999") if i == 1 else ev for i, ev in enumerate(events)]
+    third = sync_schedule_events(service, calendar_id, changed)
+    assert (third['inserted'], third['updated'], third['deleted']) == (0, 1, 0)
+    assert "C9.999" in stored[master_id]['location'] and stored[instance_id]['location'] == "Moved to C5.5"
+
+    # Dropping the class deletes the series, and with it the edited instance
+    dropped = sync_schedule_events(service, calendar_id, [events[0], events[2]])
+    assert (dropped['deleted'], dropped['failed']) == (1, [])
+    assert master_id not in stored and instance_id not in stored
+
+def test_colors_depend_on_the_discipline_only():
+    events = make_events(12)
+    colors = {body['summary']: body['colorId'] for body in sync_plan(events)}
+    assert colors == {body['summary']: body['colorId'] for body in sync_plan(events[5:] + events[:5])}
+    assert all(colors[ev['Discipline']] == discipline_color(ev['Discipline']) for ev in events)
+    assert len(set(colors.values())) > 1
+
+@pytest.fixture
+def calendar_ids():
+    calendar_sync._calendar_ids.clear()
+    yield calendar_sync._calendar_ids
+    calendar_sync._calendar_ids.clear()
+
+def test_cached_calendar_id_costs_one_round_trip(calendar_ids):
+    service = FakeCalendarService(page_size=2)
+    for i in range(5):
+        get_or_create_calendar(service, name=f"Other {i}")
+    calendar_id = get_or_create_calendar(service, name="Test Schedule", account="user-a")
+
+    calls = service.http_calls
+    assert get_or_create_calendar(service, name="Test Schedule", account="user-a") == calendar_id
+    assert service.http_calls - calls == 1
+
+def test_deleted_calendar_is_looked_up_again(calendar_ids):
+    service = FakeCalendarService()
+    calendar_id = get_or_create_calendar(service, name="Test Schedule", account="user-a")
+    del service.calendars_data[calendar_id]
+
+    recreated = get_or_create_calendar(service, name="Test Schedule", account="user-a")
+    assert recreated != calendar_id and recreated in service.calendars_data
+    assert calendar_ids[("user-a", "Test Schedule")] == recreated
+
+def test_calendar_ids_are_cached_per_account(calendar_ids):
+    service_a, service_b = FakeCalendarService(), FakeCalendarService()
+    get_or_create_calendar(service_b, name="Other")
+    id_a = get_or_create_calendar(service_a, name="Test Schedule", account="user-a")
+
+    calls = service_b.http_calls
+    id_b = get_or_create_calendar(service_b, name="Test Schedule", account="user-b")
+    # Nothing cached for user-b yet: a full lookup (list, then create), not a check of user-a's id
+    assert id_b != id_a and service_b.http_calls - calls == 2
+    assert set(calendar_ids) == {("user-a", "Test Schedule"), ("user-b", "Test Schedule")}
+    assert get_or_create_calendar(service_a, name="Test Schedule", account="user-a") == id_a
+    assert get_or_create_calendar(service_b, name="Test Schedule", account="user-b") == id_b
+
+def test_token_scope_is_only_relaxed_during_an_exchange(monkeypatch):
+    monkeypatch.delenv("OAUTHLIB_RELAX_TOKEN_SCOPE", raising=False)
+    with calendar_sync._relaxed_token_scope():
+        with calendar_sync._relaxed_token_scope():
+            assert os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] == "1"
+        assert os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] == "1"
+    assert "OAUTHLIB_RELAX_TOKEN_SCOPE" not in os.environ
+
+    monkeypatch.setenv("OAUTHLIB_RELAX_TOKEN_SCOPE", "0")
+    with calendar_sync._relaxed_token_scope():
+        assert os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] == "1"
+    assert os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] == "0"
@@ -0,0 +1,48 @@
+"""Clash index: which slots of a group overlap, and which pairs of a selection clash."""
+from clash_index import build_group_overlaps, find_clashes
+
+def ev(day, time, discipline, group="G-1", program="P1", classroom="C1"):
+    return {'Program': program, 'Group': group, 'Day': day, 'Time': time, 'Discipline': discipline,
+            'Classroom': classroom, 'Type': "lecture", 'Lecturer': "Lecturer A"}
+
+def pairs(clashes):
+    return sorted(tuple(sorted((a['Discipline'], b['Discipline']))) for a, b in clashes)
+
+def test_overlapping_slots_are_indexed_both_ways():
+    overlaps = build_group_overlaps([ev("Monday", "09:00-10:20", "Calculus"), ev("Monday", "10:00-10:50", "Physics"),
+                                     ev("Monday", "11:00-11:50", "History"), ev("Tuesday", "09:30-10:00", "Art")])
+    assert overlaps == {"Monday|09:00-10:20": ["Monday|10:00-10:50"], "Monday|10:00-10:50": ["Monday|09:00-10:20"]}
+
+def test_touching_slots_do_not_overlap():
+    events = [ev("Monday", "09:00-09:50", "Calculus"), ev("Monday", "09:50-10:40", "Physics")]
+    assert build_group_overlaps(events) == {}
+    assert find_clashes(events, {}) == []
+
+def test_electives_in_one_slot_overlap_themselves():
+    events = [ev("Monday", "09:00-09:50", "Elective A"), ev("Monday", "09:00-09:50", "Elective B")]
+    assert build_group_overlaps(events) == {"Monday|09:00-09:50": ["Monday|09:00-09:50"]}
+    assert pairs(find_clashes(events, {})) == [("Elective A", "Elective B")]
+
+def test_same_discipline_in_two_rooms_is_not_a_clash():
+    events = [ev("Monday", "09:00-09:50", "Calculus", classroom="C1"), ev("Monday", "09:00-09:50", "Calculus", classroom="C2")]
+    assert find_clashes(events, {}) == []
+
+def test_unparseable_times_only_clash_with_their_own_slot():
+    events = [ev("Monday", "TBA", "Elective A"), ev("Monday", "TBA", "Elective B"), ev("Monday", "09:00-09:50", "Calculus")]
+    assert build_group_overlaps(events) == {"Monday|TBA": ["Monday|TBA"]}
+    assert pairs(find_clashes(events, {})) == [("Elective A", "Elective B")]
+
+def test_selection_is_checked_against_the_prebuilt_index():
+    group = [ev("Monday", "09:00-10:20", "Calculus"), ev("Monday", "10:00-10:50", "Physics"), ev("Monday", "11:00-11:50", "History")]
+    index = {"P1": {"G-1": build_group_overlaps(group)}}
+    assert pairs(find_clashes(group, index)) == [("Calculus", "Physics")]
+    assert find_clashes([group[0], group[2]], index) == []
+    # The index is trusted over the selection's own times
+    assert find_clashes(group, {"P1": {"G-1": {}}}) == []
+
+def test_cross_group_clashes_in_a_selection():
+    selection = [ev("Monday", "09:00-09:50", "Calculus", group="G-1"), ev("Monday", "09:30-10:20", "Physics", group="G-2"),
+                 ev("Monday", "09:50-10:40", "History", group="G-1"), ev("Monday", "09:00-09:50", "Calculus", group="G-2", program="P2")]
+    index = {"P1": {"G-1": {}, "G-2": {}}}
+    # Calculus is taught to both groups at 09:00: the same discipline, so not a clash
+    assert pairs(find_clashes(selection, index)) == [("Calculus", "Physics"), ("Calculus", "Physics"), ("History", "Physics")]
@@ -0,0 +1,94 @@
+"""Page reading: the table sanity check, the word-position fallback and the per-page result cache."""
+import os
+import pdfplumber
+import pypdfium2 as pdfium
+import pytest
+import extractor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, "schedules", "Schedule_1 course M_3 trim.pdf")
+PAGE = 1
+
+def drop_last_rows(table):
+    return table[:-2]
+
+def merge_two_rows(table):
+    merged = [f"{a or ''}\n{b or ''}".strip() for a, b in zip(table[1], table[2])]
+    return [table[0], merged] + table[3:]
+
+def split_a_row(table):
+    return [table[0], table[1][:3], table[1][3:]] + table[2:]
+
+@pytest.fixture(scope="module")
+def page_rows():
+    with pdfplumber.open(PDF) as pdf:
+        raw = extractor.read_page_table(pdf.pages[PAGE])
+    return raw, extractor.rows_from_table(*raw)
+
+def test_a_whole_table_has_no_problems():
+    with pdfplumber.open(PDF) as pdf:
+        page = pdf.pages[PAGE]
+        assert extractor.table_problems(page, extractor.read_page_table(page)) == []
+
+@pytest.mark.parametrize("damage", [drop_last_rows, merge_two_rows, split_a_row])
+def test_words_engine_recovers_a_damaged_table(damage, page_rows, monkeypatch):
+    (group_name, table), expected = page_rows
+    read = extractor.read_page_table
+    monkeypatch.setattr(extractor, "read_page_table",
+                        lambda page: (group_name, damage([list(row) for row in table])))
+    with pdfplumber.open(PDF) as pdf:
+        page = pdf.pages[PAGE]
+        assert extractor.table_problems(page, extractor.read_page_table(page))
+        raw, engine, problems = extractor.read_page_checked(page)
+        assert engine == "words" and problems
+        assert extractor.rows_from_table(*raw) == expected
+        assert read(page) == (group_name, table)
+
+def test_missing_table_on_a_page_with_time_slots_falls_back(page_rows, monkeypatch):
+    monkeypatch.setattr(extractor, "read_page_table", lambda page: None)
+    with pdfplumber.open(PDF) as pdf:
+        raw, engine, problems = extractor.read_page_checked(pdf.pages[PAGE])
+    assert engine == "words"
+    assert problems[0].startswith("no table found")
+    assert extractor.rows_from_table(*raw) == page_rows[1]
+
+def reissue(path, changed_page=None):
+    """Copies the first three pages of PDF to path; changed_page gets a small image drawn on it."""
+    source = pdfium.PdfDocument(PDF)
+    doc = pdfium.PdfDocument.new()
+    doc.import_pages(source, [0, 1, 2])
+    if changed_page is not None:
+        page = doc[changed_page]
+        image = pdfium.PdfImage.new(doc)
+        image.set_bitmap(pdfium.PdfBitmap.new_native(2, 2, pdfium.raw.FPDFBitmap_BGR))
+        image.set_matrix(pdfium.PdfMatrix().scale(2, 2).translate(1, 1))
+        page.insert_obj(image)
+        page.gen_content()
+    doc.save(str(path))
+    return str(path)
+
+def test_page_cache_hits_unchanged_pages_only(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    first = reissue(tmp_path / "first.pdf")
+    rows, _, notes = extractor.extract_pages(first, range(3), cache_dir=cache_dir)
+    assert [note["cached"] for note in notes] == [False, False, False]
+
+    # A second run reads every page from the cache, without parsing anything
+    parse = extractor.read_page_checked
+    monkeypatch.setattr(extractor, "read_page_checked", lambda page: pytest.fail("page parsed again"))
+    cached_rows, _, cached_notes = extractor.extract_pages(first, range(3), cache_dir=cache_dir)
+    assert [note["cached"] for note in cached_notes] == [True, True, True]
+    assert cached_rows == rows
+
+    # Re-issued with one page changed: only that page is parsed again
+    monkeypatch.setattr(extractor, "read_page_checked", parse)
+    _, _, reissued_notes = extractor.extract_pages(reissue(tmp_path / "second.pdf", changed_page=1), range(3), cache_dir=cache_dir)
+    assert [note["cached"] for note in reissued_notes] == [True, False, True]
+    assert reissued_notes[1]["key"] != notes[1]["key"]
+
+def test_prune_keeps_only_the_given_pages(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    _, _, notes = extractor.extract_pages(reissue(tmp_path / "first.pdf"), range(3), cache_dir=cache_dir)
+    assert extractor.prune_page_cache(cache_dir, {notes[0]["key"]}) == 2
+    assert extractor.load_cached_page(cache_dir, notes[0]["key"]) is not None
+    assert extractor.load_cached_page(cache_dir, notes[1]["key"]) is None
@@ -0,0 +1,72 @@
+"""The feed server over real HTTP on a loopback port, against the bundled schedule."""
+import socket
+import threading
+import http.client
+import urllib.parse
+import pytest
+import feed_server
+from terms import get_catalog
+
+@pytest.fixture(scope="module")
+def server():
+    server = feed_server.make_server("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def raw_request(server, method, path):
+    """The complete raw response, so a body sent where none belongs shows up."""
+    with socket.create_connection(server.server_address[:2]) as sock:
+        sock.sendall(f"{method} {path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    return head.decode('latin-1'), body
+
+def first_group():
+    store = get_catalog().store()
+    program = store.programs()[0]
+    return program, store.groups(program)[0]
+
+@pytest.mark.parametrize("path", ["/nothing-here", "/feeds/nope/nope.ics", "/feeds/a/b.ics?term=unknown-term"])
+def test_head_errors_have_no_body(server, path):
+    head, body = raw_request(server, "HEAD", path)
+    assert head.startswith("HTTP/1.0 404") and "Content-Length: " in head
+    assert body == b""
+    head, body = raw_request(server, "GET", path)
+    assert head.startswith("HTTP/1.0 404") and body
+
+def test_feed_and_conditional_get(server):
+    program, group = first_group()
+    path = f"/feeds/{urllib.parse.quote(program)}/{urllib.parse.quote(group)}.ics"
+    conn = http.client.HTTPConnection(*server.server_address[:2])
+    conn.request("GET", path)
+    response = conn.getresponse()
+    body = response.read()
+    assert response.status == 200 and body.startswith(b"BEGIN:VCALENDAR")
+    etag = response.getheader("ETag")
+
+    conn.request("GET", path, headers={"If-None-Match": etag})
+    response = conn.getresponse()
+    assert response.status == 304 and response.read() == b""
+
+    head, body = raw_request(server, "HEAD", path)
+    assert head.startswith("HTTP/1.0 200") and body == b""
+
+def test_metrics_are_off_unless_asked_for(server):
+    head, _ = raw_request(server, "GET", "/metrics")
+    assert head.startswith("HTTP/1.0 404")
+
+    with_metrics = feed_server.make_server("127.0.0.1", 0, serve_metrics=True)
+    threading.Thread(target=with_metrics.serve_forever, daemon=True).start()
+    try:
+        head, body = raw_request(with_metrics, "GET", "/metrics")
+        assert head.startswith("HTTP/1.0 200") and b"schedule_span_duration_seconds" in body
+    finally:
+        with_metrics.shutdown()
+        with_metrics.server_close()
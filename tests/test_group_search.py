@@ -0,0 +1,81 @@
+"""Group search: exact, prefix, misspelt and multi-word queries, and the order results come in."""
+import pandas as pd
+import pytest
+from group_search import GroupSearchIndex, load_search_index, write_search_index
+from schedule_store import COLUMNS, ScheduleStore
+
+def row(program, group, discipline, lecturer):
+    return {'Program': program, 'Group': group, 'Day': "Monday", 'Time': "09:00-09:50", 'Discipline': discipline,
+            'Classroom': "C1.101", 'Type': "lecture", 'Lecturer': lecturer}
+
+ROWS = [
+    row("Masters", "AAI-2501M", "Machine Learning", "Akhmetova Zhanar"),
+    row("Masters", "AAI-2502M", "Deep Learning", "Bekov Arman"),
+    row("Bachelors", "SE-2501", "Software Engineering", "Akhmetova Zhanar"),
+    row("Bachelors", "SE-2502", "Linear Algebra", "Serikov Daulet"),
+    row("Bachelors", "AI-2501", "Machine Learning", "https://lms.example/online"),
+]
+
+@pytest.fixture
+def store():
+    return ScheduleStore.from_frame(pd.DataFrame(ROWS, columns=COLUMNS))
+
+@pytest.fixture
+def index(store):
+    return GroupSearchIndex.from_store(store)
+
+def found(results):
+    return [(r['group'], r['kind'], r['match']) for r in results]
+
+def test_exact_group_code(index):
+    assert found(index.search("SE-2502")) == [("SE-2502", "group", "SE-2502")]
+
+def test_group_code_prefix_in_any_spelling(index):
+    expected = [("AAI-2501M", "group", "AAI-2501M"), ("AAI-2502M", "group", "AAI-2502M")]
+    assert found(index.search("AAI-25")) == expected
+    assert found(index.search("aai 25")) == expected
+    assert found(index.search("aai25")) == expected
+
+def test_discipline_prefix_lists_every_group(index):
+    assert found(index.search("machine")) == [("AAI-2501M", "discipline", "Machine Learning"),
+                                              ("AI-2501", "discipline", "Machine Learning")]
+
+def test_lecturer_by_surname(index):
+    assert found(index.search("akhmetova")) == [("AAI-2501M", "lecturer", "Akhmetova Zhanar"),
+                                                ("SE-2501", "lecturer", "Akhmetova Zhanar")]
+    # Links in the lecturer column are not lecturers
+    assert index.search("lms") == []
+
+def test_multi_word_query_needs_every_word(index):
+    assert found(index.search("learning deep")) == [("AAI-2502M", "discipline", "Deep Learning")]
+    assert found(index.search("zhanar akhm")) == [("AAI-2501M", "lecturer", "Akhmetova Zhanar"),
+                                                  ("SE-2501", "lecturer", "Akhmetova Zhanar")]
+    assert index.search("deep algebra") == []
+
+def test_misspelt_words_match_by_spelling(index):
+    assert found(index.search("algebre")) == [("SE-2502", "discipline", "Linear Algebra")]
+    assert found(index.search("akhmetva")) == [("AAI-2501M", "lecturer", "Akhmetova Zhanar"),
+                                               ("SE-2501", "lecturer", "Akhmetova Zhanar")]
+    assert found(index.search("lineer algebra")) == [("SE-2502", "discipline", "Linear Algebra")]
+    assert index.search("xyzzy") == []
+
+def test_group_codes_rank_before_disciplines_before_lecturers():
+    rows = ROWS + [row("Bachelors", "DL-2501", "Dlang Basics", "Deepak Learner")]
+    index = GroupSearchIndex.from_store(ScheduleStore.from_frame(pd.DataFrame(rows, columns=COLUMNS)))
+    # DL-2501 matches as a group code first, so its discipline and lecturer don't list it again
+    assert found(index.search("d")) == [("DL-2501", "group", "DL-2501"), ("AAI-2502M", "discipline", "Deep Learning"),
+                                        ("SE-2502", "lecturer", "Serikov Daulet")]
+    assert found(index.search("deep")) == [("AAI-2502M", "discipline", "Deep Learning"), ("DL-2501", "lecturer", "Deepak Learner")]
+
+def test_each_group_is_listed_once_up_to_the_limit(index):
+    results = index.search("2501")
+    assert len({r['group'] for r in results}) == len(results)
+    assert len(index.search("2", limit=2)) == 2
+    assert index.search("  ") == []
+
+def test_written_index_searches_the_same(store, index, tmp_path):
+    path = str(tmp_path / "search.json")
+    write_search_index(store, path)
+    for query in ("AAI-25", "machine", "akhmetva", "learning deep"):
+        assert load_search_index(path).search(query) == index.search(query)
+    assert load_search_index(str(tmp_path / "missing.json"), store).search("SE") == index.search("SE")
@@ -0,0 +1,48 @@
+"""ICS rendering: stable bytes per build and DTSTAMPs that only move forward."""
+import os
+import re
+import pytest
+from terms import Term
+from ics_exporter import generate_ics_string, render_ics_string, ics_etag
+
+EVENTS = [
+    {'Group': "TST-2501", 'Day': "Monday", 'Time': "09:00-09:50", 'Discipline': "Calculus", 'Classroom': "C1.1.101",
+     'Type': "lecture", 'Lecturer': "Lecturer A"},
+    {'Group': "TST-2501", 'Day': "Wednesday", 'Time': "14:00-14:50", 'Discipline': "Physics", 'Classroom': "C1.2.202",
+     'Type': "practice", 'Lecturer': "Lecturer B"},
+]
+
+@pytest.fixture
+def term(tmp_path):
+    (tmp_path / "database.csv").write_text("Group,Day,Time,Discipline,Classroom,Type,Lecturer,Program\n")
+    os.utime(tmp_path / "database.csv", (1767225600, 1767225600))  # 2026-01-01T00:00:00Z
+    return Term("test", {'name': "Test term", 'start': "2026-03-09", 'end': "2026-05-17", 'data_dir': str(tmp_path)})
+
+def dtstamps(ics):
+    return re.findall(r'^DTSTAMP:(\S+)', ics, re.MULTILINE)
+
+def test_every_event_is_stamped_with_the_build_time(term):
+    ics = render_ics_string(EVENTS, term=term)
+    assert dtstamps(ics) == ["20260101T000000Z", "20260101T000000Z"]
+    assert render_ics_string(EVENTS, term=term) == ics
+
+def test_a_rebuild_moves_dtstamp_forward(term):
+    before = generate_ics_string(EVENTS, term=term)
+    etag = ics_etag(EVENTS, term=term)
+    os.utime(term.csv_path, (1767312000, 1767312000))  # a day later
+    edited = [dict(EVENTS[0], Classroom="C1.3.303"), EVENTS[1]]
+    after = generate_ics_string(edited, term=term)
+
+    assert dtstamps(after) == ["20260102T000000Z", "20260102T000000Z"]
+    assert min(dtstamps(after)) > max(dtstamps(before))
+    assert ics_etag(EVENTS, term=term) != etag
+
+def test_explicit_build_time(term):
+    assert dtstamps(render_ics_string(EVENTS[:1], term=term, built_at=1767398400)) == ["20260103T000000Z"]
+
+def test_etag_only_depends_on_rendered_fields(term):
+    etag = ics_etag(EVENTS, term=term)
+    assert ics_etag([dict(ev, Program="P1") for ev in EVENTS], term=term) == etag
+    assert ics_etag([dict(EVENTS[0], Lecturer="Lecturer C"), EVENTS[1]], term=term) != etag
+    assert ics_etag(EVENTS[::-1], term=term) != etag
+    assert ics_etag(EVENTS, merge=False, term=term) != etag
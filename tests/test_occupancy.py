@@ -0,0 +1,85 @@
+"""Occupancy queries over a small timetable: free rooms, where a lecturer is, and double bookings."""
+import datetime
+import pandas as pd
+import pytest
+from occupancy import OccupancyIndex, load_occupancy_index, parse_when, write_occupancy_index
+from schedule_store import COLUMNS, ScheduleStore
+
+def row(group, day, time, discipline, room, lecturer, type_="lecture"):
+    return {'Program': "P1", 'Group': group, 'Day': day, 'Time': time, 'Discipline': discipline, 'Classroom': room,
+            'Type': type_, 'Lecturer': lecturer}
+
+ROWS = [
+    # A lecture streamed to two groups: one booking, not a double booking
+    row("G-1", "Monday", "09:00-09:50", "Calculus", "C1.101", "Akhmetova A."),
+    row("G-2", "Monday", "09:00-09:50", "Calculus", "C1.101", "Akhmetova A."),
+    row("G-1", "Monday", "10:00-10:50", "Physics", "C1.102", "Bekov B."),
+    row("G-2", "Monday", "10:00-10:50", "History", "C1.103", "Akhmetova A.", "practice"),
+    # Room C1.102 hosts two different classes at once
+    row("G-3", "Monday", "10:30-11:20", "Art", "C1.102", "Serikova S."),
+    row("G-3", "Tuesday", "09:00-09:50", "Art", "online", "Serikova S."),
+    row("G-3", "Tuesday", "TBA", "Art", "C1.104", "Serikova S."),
+]
+
+@pytest.fixture
+def index():
+    return OccupancyIndex.from_store(ScheduleStore.from_frame(pd.DataFrame(ROWS, columns=COLUMNS)))
+
+def test_free_rooms(index):
+    assert index.rooms() == ["C1.101", "C1.102", "C1.103"]
+    assert index.free_rooms("Monday", 9 * 60 + 30) == ["C1.102", "C1.103"]
+    # C1.103 is free from 09:00 but not for the whole two hours
+    assert index.free_rooms("Monday", 9 * 60, 11 * 60) == []
+    # Bookings end when the next one may start
+    assert index.free_rooms("Monday", 9 * 60 + 50, 10 * 60) == ["C1.101", "C1.102", "C1.103"]
+    assert index.free_rooms("Tuesday", 9 * 60) == ["C1.101", "C1.102", "C1.103"]
+
+def test_where_is(index):
+    [booking] = index.where_is("Akhmetova A.", "Monday", 9 * 60 + 10)
+    assert booking == {'day': "Monday", 'time': "09:00-09:50", 'discipline': "Calculus", 'type': "lecture",
+                       'room': "C1.101", 'groups': ["G-1", "G-2"]}
+    assert index.where_is("Akhmetova A.", "Monday", 9 * 60 + 55) == []
+    assert index.where_is("Nobody", "Monday", 9 * 60) == []
+
+def test_next_booking(index):
+    assert index.next_booking("Akhmetova A.", "Monday", 9 * 60 + 55)['discipline'] == "History"
+    assert index.next_booking("Akhmetova A.", "Monday", 10 * 60 + 5) is None
+    assert index.next_booking("Akhmetova A.", "Sunday", 0) is None
+
+def test_find_lecturers(index):
+    assert index.find_lecturers("akhmet") == ["Akhmetova A."]
+    assert index.find_lecturers("Bekov B.") == ["Bekov B."]
+    assert index.find_lecturers("ova") == ["Akhmetova A.", "Serikova S."]
+
+def test_double_bookings(index):
+    [(room, a, b)] = index.double_bookings('rooms')
+    assert room == "C1.102"
+    assert (a['discipline'], a['time'], b['discipline'], b['time']) == ("Physics", "10:00-10:50", "Art", "10:30-11:20")
+    assert index.double_bookings('lecturers') == []
+
+def test_lecturer_in_two_places_at_once():
+    rows = ROWS + [row("G-4", "Monday", "09:30-10:20", "Algebra", "C1.105", "Akhmetova A.")]
+    index = OccupancyIndex.from_store(ScheduleStore.from_frame(pd.DataFrame(rows, columns=COLUMNS)))
+    found = [(name, a['discipline'], b['discipline']) for name, a, b in index.double_bookings('lecturers')]
+    assert found == [("Akhmetova A.", "Calculus", "Algebra"), ("Akhmetova A.", "Algebra", "History")]
+
+def test_written_index_reads_back_the_same(index, tmp_path):
+    path = str(tmp_path / "occupancy.json")
+    store = ScheduleStore.from_frame(pd.DataFrame(ROWS, columns=COLUMNS))
+    write_occupancy_index(store, path)
+    loaded = load_occupancy_index(path)
+    assert loaded.double_bookings('rooms') == index.double_bookings('rooms')
+    assert loaded.free_rooms("Monday", 9 * 60 + 30) == index.free_rooms("Monday", 9 * 60 + 30)
+    # Without the file, the index is built from the store given
+    assert load_occupancy_index(str(tmp_path / "missing.json"), store).rooms() == index.rooms()
+
+def test_explicit_day_and_time():
+    assert parse_when("tue 9:30", "Asia/Almaty") == ("Tuesday", 570)
+    with pytest.raises(ValueError):
+        parse_when("t 9:30", "Asia/Almaty")
+
+def test_now_is_in_the_given_timezone():
+    # 25 hours apart, so never the same weekday
+    assert parse_when("now", "Pacific/Kiritimati")[0] != parse_when("now", "Pacific/Pago_Pago")[0]
+    now = datetime.datetime(2026, 3, 9, 3, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=5)))
+    assert parse_when("now", "Asia/Almaty", now=now) == ("Monday", 210)
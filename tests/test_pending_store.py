@@ -0,0 +1,56 @@
+"""Both pending-selection backends: round trip, single use, expiry and the entry cap."""
+import pytest
+import pending_store
+from pending_store import MemoryPendingStore, PendingSelectionStore, SQLitePendingStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryPendingStore(**kwargs)
+        return SQLitePendingStore(str(tmp_path / "pending.db"), **kwargs)
+    return make
+
+def test_selection_is_popped_once(make_store):
+    store = make_store()
+    selection = {'term': "2025-26-t3", 'events': [{'Group': "AAI-2501M", 'Day': "Monday", 'Time': "09:00-09:50"}]}
+    store.put("state-1", selection)
+    assert store.pop("state-1") == selection
+    assert store.pop("state-1") is None
+    assert store.pop("unknown") is None
+
+def test_entries_expire(make_store, clock):
+    store = make_store(ttl=60, clock=clock)
+    store.put("old", [1])
+    clock.now += 61
+    assert store.pop("old") is None
+
+def test_oldest_entries_go_first_when_full(make_store, clock):
+    store = make_store(max_entries=3, clock=clock)
+    for i in range(5):
+        clock.now += 1
+        store.put(f"state-{i}", i)
+    assert len(store) == 3
+    assert store.pop("state-0") is None and store.pop("state-4") == 4
+
+def test_interface_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        PendingSelectionStore()
+
+    class Incomplete(PendingSelectionStore):
+        def put(self, state, selection):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_process_wide_store_can_be_swapped():
+    # Not get_pending_store(): without PENDING_STORE that would create pending_selections.db in the working directory
+    previous = pending_store._default_store
+    memory = MemoryPendingStore()
+    pending_store.set_pending_store(memory)
+    try:
+        pending_store.get_pending_store().put("state", {'events': []})
+        assert memory.pop("state") == {'events': []}
+    finally:
+        pending_store.set_pending_store(previous)
@@ -0,0 +1,43 @@
+"""Merging back-to-back slots of the same class into one block."""
+from schedule_events import merge_consecutive_slots
+
+def ev(time, discipline="Calculus", day="Monday", classroom="C1.1.101", lecturer="Lecturer A"):
+    return {'Group': "G-1", 'Day': day, 'Time': time, 'Discipline': discipline, 'Type': "lecture",
+            'Classroom': classroom, 'Lecturer': lecturer}
+
+def times(events):
+    return [(e['Discipline'], e['Time']) for e in events]
+
+def test_back_to_back_slots_merge():
+    merged = merge_consecutive_slots([ev("18:00-18:50"), ev("19:00-19:50"), ev("20:00-20:50")])
+    assert times(merged) == [("Calculus", "18:00-20:50")]
+
+def test_gap_of_fifteen_minutes_merges_and_sixteen_does_not():
+    assert times(merge_consecutive_slots([ev("12:00-12:50"), ev("13:05-13:55")])) == [("Calculus", "12:00-13:55")]
+    assert times(merge_consecutive_slots([ev("12:00-12:50"), ev("13:06-13:55")])) == [("Calculus", "12:00-12:50"),
+                                                                                      ("Calculus", "13:06-13:55")]
+
+def test_different_room_lecturer_or_day_does_not_merge():
+    events = [ev("09:00-09:50"), ev("10:00-10:50", classroom="C1.1.102"), ev("11:00-11:50", lecturer="Lecturer B"),
+              ev("12:00-12:50", day="Tuesday")]
+    assert times(merge_consecutive_slots(events)) == times(events)
+
+def test_exact_duplicates_and_overlaps_collapse():
+    assert times(merge_consecutive_slots([ev("09:00-09:50"), ev("09:00-09:50")])) == [("Calculus", "09:00-09:50")]
+    assert times(merge_consecutive_slots([ev("09:00-10:20"), ev("10:00-10:50")])) == [("Calculus", "09:00-10:50")]
+
+def test_unparseable_times_are_kept_as_is():
+    events = [ev("TBA"), ev("09:00-09:50"), ev("TBA"), ev("9-10")]
+    assert times(merge_consecutive_slots(events)) == [("Calculus", "TBA"), ("Calculus", "09:00-09:50"),
+                                                      ("Calculus", "TBA"), ("Calculus", "9-10")]
+
+def test_blocks_keep_the_order_of_their_first_slot():
+    events = [ev("11:00-11:50", "Physics"), ev("09:00-09:50"), ev("TBA", "Art"), ev("12:00-12:50", "Physics"),
+              ev("10:00-10:50")]
+    assert times(merge_consecutive_slots(events)) == [("Physics", "11:00-12:50"), ("Calculus", "09:00-10:50"),
+                                                      ("Art", "TBA")]
+
+def test_input_events_are_not_changed():
+    events = [ev("09:00-09:50"), ev("10:00-10:50")]
+    merge_consecutive_slots(events)
+    assert times(events) == [("Calculus", "09:00-09:50"), ("Calculus", "10:00-10:50")]
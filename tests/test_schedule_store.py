@@ -0,0 +1,123 @@
+"""Schedule store: the (Program, Group) row ranges, dictionary deltas across batches, aborted builds and database.csv."""
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pytest
+from schedule_store import (COLUMNS, ScheduleStore, StoreWriter, build_group_index, load_index_file, read_index_file,
+                            write_index_file, write_store)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def row(program, group, discipline="Calculus", time="09:00-09:50"):
+    return {'Group': group, 'Day': "Monday", 'Time': time, 'Discipline': discipline, 'Classroom': "C1.1.101",
+            'Type': "lecture", 'Lecturer': "Lecturer A", 'Program': program}
+
+def paths(tmp_path):
+    return str(tmp_path / "database.arrow"), str(tmp_path / "database_index.json"), str(tmp_path / "database.csv")
+
+def test_group_index_holds_row_ranges():
+    programs = ["P1", "P1", "P1", "P2", "P2", "P1"]
+    groups = ["G-1", "G-1", "G-2", "H-1", "H-1", "G-1"]
+    assert build_group_index(programs, groups) == {"P1": {"G-1": [[0, 2], [5, 6]], "G-2": [[2, 3]]}, "P2": {"H-1": [[3, 5]]}}
+    assert build_group_index([], []) == {}
+
+def test_writer_index_matches_across_batches(tmp_path):
+    rows = [row("P1", "G-1"), row("P1", "G-1"), row("P1", "G-2"), row("P2", "G-1"), row("P1", "G-1")]
+    store_path, index_path, _ = paths(tmp_path)
+    # A group running across a batch boundary is still one range
+    write_store(pd.DataFrame(rows), store_path, index_path, chunk_rows=2)
+    with open(index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    assert index["rows"] == 5
+    assert index["groups"] == build_group_index([r['Program'] for r in rows], [r['Group'] for r in rows])
+
+    store = ScheduleStore.open(store_path, index_path)
+    assert store.programs() == ["P1", "P2"]
+    assert store.groups("P1") == ["G-1", "G-2"]
+    frame = store.group_frame("P1", "G-1")
+    assert list(frame.index) == [0, 1, 4]
+    assert store.group_frame("P2", "G-1")['Program'].tolist() == ["P2"]
+    assert store.group_frame("P3", "G-1").empty
+    store.close()
+
+def test_later_batches_add_to_the_dictionaries(tmp_path):
+    store_path, index_path, _ = paths(tmp_path)
+    batches = [[row("P1", "G-1", "Calculus"), row("P1", "G-1", "Physics")],
+               [row("P1", "G-2", "Physics"), row("P1", "G-2", "History")],
+               [row("P2", "H-1", "Art")]]
+    with StoreWriter(store_path, index_path) as writer:
+        for batch in batches:
+            writer.write_rows(batch)
+        writer.write_rows([])
+
+    with pa.memory_map(store_path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        assert reader.num_record_batches == 3
+        # Earlier codes keep their meaning: later batches only append their new values to each dictionary
+        codes = [reader.get_batch(i).column("Discipline").indices.to_pylist() for i in range(3)]
+        reader.read_all()
+        assert reader.stats.num_dictionary_deltas > 0
+        assert reader.stats.num_replaced_dictionaries == 0
+    assert codes == [[0, 1], [1, 2], [3]]
+    store = ScheduleStore.open(store_path, index_path)
+    assert store.to_frame()['Discipline'].tolist() == ["Calculus", "Physics", "Physics", "History", "Art"]
+    assert store.group_frame("P1", "G-2")['Discipline'].tolist() == ["Physics", "History"]
+    store.close()
+
+def test_abort_leaves_the_previous_store(tmp_path):
+    store_path, index_path, csv_path = paths(tmp_path)
+    write_store(pd.DataFrame([row("P1", "G-1")]), store_path, index_path, csv_path)
+    before = sorted(os.listdir(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        with StoreWriter(store_path, index_path, csv_path) as writer:
+            writer.write_rows([row("P2", "H-1")])
+            raise RuntimeError("extraction failed")
+
+    assert sorted(os.listdir(tmp_path)) == before
+    store = ScheduleStore.open(store_path, index_path)
+    assert store.programs() == ["P1"]
+    assert store.to_frame()['Group'].tolist() == ["G-1"]
+    store.close()
+    assert pd.read_csv(csv_path, dtype=str)['Program'].tolist() == ["P1"]
+
+def test_database_csv_round_trips(tmp_path):
+    database = pd.read_csv(os.path.join(ROOT, "database.csv"), dtype=str, keep_default_na=False)[COLUMNS]
+    store_path, index_path, csv_path = paths(tmp_path)
+    write_store(database, store_path, index_path, csv_path, chunk_rows=1000)
+
+    store = ScheduleStore.open(store_path, index_path)
+    pd.testing.assert_frame_equal(store.to_frame(), database)
+    assert store.programs() == list(dict.fromkeys(database['Program']))
+    program, group = database['Program'].iloc[-1], database['Group'].iloc[-1]
+    expected = database[(database['Program'] == program) & (database['Group'] == group)]
+    pd.testing.assert_frame_equal(store.group_frame(program, group), expected)
+    assert [r for rows in store.iter_program_rows(program, chunk_rows=100) for r in rows] == \
+        database[database['Program'] == program].to_dict('records')
+    store.close()
+
+    pd.testing.assert_frame_equal(pd.read_csv(csv_path, dtype=str, keep_default_na=False), database)
+    pd.testing.assert_frame_equal(ScheduleStore.from_frame(database).to_frame(), database)
+
+def test_index_files_are_versioned_and_reloaded_when_rewritten(tmp_path):
+    path = str(tmp_path / "index.json")
+    opened = []
+
+    def open_index(path):
+        opened.append(path)
+        return read_index_file(path, 2)["value"]
+
+    assert load_index_file(path, open_index) is None
+    write_index_file(path, 2, {"value": 1})
+    assert os.listdir(tmp_path) == ["index.json"]
+    assert load_index_file(path, open_index) == 1
+    assert load_index_file(path, open_index) == 1
+    assert len(opened) == 1
+
+    write_index_file(path, 2, {"value": 2})
+    os.utime(path, (1767225600, 1767225600))
+    assert load_index_file(path, open_index) == 2
+    write_index_file(path, 1, {"value": 3})
+    with pytest.raises(ValueError, match="unsupported version 1"):
+        read_index_file(path, 2)
@@ -0,0 +1,77 @@
+"""Background sync jobs: results, failures, expiry and which jobs the max_jobs cap may evict."""
+import threading
+import pytest
+import sync_jobs
+from sync_jobs import QueueFullError, SyncJobQueue
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+def blocked(job, release):
+    job.set_stage("Blocked")
+    release.wait(5)
+    return "released"
+
+def test_job_result_and_progress():
+    queue = SyncJobQueue(workers=1)
+
+    def body(job, events):
+        job.progress(len(events), len(events))
+        return {'created': len(events)}
+
+    snapshot = queue.wait(queue.submit(body, [1, 2, 3]), timeout=5)
+    assert snapshot['status'] == 'done'
+    assert snapshot['result'] == {'created': 3}
+    assert (snapshot['done'], snapshot['total']) == (3, 3)
+
+def test_failed_job_reports_the_error():
+    queue = SyncJobQueue(workers=1)
+
+    def body(job):
+        raise ValueError("token expired")
+
+    snapshot = queue.wait(queue.submit(body), timeout=5)
+    assert snapshot['status'] == 'failed'
+    assert snapshot['error'] == "token expired"
+
+def test_finished_jobs_expire_after_ttl(clock):
+    queue = SyncJobQueue(workers=1, ttl=60, clock=clock)
+    job_id = queue.submit(lambda job: None)
+    queue.wait(job_id, timeout=5)
+    clock.now += 61
+    queue.submit(lambda job: None)
+    assert queue.get(job_id) is None
+
+def test_cap_evicts_finished_jobs_only(release):
+    queue = SyncJobQueue(workers=2, max_jobs=3)
+    done_id = queue.submit(lambda job: None)
+    queue.wait(done_id, timeout=5)
+    running = [queue.submit(blocked, release) for _ in range(2)]
+
+    queue.submit(blocked, release)
+    assert queue.get(done_id) is None
+    assert all(queue.get(job_id) is not None for job_id in running)
+
+def test_full_queue_of_unfinished_jobs_refuses_new_ones(release):
+    queue = SyncJobQueue(workers=1, max_jobs=2)
+    active = [queue.submit(blocked, release) for _ in range(2)]
+    with pytest.raises(QueueFullError):
+        queue.submit(blocked, release)
+    assert all(queue.get(job_id)['finished'] is None for job_id in active)
+
+    release.set()
+    for job_id in active:
+        queue.wait(job_id, timeout=5)
+    assert queue.wait(queue.submit(blocked, release), timeout=5)['result'] == "released"
+
+def test_set_job_queue_swaps_the_process_wide_queue():
+    previous = sync_jobs.get_job_queue()
+    queue = SyncJobQueue(workers=1)
+    sync_jobs.set_job_queue(queue)
+    try:
+        assert sync_jobs.get_job_queue() is queue
+    finally:
+        sync_jobs.set_job_queue(previous)
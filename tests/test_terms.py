@@ -0,0 +1,59 @@
+"""Term catalog: picking the default term from SCHEDULE_TERM, the CALENDAR_NAME override and term paths."""
+import json
+import logging
+import pytest
+from terms import TermCatalog
+
+CATALOG = {
+    "version": 1,
+    "default": "2025-26-t3",
+    "terms": {
+        "2025-26-t3": {"name": "Trimester 3", "institution": "AITU", "start": "2026-03-09", "end": "2026-05-17"},
+        "2026-27-t1": {"name": "Trimester 1", "institution": "AITU", "start": "2026-09-07", "end": "2026-11-29"},
+    },
+}
+
+@pytest.fixture
+def catalog_path(tmp_path, monkeypatch):
+    monkeypatch.delenv("SCHEDULE_TERM", raising=False)
+    monkeypatch.delenv("CALENDAR_NAME", raising=False)
+    path = tmp_path / "terms.json"
+    path.write_text(json.dumps(CATALOG))
+    return str(path)
+
+def test_default_term_comes_from_the_catalog(catalog_path):
+    catalog = TermCatalog.open(catalog_path)
+    assert catalog.get().id == "2025-26-t3"
+    assert catalog.get().calendar_name == "AITU Schedule - Trimester 3"
+
+def test_schedule_term_picks_a_term_by_id(catalog_path, monkeypatch):
+    monkeypatch.setenv("SCHEDULE_TERM", "2026-27-t1")
+    assert TermCatalog.open(catalog_path).get().id == "2026-27-t1"
+
+def test_schedule_term_still_accepts_a_term_name(catalog_path, monkeypatch, caplog):
+    monkeypatch.setenv("SCHEDULE_TERM", "Trimester 1")
+    with caplog.at_level(logging.WARNING, logger="terms"):
+        assert TermCatalog.open(catalog_path).get().id == "2026-27-t1"
+    assert "2026-27-t1" in caplog.text
+
+def test_unknown_schedule_term_is_an_error(catalog_path, monkeypatch):
+    monkeypatch.setenv("SCHEDULE_TERM", "Trimester 4")
+    with pytest.raises(ValueError, match="Trimester 4"):
+        TermCatalog.open(catalog_path)
+
+def test_unknown_default_term_is_an_error(catalog_path):
+    catalog = TermCatalog.open(catalog_path)
+    with pytest.raises(ValueError, match="2024-25-t3"):
+        TermCatalog(catalog.terms, "2024-25-t3")
+
+def test_calendar_name_overrides_the_default_term_only(catalog_path, monkeypatch):
+    monkeypatch.setenv("CALENDAR_NAME", "My Schedule")
+    catalog = TermCatalog.open(catalog_path)
+    assert catalog.get().calendar_name == "My Schedule"
+    assert catalog.get("2026-27-t1").calendar_name == "AITU Schedule - Trimester 1"
+
+def test_relative_paths_resolve_against_the_catalog(catalog_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path.parent)
+    catalog = TermCatalog.open(catalog_path)
+    assert catalog.get().data_dir == str(tmp_path / "terms" / "2025-26-t3")
+    assert catalog.get().schedules_dir == str(tmp_path / "terms" / "2025-26-t3" / "schedules")